@@ -3,10 +3,10 @@ import pandas as pd
 import logging
 from datetime import datetime
 from config import Config
-from utils.model_loader import ModelLoader
-from utils.google_books import GoogleBooksAPI
-from utils.recommender import BookRecommender
-from utils.dae_model import DenoisingAutoEncoder
+from utils.components import build_thumbnail_cache
+from utils.metadata_warmer import start_metadata_warmer
+from utils.model_registry import build_registry
+from utils.metrics import metrics, start_metrics_server
 
 # Configuration de la page
 st.set_page_config(
@@ -54,28 +54,103 @@ st.markdown("""
 # Initialisation
 @st.cache_resource
 def init_components():
-    """Initialise les composants de l'application"""
-    model_loader = ModelLoader(Config.MODEL_PATH)
-    if not model_loader.load_model():
+    """Initialise les composants de l'application
+
+    Le registre recharge à chaud les nouveaux modèles déposés dans
+    `Config.MODEL_DIR` : seul le registre est mis en cache, le modèle
+    courant est relu à chaque exécution du script.
+    """
+    registry = build_registry()
+    if registry is None:
         st.error("Impossible de charger le modèle. Vérifiez que 'dae_model.pkl' existe.")
         st.stop()
     
-    api = GoogleBooksAPI(
-        Config.GOOGLE_BOOKS_API_KEY,
-        Config.GOOGLE_BOOKS_BASE_URL
-    )
+    if Config.METRICS_PORT:
+        start_metrics_server(Config.SERVER_HOST, Config.METRICS_PORT)
     
-    recommender = BookRecommender(model_loader, api)
+    # Métadonnées des livres les plus recommandés récupérées en arrière-plan
+    start_metadata_warmer(registry)
     
-    return model_loader, api, recommender
+    return registry
+
+@st.cache_resource
+def init_thumbnails():
+    """Cache disque des couvertures : chaque image est téléchargée une seule fois"""
+    return build_thumbnail_cache()
+
+def render_book_card(idx, isbn, score, book, show_details):
+    """Affiche la carte d'un livre recommandé
+
+    Renvoie l'emplacement de la couverture, remplie par `fill_thumbnails`
+    une fois téléchargée (en parallèle pour toute la page).
+    """
+    with st.container():
+        col1, col2 = st.columns([1, 3])
+        
+        with col1:
+            thumbnail_slot = st.empty()
+        
+        with col2:
+            st.markdown(f"### {idx}. {book['title']}")
+            st.markdown(f"**✍️ Auteur(s):** {', '.join(book['authors'])}")
+            st.markdown(f"**📖 Éditeur:** {book['publisher']}")
+            st.markdown(
+                f'<span class="score-badge">⭐ Score: {score:.2f}</span>',
+                unsafe_allow_html=True
+            )
+            
+            if show_details:
+                with st.expander("📋 Plus de détails"):
+                    col_a, col_b = st.columns(2)
+                    with col_a:
+                        st.write(f"**📅 Date:** {book['published_date']}")
+                        st.write(f"**📄 Pages:** {book['page_count']}")
+                        st.write(f"**🌐 Langue:** {book['language']}")
+                    with col_b:
+                        if book['average_rating'] != 'N/A':
+                            st.write(f"**⭐ Note moyenne:** {book['average_rating']}/5")
+                        st.write(f"**👥 Évaluations:** {book['ratings_count']}")
+                        if book['categories']:
+                            st.write(f"**🏷️ Catégories:** {', '.join(book['categories'][:3])}")
+                    
+                    st.write("**📝 Description:**")
+                    desc = book['description']
+                    if len(desc) > 400:
+                        desc = desc[:400] + "..."
+                    st.write(desc)
+                    
+                    if book['preview_link'] != '#':
+                        st.link_button("🔗 Voir sur Google Books", book['preview_link'])
+        
+        st.markdown("---")
+    
+    return thumbnail_slot
+
+def fill_thumbnails(pending, wait=False):
+    """Affiche les couvertures téléchargées ; `wait` attend les retardataires
+
+    Octets JPEG réduits servis localement, plus d'URL distante par carte.
+    """
+    remaining = []
+    for slot, future in pending:
+        if wait or future.done():
+            slot.image(future.result(), use_column_width=True)
+        else:
+            remaining.append((slot, future))
+    return remaining
 
 # Chargement
 try:
-    model_loader, api, recommender = init_components()
+    registry = init_components()
 except Exception as e:
     st.error(f"Erreur d'initialisation: {e}")
     st.stop()
 
+bundle = registry.current
+model_loader, recommender = bundle.model_loader, bundle.recommender
+if recommender.user_history is None:
+    st.warning("Historique des notes indisponible : recommandations non personnalisées.")
+
 # En-tête
 st.markdown(
     f'<div class="header-title">{Config.PAGE_TITLE}</div>',
@@ -90,21 +165,52 @@ with st.sidebar:
     
     stats = model_loader.get_stats()
     
-    if stats['users'] > 0:
-        # Récupérer tous les User-IDs disponibles
-        available_user_ids = sorted(model_loader.user_mapping.keys())
+    mode = st.radio(
+        "Mode",
+        options=["🎯 Par utilisateur", "🔗 Livres similaires"],
+        horizontal=True
+    )
+    similar_mode = mode == "🔗 Livres similaires"
+    
+    if similar_mode:
+        seed_isbn = st.text_input(
+            "ISBN du livre de référence",
+            value=str(model_loader.isbn_array[0]),
+            help=f"{stats['books']} livres disponibles"
+        ).strip()
+        
+    elif stats['users'] > 0:
+        # Recherche par préfixe et pagination : seule une page d'IDs est envoyée au navigateur
+        user_prefix = st.text_input(
+            "Rechercher un utilisateur",
+            placeholder="Début de l'User-ID",
+            help=f"{stats['users']} utilisateurs disponibles"
+        ).strip()
+        _, total_matches = model_loader.user_mapping.search(user_prefix, limit=0)
+        page_size = Config.USER_SEARCH_PAGE_SIZE
+        page_count = max(1, -(-total_matches // page_size))
+        page = st.number_input(
+            f"Page (sur {page_count})",
+            min_value=1,
+            max_value=page_count,
+            value=1
+        ) if page_count > 1 else 1
+        page_user_ids, _ = model_loader.user_mapping.search(
+            user_prefix, offset=(page - 1) * page_size, limit=page_size
+        )
+        
+        if not page_user_ids:
+            st.warning("Aucun utilisateur ne correspond à cette recherche")
+            st.stop()
         
         # Selectbox avec les vrais User-IDs
         user_id = st.selectbox(
             "Choisissez un utilisateur",
-            options=available_user_ids,
+            options=page_user_ids,
             index=0,
-            help=f"{len(available_user_ids)} utilisateurs disponibles"
+            help=f"{total_matches} utilisateur(s) correspondant(s)"
         )
         
-        # Afficher quelques exemples
-        st.caption(f"📋 Exemples d'IDs : {', '.join(map(str, available_user_ids[:5]))}...")
-        
     else:
         st.error("Aucun utilisateur trouvé dans le modèle")
         st.stop()
@@ -116,6 +222,32 @@ with st.sidebar:
         value=Config.DEFAULT_RECOMMENDATIONS
     )
     
+    filters = {}
+    exclude_rated = True
+    if not similar_mode:
+        with st.expander("🔎 Filtres"):
+            exclude_rated = st.checkbox("Exclure les livres déjà notés", value=True)
+            catalog = recommender.catalog
+            languages = sorted(catalog.languages[1:]) if catalog is not None else []
+            language = st.selectbox("Langue", options=["Toutes"] + languages)
+            if language != "Toutes":
+                filters['language'] = language
+            categories = st.multiselect(
+                "Catégories",
+                options=sorted(catalog.categories[1:]) if catalog is not None else []
+            )
+            if categories:
+                filters['categories'] = categories
+            min_year = st.number_input("Publié à partir de", min_value=0, max_value=2100, value=0)
+            if min_year:
+                filters['min_year'] = int(min_year)
+            if catalog is not None:
+                catalog_stats = catalog.stats()
+                st.caption(
+                    f"Catalogue : {catalog_stats['available']} livres décrits, "
+                    f"{catalog_stats['missing']} introuvables, {catalog_stats['unknown']} inconnus"
+                )
+    
     st.markdown("---")
     
     st.subheader("📊 Statistiques du modèle")
@@ -125,6 +257,28 @@ with st.sidebar:
     with col2:
         st.metric("📚 Livres", stats['books'])
     
+    with st.expander("🧠 Modèle"):
+        st.write(f"**Version active :** `{bundle.version}`")
+        st.caption(f"{bundle.path} — chargé le {datetime.fromtimestamp(bundle.loaded_at):%d/%m/%Y %H:%M}")
+        if registry.can_rollback():
+            previous = registry.versions[1]
+            if st.button(f"↩️ Revenir à {previous['version']}", use_container_width=True):
+                registry.rollback()
+                st.rerun()
+    
+    with st.expander("⏱️ Performances"):
+        snapshot = metrics.snapshot()
+        timings = [
+            {'Étape': name.replace('_duration_seconds', ''), 'Appels': m['count'],
+             'p50 (ms)': m['p50'] * 1000, 'p99 (ms)': m['p99'] * 1000}
+            for name, m in sorted(snapshot.items()) if 'count' in m and m['count']
+        ]
+        if timings:
+            st.dataframe(pd.DataFrame(timings), hide_index=True, use_container_width=True)
+        counters = {name: m['value'] for name, m in sorted(snapshot.items()) if 'value' in m}
+        if counters:
+            st.json(counters)
+    
     st.markdown("---")
     
     st.subheader("ℹ️ À propos")
@@ -134,7 +288,10 @@ with st.sidebar:
     )
 
 # Corps principal
-st.header("🎯 Vos recommandations personnalisées")
+if similar_mode:
+    st.header("🔗 Livres similaires")
+else:
+    st.header("🎯 Vos recommandations personnalisées")
 
 col1, col2, col3 = st.columns([2, 1, 1])
 with col1:
@@ -146,18 +303,29 @@ with col3:
     show_details = st.checkbox("📖 Détails", value=True)
 
 if generate_btn:
-    with st.spinner("🔍 Recherche des meilleurs livres..."):
-        recommendations = recommender.get_recommendations(
-            user_id,
-            n_recommendations
-        )
+    status = st.empty()
+    export_slot = st.empty()
+    st.markdown("---")
     
-    if recommendations:
-        st.success(f"✅ {len(recommendations)} livres trouvés!")
+    # Les cartes s'affichent au fil de l'arrivée des métadonnées
+    export_rows = []
+    pending_thumbnails = []
+    status.info("🔍 Recherche des meilleurs livres...")
+    try:
+        if similar_mode:
+            stream = recommender.iter_similar_books(seed_isbn, n_recommendations)
+            export_name = f"similar_{seed_isbn}"
+        else:
+            stream = recommender.iter_recommendations(
+                user_id, n_recommendations, exclude_rated, filters or None
+            )
+            export_name = f"recommendations_user_{user_id}"
         
-        # Option d'export
-        export_df = pd.DataFrame([
-            {
+        for idx, (isbn, score, book) in enumerate(stream, 1):
+            slot = render_book_card(idx, isbn, score, book, show_details)
+            pending_thumbnails.append((slot, init_thumbnails().get_async(book.get('thumbnail'))))
+            pending_thumbnails = fill_thumbnails(pending_thumbnails)
+            export_rows.append({
                 'Rang': idx,
                 'Titre': book['title'],
                 'Auteurs': ', '.join(book['authors']),
@@ -165,65 +333,31 @@ if generate_btn:
                 'ISBN': isbn,
                 'Éditeur': book['publisher'],
                 'Date': book['published_date']
-            }
-            for idx, (isbn, score, book) in enumerate(recommendations, 1)
-        ])
+            })
+            status.info(f"🔍 {idx}/{n_recommendations} livres trouvés...")
+    except Exception as e:
+        st.error(f"Erreur lors de la génération des recommandations: {e}")
+    fill_thumbnails(pending_thumbnails, wait=True)
+    
+    if export_rows:
+        status.success(f"✅ {len(export_rows)} livres trouvés!")
         
-        csv = export_df.to_csv(index=False)
-        st.download_button(
+        # Option d'export
+        csv = pd.DataFrame(export_rows).to_csv(index=False)
+        export_slot.download_button(
             label="📥 Télécharger les recommandations (CSV)",
             data=csv,
-            file_name=f"recommendations_user_{user_id}_{datetime.now().strftime('%Y%m%d')}.csv",
+            file_name=f"{export_name}_{datetime.now().strftime('%Y%m%d')}.csv",
             mime="text/csv"
         )
-        
-        st.markdown("---")
-        
-        # Affichage des recommandations
-        for idx, (isbn, score, book) in enumerate(recommendations, 1):
-            with st.container():
-                col1, col2 = st.columns([1, 3])
-                
-                with col1:
-                    st.image(book['thumbnail'], use_column_width=True)
-                
-                with col2:
-                    st.markdown(f"### {idx}. {book['title']}")
-                    st.markdown(f"**✍️ Auteur(s):** {', '.join(book['authors'])}")
-                    st.markdown(f"**📖 Éditeur:** {book['publisher']}")
-                    st.markdown(
-                        f'<span class="score-badge">⭐ Score: {score:.2f}</span>',
-                        unsafe_allow_html=True
-                    )
-                    
-                    if show_details:
-                        with st.expander("📋 Plus de détails"):
-                            col_a, col_b = st.columns(2)
-                            with col_a:
-                                st.write(f"**📅 Date:** {book['published_date']}")
-                                st.write(f"**📄 Pages:** {book['page_count']}")
-                                st.write(f"**🌐 Langue:** {book['language']}")
-                            with col_b:
-                                if book['average_rating'] != 'N/A':
-                                    st.write(f"**⭐ Note moyenne:** {book['average_rating']}/5")
-                                st.write(f"**👥 Évaluations:** {book['ratings_count']}")
-                                if book['categories']:
-                                    st.write(f"**🏷️ Catégories:** {', '.join(book['categories'][:3])}")
-                            
-                            st.write("**📝 Description:**")
-                            desc = book['description']
-                            if len(desc) > 400:
-                                desc = desc[:400] + "..."
-                            st.write(desc)
-                            
-                            if book['preview_link'] != '#':
-                                st.link_button("🔗 Voir sur Google Books", book['preview_link'])
-                
-                st.markdown("---")
     
     else:
-        st.warning("⚠️ Aucune recommandation trouvée pour cet utilisateur.")
-        st.info("💡 Essayez avec un autre ID utilisateur.")
+        if similar_mode:
+            status.warning("⚠️ Aucun livre similaire trouvé pour cet ISBN.")
+            st.info("💡 Vérifiez que l'ISBN fait partie du catalogue du modèle.")
+        else:
+            status.warning("⚠️ Aucune recommandation trouvée pour cet utilisateur.")
+            st.info("💡 Essayez avec un autre ID utilisateur.")
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,377 @@
+"""Benchmarks de vitesse et évaluation hors-ligne sur données synthétiques
+
+Usage :
+    python -m benchmarks.run_benchmarks --users 5000 --books 2000 --output bench.json
+
+Étapes mesurées (p50/p99 et débit) : chargement du modèle (pickle et
+artefact plat), passe avant, classement top-k, recommandation de bout en
+bout et récupération des métadonnées via un GoogleBooksAPI bouchonné
+(latence simulée, sans réseau). Moteurs : NumPy float32/float16/int8
+face à torch (écart des scores, recouvrement du top-k, taille des poids,
+passe avant, import + chargement à froid dans un processus neuf). Index
+MIPS : recall@k face au score exact et latence, en mode exact et IVF
+pour chaque `nprobe`.
+Qualité : recall@k et NDCG@k sur des notes retirées de l'historique. Le
+résultat JSON inclut le commit git courant pour comparer deux versions.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.synthetic import build_mappings, generate_ratings, random_model, split_holdout, write_ratings
+from utils.artifact import export_artifact
+from utils.google_books import BudgetExhausted, GoogleBooksAPI
+from utils.item_index import DecoderMIPSIndex, recall_at_k
+from utils.model_loader import ModelLoader
+from utils.numpy_engine import PRECISIONS, top_k
+from utils.rate_limiter import TokenBucket
+from utils.recommender import BookRecommender
+from utils.user_history import UserHistoryStore
+
+
+class StubGoogleBooksAPI(GoogleBooksAPI):
+    """GoogleBooksAPI sans réseau : chaque requête HTTP est simulée avec une latence fixe"""
+
+    def __init__(self, latency: float = 0.05, **kwargs):
+        super().__init__('', 'http://stub.invalid', rate_limiter=TokenBucket(rate=1e6, capacity=1e6), **kwargs)
+        self.latency = latency
+        self.calls = 0
+
+    def _query(
+        self,
+        query: str,
+        max_results: Optional[int] = None,
+        limiter: Optional[TokenBucket] = None
+    ) -> Optional[Dict]:
+        if limiter is not None and not limiter.try_acquire():
+            raise BudgetExhausted()
+        self.calls += 1
+        time.sleep(self.latency)
+        isbns = [part.split(':', 1)[1] for part in query.split(' OR ')]
+        items = [
+            {'volumeInfo': {
+                'title': f'Livre {isbn}',
+                'industryIdentifiers': [{'type': 'ISBN_10', 'identifier': isbn}]
+            }}
+            for isbn in isbns
+        ]
+        return {'totalItems': len(items), 'items': items}
+
+
+def summarize(latencies: List[float], units: int = 1) -> Dict[str, float]:
+    """p50/p99/moyenne en ms et débit (unités par seconde)"""
+    values = np.array(latencies) * 1000
+    return {
+        'runs': len(values),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'mean_ms': float(values.mean()),
+        'throughput_per_s': float(units * len(values) / (values.sum() / 1000))
+    }
+
+
+def measure(fn: Callable, repeat: int, units: int = 1) -> Dict[str, float]:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, units)
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Exécuté dans un processus neuf : l'import de torch (ou son absence) est compris dans la mesure
+# (VmHWM plutôt que ru_maxrss, conservé à travers exec : il inclurait le pic du processus parent)
+COLD_LOAD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from utils.model_loader import ModelLoader
+loader = ModelLoader(sys.argv[1], backend=sys.argv[2], precision=sys.argv[3])
+loaded = loader.load_model()
+seconds = time.perf_counter() - start
+peak_kb = None
+try:
+    with open('/proc/self/status') as f:
+        peak_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    pass
+print(json.dumps({
+    'loaded': loaded,
+    'seconds': seconds,
+    'peak_rss_mb': None if peak_kb is None else peak_kb / 1024,
+    'torch_imported': 'torch' in sys.modules
+}))
+"""
+
+
+def cold_load(path: str, backend: str, precision: str = 'float32') -> Optional[Dict]:
+    """Import + chargement du modèle dans un processus neuf : durée, pic de RSS (Linux), torch importé"""
+    try:
+        output = subprocess.check_output(
+            [sys.executable, '-c', COLD_LOAD_SCRIPT, path, backend, precision],
+            cwd=REPO_ROOT,
+            stderr=subprocess.DEVNULL
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def compare_engines(artifact_path: str, torch_loader: ModelLoader, matrix: np.ndarray, k: int, repeat: int) -> Dict:
+    """Moteur NumPy (float32, float16, int8) face à torch sur le même lot d'utilisateurs"""
+    reference = torch_loader.predict(matrix)
+    reference_top, _ = top_k(reference, k)
+    weights = sum(p.numel() * p.element_size() for p in torch_loader.model.parameters())
+    engines = {'torch': {
+        'weights_mb': weights / 1e6,
+        'forward': measure(lambda: torch_loader.predict(matrix), repeat, len(matrix)),
+        'cold_load': cold_load(artifact_path, 'torch')
+    }}
+    for precision in PRECISIONS:
+        with contextlib.redirect_stdout(io.StringIO()):
+            loader = ModelLoader(artifact_path, backend='numpy', precision=precision)
+            loader.load_model()
+        scores = loader.predict(matrix)
+        top, _ = top_k(scores, k)
+        overlap = np.mean([len(np.intersect1d(a, b)) / k for a, b in zip(top, reference_top)])
+        engines[f'numpy_{precision}'] = {
+            'weights_mb': loader.model.nbytes / 1e6,
+            'max_abs_diff': float(np.abs(scores - reference).max()),
+            f'top{k}_overlap': float(overlap),
+            'forward': measure(lambda: loader.predict(matrix), repeat, len(matrix)),
+            'cold_load': cold_load(artifact_path, 'numpy', precision)
+        }
+    return engines
+
+
+def compare_item_index(loader: ModelLoader, matrix: np.ndarray, k: int, nprobes: List[int], repeat: int) -> Dict:
+    """Index MIPS (exact, puis IVF pour chaque nprobe) : recall@k face au score exact, construction et recherche"""
+    weight, bias = loader.decoder_weights()
+    hidden = loader.hidden(matrix)
+    results = {}
+    configs = [('exact', None)] + [('ivf', nprobe) for nprobe in nprobes]
+    for mode, nprobe in configs:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            index = DecoderMIPSIndex(weight, bias, mode=mode, nprobe=nprobe or 1).build()
+        build_seconds = time.perf_counter() - start
+        results[mode if nprobe is None else f'ivf_nprobe{nprobe}'] = {
+            'n_clusters': index.n_clusters if mode == 'ivf' else None,
+            'build_s': build_seconds,
+            f'recall@{k}': recall_at_k(index, hidden, k),
+            'search': measure(lambda: index.search(hidden, k), repeat, len(hidden))
+        }
+    return results
+
+
+def train_model(history: UserHistoryStore, epochs: int, batch_size: int = 128, seed: int = 42):
+    """Entraînement court du DAE sur l'historique CSR (notes retirées déjà exclues du store)"""
+    from utils.training import train_dae
+
+    model, _ = train_dae(
+        history.store_dir,
+        epochs=epochs,
+        batch_size=batch_size,
+        holdout_fraction=0.0,
+        seed=seed,
+        verbose=False
+    )
+    return model
+
+
+def evaluate_quality(recommender: BookRecommender, history: UserHistoryStore, test, k: int, max_users: int) -> Dict:
+    """recall@k et NDCG@k sur les notes retirées, livres déjà notés exclus du classement"""
+    loader = recommender.model_loader
+    test_items: Dict[int, set] = {}
+    for user_id, isbn in zip(test['User-ID'], test['ISBN']):
+        user_idx = loader.user_mapping.get(int(user_id))
+        item_idx = loader.isbn_mapping.get(isbn)
+        if user_idx is not None and item_idx is not None:
+            test_items.setdefault(user_idx, set()).add(item_idx)
+
+    users = sorted(test_items)[:max_users]
+    recalls, ndcgs = [], []
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    for start in range(0, len(users), 256):
+        batch = users[start:start + 256]
+        scores = recommender._score_batch(batch)
+        for row, user_idx in enumerate(batch):
+            scores[row, history.get_rated_items(user_idx)] = -np.inf
+        top_indices, _ = top_k(scores, k)
+        for row, user_idx in enumerate(batch):
+            relevant = test_items[user_idx]
+            hits = np.array([i in relevant for i in top_indices[row]], dtype=float)
+            recalls.append(hits.sum() / min(len(relevant), k))
+            ideal = discounts[:min(len(relevant), k)].sum()
+            ndcgs.append(float((hits * discounts).sum() / ideal))
+
+    return {
+        f'recall@{k}': float(np.mean(recalls)) if recalls else None,
+        f'ndcg@{k}': float(np.mean(ndcgs)) if ndcgs else None,
+        'users_evaluated': len(users)
+    }
+
+
+def popularity_baseline(train, test, loader, history: UserHistoryStore, k: int, max_users: int) -> Dict:
+    """Même évaluation pour un classement par popularité (référence)"""
+    counts = np.bincount(loader.isbn_mapping.lookup_batch(train['ISBN'].to_numpy()), minlength=len(loader.isbn_mapping))
+
+    class PopularityRecommender:
+        model_loader = loader
+
+        def _score_batch(self, user_indices):
+            return np.tile(counts.astype(np.float32), (len(user_indices), 1))
+
+    return evaluate_quality(PopularityRecommender(), history, test, k, max_users)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def run(args) -> Dict:
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'params': vars(args),
+        'stages': {},
+        'engines': {},
+        'item_index': {},
+        'quality': {}
+    }
+    stages = results['stages']
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Données et modèle
+        ratings = generate_ratings(args.users, args.books, args.ratings_per_user, seed=args.seed)
+        train, test = split_holdout(ratings, seed=args.seed)
+        user_mapping, isbn_mapping = build_mappings(ratings)
+        ratings_path = write_ratings(train, workdir)
+
+        with quiet:
+            history = UserHistoryStore.build(
+                ratings_path, user_mapping, isbn_mapping, os.path.join(workdir, 'history')
+            )
+            model = train_model(history, args.epochs) if args.epochs else random_model(len(isbn_mapping))
+
+        import torch
+        pickle_path = os.path.join(workdir, 'dae_model.pkl')
+        torch.save({'model': model, 'user_mapping': user_mapping, 'isbn_mapping': isbn_mapping}, pickle_path)
+        artifact_path = os.path.join(workdir, 'dae_model.dae')
+        with quiet:
+            export_artifact(model, user_mapping, isbn_mapping, artifact_path)
+
+        # Chargement du modèle
+        def load(path, backend):
+            with contextlib.redirect_stdout(io.StringIO()):
+                ModelLoader(path, backend=backend).load_model()
+
+        stages['load_pickle'] = measure(lambda: load(pickle_path, 'torch'), args.load_repeat)
+        stages['load_artifact_torch'] = measure(lambda: load(artifact_path, 'torch'), args.load_repeat)
+        stages['load_artifact_numpy'] = measure(lambda: load(artifact_path, 'numpy'), args.load_repeat)
+
+        with quiet:
+            loader = ModelLoader(artifact_path, backend=args.backend, precision=args.precision)
+            loader.load_model()
+        recommender = BookRecommender(loader, None, history)
+        user_ids = list(user_mapping)
+        rng = np.random.default_rng(args.seed)
+
+        def sample_users(n):
+            return [user_ids[i] for i in rng.choice(len(user_ids), n, replace=False)]
+
+        # Passe avant, classement, bout en bout
+        batch_indices = [user_mapping[u] for u in sample_users(args.batch_size)]
+        matrix = recommender._get_user_matrix(batch_indices)
+        stages['forward'] = measure(lambda: loader.predict(matrix), args.repeat, args.batch_size)
+        scores = loader.predict(matrix)
+        stages['top_k'] = measure(lambda: top_k(scores, args.k), args.repeat, args.batch_size)
+        stages['recommend_batch'] = measure(
+            lambda: recommender.recommend_batch(sample_users(args.batch_size), args.k),
+            args.repeat, args.batch_size
+        )
+        stages['recommend_single'] = measure(
+            lambda: recommender.recommend_batch(sample_users(1), args.k), args.repeat
+        )
+
+        # Moteurs d'inférence (NumPy en précision réduite face à torch)
+        with quiet:
+            torch_loader = ModelLoader(artifact_path, backend='torch')
+            torch_loader.load_model()
+        results['engines'] = compare_engines(artifact_path, torch_loader, matrix, args.k, args.repeat)
+        results['item_index'] = compare_item_index(loader, matrix, args.k, args.nprobe, args.repeat)
+
+        # Métadonnées (API bouchonnée) : cache froid puis chaud
+        api = StubGoogleBooksAPI(latency=args.api_latency)
+        recommender.api = api
+        lookup_users = sample_users(min(args.repeat, len(user_ids)))
+        cold = iter(lookup_users)
+        stages['metadata_cold'] = measure(
+            lambda: recommender.get_recommendations(next(cold), args.k), len(lookup_users)
+        )
+        warm = iter(lookup_users)
+        stages['metadata_warm'] = measure(
+            lambda: recommender.get_recommendations(next(warm), args.k), len(lookup_users)
+        )
+        stages['metadata_cold']['api_calls'] = api.calls
+
+        # Qualité
+        results['quality']['model'] = evaluate_quality(recommender, history, test, args.k, args.eval_users)
+        results['quality']['popularity'] = popularity_baseline(
+            train, test, loader, history, args.k, args.eval_users
+        )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks sur catalogue synthétique")
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--ratings-per-user', type=int, default=30)
+    parser.add_argument('--epochs', type=int, default=5, help="0 = modèle non entraîné")
+    parser.add_argument('--backend', default='torch', choices=ModelLoader.BACKENDS)
+    parser.add_argument('--precision', default='float32')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 16], help="Clusters sondés par l'index IVF")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--load-repeat', type=int, default=3)
+    parser.add_argument('--api-latency', type=float, default=0.05)
+    parser.add_argument('--eval-users', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    results = run(args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print(f"✅ Résultats écrits dans {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
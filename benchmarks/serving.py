@@ -0,0 +1,144 @@
+"""Débit agrégé et mémoire par worker du service HTTP, de 1 à N workers
+
+Usage :
+    python -m benchmarks.serving --max-workers 4 --duration 10
+    python -m benchmarks.serving --synthetic --users 20000 --books 10000
+
+Pour chaque nombre de workers, `server.py --workers n` est lancé dans un
+sous-processus, chargé avec `load_test.run_load_test`, puis la mémoire de
+chaque worker est relevée dans /proc : RSS (pages résidentes, partagées
+comprises) et PSS (pages partagées divisées entre les processus qui les
+utilisent). Avec `--synthetic`, un modèle et des notes synthétiques sont
+générés dans un dossier temporaire utilisé comme répertoire de travail.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+from urllib.request import urlopen
+
+from load_test import run_load_test
+from utils.prefork import memory_usage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = os.path.join(ROOT, 'server.py')
+
+
+def prepare_synthetic(workdir: str, num_users: int, num_books: int) -> List[int]:
+    """Modèle (artefact .dae) et notes synthétiques aux emplacements de Config"""
+    from benchmarks.synthetic import build_mappings, generate_ratings, random_model, write_ratings
+    from config import Config
+    from utils.artifact import export_artifact
+
+    ratings = generate_ratings(num_users, num_books)
+    user_mapping, isbn_mapping = build_mappings(ratings)
+    write_ratings(ratings, os.path.join(workdir, os.path.dirname(Config.RATINGS_FILE)),
+                  os.path.basename(Config.RATINGS_FILE))
+    with contextlib.redirect_stdout(io.StringIO()):
+        export_artifact(random_model(len(isbn_mapping)), user_mapping, isbn_mapping,
+                        os.path.join(workdir, Config.ARTIFACT_PATH))
+    return list(user_mapping)
+
+
+def wait_ready(url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urlopen(f"{url}/health", timeout=1) as response:
+                return json.loads(response.read())
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"Service non disponible: {url}")
+
+
+def worker_pids(pid: int) -> List[int]:
+    """PIDs des processus enfants (workers) d'un processus (Linux)"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        children = []
+    return children or [pid]
+
+
+def measure_workers(n: int, args, cwd: str, user_ids: List[int]) -> Dict:
+    url = f"http://127.0.0.1:{args.port}"
+    command = [sys.executable, SERVER, '--port', str(args.port), '--workers', str(n)]
+    if args.threads_per_worker:
+        command += ['--threads-per-worker', str(args.threads_per_worker)]
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(url)
+        run_load_test(url, user_ids, args.concurrency, 1.0, args.k)  # préchauffage
+        result = run_load_test(url, user_ids, args.concurrency, args.duration, args.k)
+        pids = worker_pids(process.pid)
+        memory = [memory_usage(pid) for pid in pids]
+        supervisor = memory_usage(process.pid) if pids != [process.pid] else {}
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+    mib = 1024 * 1024
+    return {
+        'workers': n,
+        'throughput_rps': result['throughput_rps'],
+        'p50_ms': result['p50_ms'],
+        'p99_ms': result['p99_ms'],
+        'errors': result['errors'],
+        'rss_per_worker_mib': [m.get('rss', 0) / mib for m in memory],
+        'pss_per_worker_mib': [m.get('pss', 0) / mib for m in memory],
+        'supervisor_pss_mib': supervisor.get('pss', 0) / mib,
+        'pss_total_mib': (sum(m.get('pss', 0) for m in memory) + supervisor.get('pss', 0)) / mib
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit et mémoire du service selon le nombre de workers")
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads-per-worker', type=int, default=None)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--synthetic', action='store_true', help="Modèle et notes synthétiques")
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--output', help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.synthetic:
+            cwd = workdir
+            user_ids = prepare_synthetic(workdir, args.users, args.books)
+        else:
+            from utils.components import build_model_loader
+            cwd = ROOT
+            model_loader = build_model_loader()
+            if model_loader is None:
+                raise SystemExit("Impossible de charger le modèle pour lister les utilisateurs")
+            user_ids = list(model_loader.user_mapping.keys())
+
+        results = []
+        for n in range(1, args.max_workers + 1):
+            results.append(measure_workers(n, args, cwd, user_ids[:1000]))
+            print(f"{n} worker(s): {results[-1]['throughput_rps']:.0f} req/s, "
+                  f"PSS total {results[-1]['pss_total_mib']:.0f} MiB")
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print(f"✅ Résultats écrits dans {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
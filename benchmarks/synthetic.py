@@ -0,0 +1,86 @@
+"""Générateur de catalogue, de notes et de modèle synthétiques (sans dataset ni réseau)"""
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def generate_ratings(
+    num_users: int,
+    num_books: int,
+    ratings_per_user: int = 30,
+    latent_dim: int = 8,
+    seed: int = 42
+) -> pd.DataFrame:
+    """Notes 1-10 au format Book-Crossing, générées par un modèle à facteurs latents
+
+    La popularité des livres suit une loi de puissance et chaque utilisateur
+    note en priorité les livres proches de ses goûts : la structure est donc
+    apprenable et les métriques de qualité ont un sens.
+    """
+    rng = np.random.default_rng(seed)
+    user_factors = rng.standard_normal((num_users, latent_dim))
+    book_factors = rng.standard_normal((num_books, latent_dim))
+    popularity = 1.0 / np.arange(1, num_books + 1) ** 0.8
+    log_popularity = np.log(popularity / popularity.sum())
+
+    n = min(ratings_per_user, num_books)
+    rows, cols, values = [], [], []
+    for start in range(0, num_users, 1024):
+        affinity = user_factors[start:start + 1024] @ book_factors.T
+        # Tirage sans remise pondéré (astuce de Gumbel)
+        logits = affinity + log_popularity + rng.gumbel(size=affinity.shape)
+        chosen = np.argpartition(-logits, n - 1, axis=1)[:, :n]
+        picked = np.take_along_axis(affinity, chosen, axis=1)
+        ratings = np.clip(np.round(5.5 + 1.5 * picked + rng.normal(0, 1, picked.shape)), 1, 10)
+        rows.append(np.repeat(np.arange(start, start + len(chosen)), n))
+        cols.append(chosen.ravel())
+        values.append(ratings.ravel())
+
+    rows, cols, values = np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+    return pd.DataFrame({
+        'User-ID': rows + 1,
+        'ISBN': np.char.add('SYN', np.char.zfill(cols.astype(str), 9)),
+        'Book-Rating': values.astype(np.int64)
+    })
+
+
+def build_mappings(ratings: pd.DataFrame) -> Tuple[Dict, Dict]:
+    """user_mapping et isbn_mapping triés, comme les colonnes du pivot_table du notebook"""
+    users = np.sort(ratings['User-ID'].unique())
+    isbns = np.sort(ratings['ISBN'].unique())
+    return (
+        {int(u): i for i, u in enumerate(users)},
+        {str(b): i for i, b in enumerate(isbns)}
+    )
+
+
+def split_holdout(ratings: pd.DataFrame, fraction: float = 0.1, seed: int = 42) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Retire `fraction` des notes de chaque utilisateur (au moins une, jamais toutes)"""
+    rng = np.random.default_rng(seed)
+    shuffled = ratings.iloc[rng.permutation(len(ratings))]
+    rank = shuffled.groupby('User-ID').cumcount()
+    counts = shuffled.groupby('User-ID')['User-ID'].transform('size')
+    n_test = np.minimum(np.maximum(1, (counts * fraction).astype(int)), counts - 1)
+    is_test = rank < n_test
+    return shuffled[~is_test].sort_index(), shuffled[is_test].sort_index()
+
+
+def random_model(num_books: int, latent_dim: int = 64, seed: int = 42):
+    """DenoisingAutoEncoder non entraîné (benchmarks de vitesse uniquement)"""
+    import torch
+
+    from utils.dae_model import DenoisingAutoEncoder
+
+    torch.manual_seed(seed)
+    model = DenoisingAutoEncoder(num_books, latent_dim=latent_dim)
+    model.eval()
+    return model
+
+
+def write_ratings(ratings: pd.DataFrame, directory: str, name: str = 'ratings.csv') -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    ratings.to_csv(path, index=False)
+    return path
@@ -13,6 +13,16 @@ class Config:
     # Model Configuration
     MODEL_PATH = 'dae_model.pkl'
     MODEL_DIR = 'models'
+    ARTIFACT_PATH = os.path.join(MODEL_DIR, 'dae_model.dae')
+    INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torch')  # 'torch' ou 'numpy'
+    INFERENCE_PRECISION = os.getenv('INFERENCE_PRECISION', 'float32')  # 'float32', 'float16', 'int8'
+    ITEM_INDEX_MODE = os.getenv('ITEM_INDEX_MODE', 'off')  # 'off', 'exact' ou 'ivf'
+    ITEM_INDEX_NPROBE = 16
+    ITEM_INDEX_PATH = os.path.join(MODEL_DIR, 'item_index.npz')
+    MODEL_ACTIVE_FILE = os.path.join(MODEL_DIR, 'active.json')
+    MODEL_WATCH_INTERVAL = float(os.getenv('MODEL_WATCH_INTERVAL', '30'))  # 0 = pas de rechargement à chaud
+    MODEL_SETTLE_SECONDS = 5  # fichier inchangé depuis ce délai avant chargement
+    MODEL_KEEP_VERSIONS = 2  # versions précédentes gardées en mémoire pour le retour arrière
     
     # App Configuration
     PAGE_TITLE = "📚 Système de Recommandation de Livres"
@@ -22,20 +32,80 @@ class Config:
     # Recommendation Settings
     MAX_RECOMMENDATIONS = 20
     DEFAULT_RECOMMENDATIONS = 10
+    USER_SEARCH_PAGE_SIZE = 50
     MIN_RATING = 1
     MAX_RATING = 10
     
     # API Settings
     API_TIMEOUT = 5
     API_RATE_LIMIT_DELAY = 0.1
+    API_RATE_LIMIT_BURST = 5
+    API_MAX_WORKERS = 8
+    API_MULTI_ISBN_SIZE = 10
     
     # Data Paths
     DATA_DIR = 'data'
     RATINGS_FILE = os.path.join(DATA_DIR, 'ratings.csv')
+    USER_HISTORY_DIR = os.path.join(DATA_DIR, 'user_history')
+    USER_HISTORY_CANDIDATES_DIR = os.path.join(DATA_DIR, 'user_history_candidates')  # modèles pas encore activés
+    RATING_DELTA_DIR = os.path.join(DATA_DIR, 'rating_delta')
+    TOPN_DIR = os.path.join(DATA_DIR, 'topn')
+    TOPN_SIZE = MAX_RECOMMENDATIONS * 2
+    ITEM_NEIGHBORS_DIR = os.path.join(DATA_DIR, 'item_neighbors')
+    ITEM_NEIGHBORS_SIZE = MAX_RECOMMENDATIONS * 2
+    ITEM_EMBEDDING_SOURCE = 'decoder'  # 'decoder' ou 'encoder'
+    CATALOG_PATH = os.path.join(DATA_DIR, 'book_catalog.npz')
+    CATALOG_SAVE_INTERVAL = 60
+    
+    # HTTP Service
+    SERVER_HOST = os.getenv('SERVER_HOST', '127.0.0.1')
+    SERVER_PORT = int(os.getenv('SERVER_PORT', '8000'))
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', '1'))
+    BATCH_MAX_SIZE = 64
+    BATCH_MAX_WAIT_MS = 5
+    BATCH_QUEUE_SIZE = 1024
+    REQUEST_TIMEOUT = 2.0
+    
+    # Bulk Export
+    EXPORT_DIR = 'exports'
+    EXPORT_PARTITION_SIZE = 50_000
+    
+    # Metadata Cache
+    METADATA_CACHE_PATH = os.path.join(DATA_DIR, 'metadata_cache.sqlite')
+    METADATA_CACHE_TTL = 30 * 24 * 3600
+    METADATA_CACHE_NEGATIVE_TTL = 24 * 3600
+    METADATA_CACHE_FORBIDDEN_TTL = 600
+    METADATA_CACHE_MAX_ENTRIES = 100_000
+    METADATA_CACHE_TOUCH_INTERVAL = 3600  # précision de la date d'accès (LRU)
+    
+    # Metadata Warm-up (livres les plus recommandés, au démarrage et après chaque changement de modèle)
+    WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', '1') == '1'
+    WARMUP_QUOTA_SHARE = 0.3  # part du débit API, en pause dès qu'une requête utilisateur en a besoin
+    WARMUP_IDLE_SECONDS = 2
+    WARMUP_MAX_ISBNS = 5000
+    WARMUP_SAMPLE_USERS = 20_000
+    WARMUP_TOPN = DEFAULT_RECOMMENDATIONS * 2
+    
+    # Thumbnail Cache
+    THUMBNAIL_DIR = os.path.join(DATA_DIR, 'thumbnails')
+    THUMBNAIL_MAX_BYTES = 200 * 1024 * 1024
+    THUMBNAIL_SIZE = (128, 200)
+    THUMBNAIL_QUALITY = 85
+    THUMBNAIL_FAILURE_TTL = 3600
+    THUMBNAIL_TOUCH_INTERVAL = 3600  # précision de la date d'accès (LRU)
+    THUMBNAIL_MAX_WORKERS = 8  # téléchargements parallèles des couvertures d'une page
     
     # Logging
     LOG_DIR = 'logs'
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # 'json' ou 'text'
+    
+    # Metrics
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # 0 = endpoint /metrics désactivé (Streamlit)
+    METRICS_SHARED_DIR = os.path.join(DATA_DIR, 'metrics')  # pré-fork : valeurs publiées par chaque worker
+    METRICS_FLUSH_INTERVAL = 5
+    PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', '0'))  # 0 = profileur désactivé
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0.05'))
     
     @classmethod
     def validate(cls):
@@ -0,0 +1,84 @@
+"""Client de charge local pour le service HTTP de recommandation
+
+Usage :
+    python load_test.py --url http://127.0.0.1:8000 --concurrency 32 --duration 10
+
+Lancer une fois contre `python server.py` puis contre
+`python server.py --no-batching` pour comparer les débits.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from urllib.request import urlopen
+
+import numpy as np
+
+
+def run_load_test(url: str, user_ids, concurrency: int, duration: float, k: int) -> dict:
+    """Envoie des requêtes en continu depuis `concurrency` threads pendant `duration` secondes"""
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        local_latencies = []
+        local_errors = {}
+        while time.monotonic() < stop_at:
+            user_id = rng.choice(user_ids)
+            start = time.perf_counter()
+            try:
+                with urlopen(f"{url}/recommendations?user_id={user_id}&k={k}", timeout=10) as response:
+                    response.read()
+                local_latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                code = getattr(e, 'code', type(e).__name__)
+                local_errors[code] = local_errors.get(code, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for code, count in local_errors.items():
+                errors[code] = errors.get(code, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else None,
+        'p99_ms': float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge du service de recommandation")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--users', type=int, default=1000, help="Nombre d'IDs utilisateurs tirés")
+    args = parser.parse_args()
+
+    from utils.components import build_model_loader
+
+    model_loader = build_model_loader()
+    if model_loader is None:
+        raise SystemExit("Impossible de charger le modèle pour lister les utilisateurs")
+    user_ids = list(model_loader.user_mapping.keys())[:args.users]
+
+    results = run_load_test(args.url, user_ids, args.concurrency, args.duration, args.k)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""Service HTTP de recommandation (JSON) avec micro-batching des passes du modèle
+
+Usage :
+    python server.py [--port 8000] [--no-batching] [--workers 4] [--threads-per-worker 1]
+
+Routes :
+    GET /recommendations?user_id=<id>&k=<n>[&metadata=1][&exclude_rated=0]
+                        [&language=fr][&category=Fiction][&min_year=1990][&max_year=2005]
+    GET /similar?isbn=<isbn>&k=<n>[&metadata=1]
+    GET /thumbnail?isbn=<isbn>  (couverture JPEG réduite, depuis le cache disque)
+    GET /health
+    POST /ratings  {"user_id": <id>, "ratings": {"<isbn>": <note>, ...}}
+    GET /model  (version active et versions disponibles pour un retour arrière)
+    POST /model/rollback
+    GET /metrics  (format texte Prometheus)
+"""
+import argparse
+import json
+import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from config import Config
+from utils.batching import MicroBatcher, OverloadedError
+from utils.components import build_thumbnail_cache
+from utils.metadata_warmer import start_metadata_warmer
+from utils.model_registry import build_registry
+from utils.metrics import metrics
+from utils.prefork import limit_threads, memory_usage, serve_prefork
+
+
+class RecommendationServer(ThreadingHTTPServer):
+    """Serveur HTTP multi-thread ; file d'acceptation élargie pour les rafales de connexions"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    """Traite les requêtes HTTP ; les composants sont attachés au serveur"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status: int, text: str):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_image(self, body: bytes):
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'public, max-age=86400')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/metrics':
+            self._send_text(200, metrics.render_prometheus())
+            return
+
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        metrics.inc('http_requests_total')
+        with metrics.span('http_request', profile=True):
+            self._route(url, params)
+
+    def _route(self, url, params):
+        try:
+            if url.path == '/recommendations':
+                self._recommendations(params)
+            elif url.path == '/similar':
+                self._similar(params)
+            elif url.path == '/thumbnail':
+                self._thumbnail(params)
+            elif url.path == '/model':
+                self._send_json(200, {'versions': self.server.registry.versions})
+            elif url.path == '/health':
+                self._send_json(200, {
+                    'status': 'ok',
+                    'pid': os.getpid(),
+                    'memory': memory_usage(),
+                    'model': self.server.model_loader.get_stats(),
+                    'batching': self.server.batcher.stats() if self.server.batcher else None
+                })
+            else:
+                self._send_json(404, {'error': 'Route inconnue'})
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+        except OverloadedError as e:
+            metrics.inc('http_overloaded_total')
+            self._send_json(503, {'error': str(e)})
+        except FutureTimeoutError:
+            metrics.inc('http_timeouts_total')
+            self._send_json(504, {'error': 'Délai de traitement dépassé'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        metrics.inc('http_requests_total')
+        try:
+            if url.path == '/model/rollback':
+                if not self.server.registry.rollback():
+                    self._send_json(409, {'error': 'Aucune version précédente'})
+                    return
+                self._send_json(200, {'versions': self.server.registry.versions})
+                return
+            if url.path != '/ratings':
+                self._send_json(404, {'error': 'Route inconnue'})
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                user_id = int(payload['user_id'])
+                ratings = {str(isbn): float(rating) for isbn, rating in payload['ratings'].items()}
+            except (KeyError, TypeError, AttributeError, json.JSONDecodeError) as e:
+                raise ValueError(f"Corps JSON invalide: {e}")
+            result = self.server.recommender.ingest_ratings(user_id, ratings)
+            self._send_json(200, {'user_id': user_id, **result})
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+
+    def _parse_k(self, params) -> int:
+        k = int(params.get('k', Config.DEFAULT_RECOMMENDATIONS))
+        if not 1 <= k <= Config.MAX_RECOMMENDATIONS:
+            raise ValueError(f"k doit être compris entre 1 et {Config.MAX_RECOMMENDATIONS}")
+        return k
+
+    def _parse_filters(self, params):
+        """Filtres métier de la requête (cf. BookCatalog.mask), None si aucun"""
+        filters = {}
+        if params.get('language'):
+            filters['language'] = params['language']
+        if params.get('category'):
+            filters['categories'] = params['category'].split(',')
+        for key in ('min_year', 'max_year'):
+            if params.get(key):
+                filters[key] = int(params[key])
+        return filters or None
+
+    def _recommendations(self, params):
+        if 'user_id' not in params:
+            raise ValueError("Paramètre user_id manquant")
+        user_id = int(params['user_id'])
+        k = self._parse_k(params)
+        exclude_rated = params.get('exclude_rated', '1') != '0'
+        filters = self._parse_filters(params)
+        recommender = self.server.recommender
+
+        # Utilisateurs créés par un autre worker (journal des notes partagé)
+        recommender.sync_history()
+        if user_id not in recommender.model_loader.user_mapping:
+            self._send_json(404, {'error': f"Utilisateur {user_id} non trouvé"})
+            return
+
+        if params.get('metadata') == '1':
+            items = [
+                {'isbn': isbn, 'score': score, 'book': book}
+                for isbn, score, book in recommender.iter_recommendations(user_id, k, exclude_rated, filters)
+            ]
+        elif self.server.batcher is not None and exclude_rated and not filters:
+            ranked = self.server.batcher.submit(user_id, k, timeout=Config.REQUEST_TIMEOUT)
+            items = [{'isbn': isbn, 'score': score} for isbn, score in ranked]
+        else:
+            ranked = recommender.recommend_batch([user_id], k, exclude_rated, filters)[user_id]
+            items = [{'isbn': isbn, 'score': score} for isbn, score in ranked]
+
+        self._send_json(200, {'user_id': user_id, 'model_version': recommender.model_loader.model_version, 'items': items})
+
+    def _thumbnail(self, params):
+        if 'isbn' not in params:
+            raise ValueError("Paramètre isbn manquant")
+        # Métadonnées lues dans le cache uniquement : la couverture ne déclenche pas d'appel API
+        book = self.server.api.lookup_cached([params['isbn']])[params['isbn']]
+        self._send_image(self.server.thumbnails.get(book.get('thumbnail') if book else None))
+
+    def _similar(self, params):
+        if 'isbn' not in params:
+            raise ValueError("Paramètre isbn manquant")
+        isbn = params['isbn']
+        k = self._parse_k(params)
+        recommender = self.server.recommender
+
+        if isbn not in recommender.model_loader.isbn_mapping:
+            self._send_json(404, {'error': f"ISBN {isbn} non trouvé"})
+            return
+
+        if params.get('metadata') == '1':
+            items = [
+                {'isbn': neighbor, 'score': score, 'book': book}
+                for neighbor, score, book in recommender.iter_similar_books(isbn, k)
+            ]
+        else:
+            items = [{'isbn': neighbor, 'score': score} for neighbor, score in recommender.similar_items(isbn, k)]
+
+        self._send_json(200, {'isbn': isbn, 'items': items})
+
+
+def create_server(host: str, port: int, batching: bool = True) -> ThreadingHTTPServer:
+    """Charge les composants et crée le serveur HTTP (non démarré, sans micro-batcher)"""
+    registry = build_registry(start=False)
+    if registry is None:
+        raise SystemExit("Impossible de charger le modèle")
+
+    server = RecommendationServer((host, port), RecommendationHandler)
+    server.registry = registry
+    server.api = registry.api
+    server.thumbnails = build_thumbnail_cache()
+    server.batching = batching
+    server.batcher = None
+    use_bundle(server, registry.current)
+    registry.on_swap(lambda bundle: use_bundle(server, bundle))
+    return server
+
+
+def use_bundle(server: ThreadingHTTPServer, bundle):
+    """Sert un nouveau modèle : les requêtes déjà commencées gardent leurs références"""
+    server.model_loader = bundle.model_loader
+    server.recommender = bundle.recommender
+    if server.batcher is not None:
+        server.batcher.recommender = bundle.recommender
+
+
+def start_batcher(server: ThreadingHTTPServer):
+    """Démarre le thread de micro-batching (dans le processus qui sert les requêtes)"""
+    if server.batching:
+        server.batcher = MicroBatcher(
+            server.recommender,
+            max_batch_size=Config.BATCH_MAX_SIZE,
+            max_wait_ms=Config.BATCH_MAX_WAIT_MS,
+            max_queue=Config.BATCH_QUEUE_SIZE
+        )
+
+
+def setup_worker(server: ThreadingHTTPServer, index: int, workers: int, threads: int):
+    """Initialisation d'un worker après le fork : threads de calcul, connexions, batcher, registre"""
+    limit_threads(threads)
+    server.api.after_fork(quota_share=1.0 / workers)
+    server.thumbnails.after_fork()
+    metrics.after_fork()
+    start_batcher(server)
+    server.registry.start()
+    if index == 0:
+        # Cache de métadonnées partagé : un seul worker le préchauffe
+        start_metadata_warmer(server.registry)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP de recommandation de livres")
+    parser.add_argument('--host', default=Config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=Config.SERVER_PORT)
+    parser.add_argument('--no-batching', action='store_true', help="Une passe du modèle par requête")
+    parser.add_argument('--workers', type=int, default=Config.SERVER_WORKERS, help="Processus (pré-fork)")
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help="Threads de calcul par worker (défaut : cœurs / workers)")
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+
+    server = create_server(args.host, args.port, batching=not args.no_batching)
+    mode = 'sans batching' if args.no_batching else 'micro-batching'
+    print(f"🌐 Service démarré sur http://{args.host}:{args.port} "
+          f"({mode}, {workers} worker(s) x {threads} thread(s))")
+    try:
+        if workers == 1:
+            limit_threads(threads)
+            start_batcher(server)
+            server.registry.start()
+            start_metadata_warmer(server.registry)
+            server.serve_forever()
+        else:
+            # /metrics répond depuis n'importe quel worker : valeurs agrégées sur disque
+            metrics.share(Config.METRICS_SHARED_DIR, Config.METRICS_FLUSH_INTERVAL)
+            serve_prefork(server, workers, lambda index: setup_worker(server, index, workers, threads))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if server.recommender.catalog is not None:
+            server.recommender.catalog.save()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Artefact plat : aller-retour fidèle et rejet des fichiers corrompus"""
+import contextlib
+import io
+import json
+import os
+import struct
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import build_mappings, generate_ratings, random_model
+from utils.artifact import ARTIFACT_MAGIC, LAYERS, ArtifactError, FlatArtifact, export_artifact
+from utils.model_loader import ModelLoader
+
+torch = pytest.importorskip('torch')
+
+
+@pytest.fixture(scope='module')
+def source():
+    ratings = generate_ratings(40, 30, ratings_per_user=6, seed=2)
+    user_mapping, isbn_mapping = build_mappings(ratings)
+    return random_model(len(isbn_mapping), latent_dim=16), user_mapping, isbn_mapping
+
+
+@pytest.fixture
+def artifact_path(tmp_path, source):
+    path = str(tmp_path / 'model.dae')
+    with contextlib.redirect_stdout(io.StringIO()):
+        export_artifact(*source, path, extra={'trained_on': 'synthetic'})
+    return path
+
+
+def test_round_trip(artifact_path, source):
+    model, user_mapping, isbn_mapping = source
+    artifact = FlatArtifact(artifact_path).open()
+    artifact.validate()
+
+    assert (artifact.num_items, artifact.latent_dim) == (len(isbn_mapping), 16)
+    assert artifact.header['num_users'] == len(user_mapping)
+    assert artifact.header['trained_on'] == 'synthetic'
+    state = model.state_dict()
+    for torch_name, flat_name in LAYERS.items():
+        weight, bias = artifact.layer(flat_name)
+        np.testing.assert_array_equal(weight, state[f'{torch_name}.weight'].numpy())
+        np.testing.assert_array_equal(bias, state[f'{torch_name}.bias'].numpy())
+        assert weight.ctypes.data % 64 == 0
+    assert artifact.mapping_dict('user') == user_mapping
+    assert artifact.mapping_dict('isbn') == isbn_mapping
+
+
+def test_version_is_content_hash(tmp_path, artifact_path, source):
+    model, user_mapping, isbn_mapping = source
+    again = str(tmp_path / 'again.dae')
+    other = str(tmp_path / 'other.dae')
+    with contextlib.redirect_stdout(io.StringIO()):
+        same_version = export_artifact(model, user_mapping, isbn_mapping, again)
+        other_version = export_artifact(random_model(len(isbn_mapping), latent_dim=16, seed=7),
+                                        user_mapping, isbn_mapping, other)
+    assert same_version == FlatArtifact(artifact_path).open().version
+    assert other_version != same_version
+
+
+@pytest.mark.parametrize('backend', ['torch', 'numpy'])
+def test_loader_scores_match_source_model(artifact_path, source, backend):
+    model, _, isbn_mapping = source
+    loader = ModelLoader(artifact_path, backend=backend)
+    assert loader.load_model()
+    x = np.random.default_rng(0).random((4, len(isbn_mapping)), dtype=np.float32)
+    with torch.no_grad():
+        expected = model(torch.from_numpy(x)).numpy()
+    scores = loader.model(torch.from_numpy(x)).detach().numpy() if backend == 'torch' else loader.model(x)
+    np.testing.assert_allclose(scores, expected, atol=1e-5)
+
+
+def corrupt(path, offset, data):
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def header_of(path):
+    with open(path, 'rb') as f:
+        f.seek(len(ARTIFACT_MAGIC))
+        (header_len,) = struct.unpack('<Q', f.read(8))
+        return json.loads(f.read(header_len)), header_len
+
+
+def rewrite_header(path, header):
+    _, header_len = header_of(path)
+    encoded = json.dumps(header).encode('utf-8')
+    corrupt(path, len(ARTIFACT_MAGIC) + 8, encoded.ljust(header_len, b' '))
+
+
+def test_rejects_bad_magic(artifact_path):
+    corrupt(artifact_path, 0, b'NOTADAE!')
+    with pytest.raises(ArtifactError):
+        FlatArtifact(artifact_path).open()
+
+
+def test_rejects_unknown_format_version(artifact_path):
+    header, _ = header_of(artifact_path)
+    header['format_version'] = 99
+    rewrite_header(artifact_path, header)
+    with pytest.raises(ArtifactError):
+        FlatArtifact(artifact_path).open()
+
+
+@pytest.mark.parametrize('keep', [len(ARTIFACT_MAGIC) + 4, 100, -1000])
+def test_rejects_truncated_file(artifact_path, keep):
+    size = os.path.getsize(artifact_path)
+    with open(artifact_path, 'r+b') as f:
+        f.truncate(keep if keep > 0 else size + keep)
+    with pytest.raises(ArtifactError):
+        FlatArtifact(artifact_path).open()
+
+
+def test_rejects_inconsistent_shapes(artifact_path):
+    header, _ = header_of(artifact_path)
+    header['latent_dim'] += 1
+    rewrite_header(artifact_path, header)
+    artifact = FlatArtifact(artifact_path).open()
+    with pytest.raises(ArtifactError):
+        artifact.validate()
+
+
+def test_rejects_unsorted_mapping(artifact_path):
+    header, _ = header_of(artifact_path)
+    spec = header['arrays']['user_keys']
+    keys = np.frombuffer(open(artifact_path, 'rb').read(), dtype=spec['dtype'],
+                         count=spec['shape'][0], offset=spec['offset'])
+    corrupt(artifact_path, spec['offset'], keys[::-1].tobytes())
+    with pytest.raises(ArtifactError):
+        FlatArtifact(artifact_path).open().validate()
+
+
+def test_loader_reports_corrupt_artifact(artifact_path):
+    with open(artifact_path, 'r+b') as f:
+        f.truncate(len(ARTIFACT_MAGIC) + 4)
+    assert not ModelLoader(artifact_path, backend='numpy').load_model()
@@ -0,0 +1,146 @@
+"""MicroBatcher : regroupement des requêtes, délais expirés et file bornée"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.batching import MicroBatcher, OverloadedError
+
+
+class FakeRecommender:
+    """`recommend_batch` instrumenté ; `gate` bloque le lot en cours jusqu'à son ouverture"""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+
+    def recommend_batch(self, user_ids, k):
+        self.calls.append(list(user_ids))
+        self.entered.set()
+        self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return {user_id: [(f'{user_id}-{rank}', 1.0 / (rank + 1)) for rank in range(k)] for user_id in user_ids}
+
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def make_batcher(recommender, **kwargs):
+        batcher = MicroBatcher(recommender, **kwargs)
+        batchers.append(batcher)
+        return batcher
+
+    yield make_batcher
+    for batcher in batchers:
+        batcher.close()
+
+
+def wait_for_queue(batcher, size, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while batcher.stats()['queue_size'] < size and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert batcher.stats()['queue_size'] == size
+
+
+def test_concurrent_requests_share_one_pass(make_batcher):
+    recommender = FakeRecommender()
+    batcher = make_batcher(recommender, max_batch_size=64, max_wait_ms=100)
+    requests = [(user_id % 8, 1 + user_id % 3) for user_id in range(16)]
+
+    with ThreadPoolExecutor(len(requests)) as pool:
+        results = list(pool.map(lambda request: batcher.submit(*request, timeout=5), requests))
+
+    for (user_id, k), result in zip(requests, results):
+        assert result == [(f'{user_id}-{rank}', 1.0 / (rank + 1)) for rank in range(k)]
+    assert len(recommender.calls) < len(requests)
+    # Utilisateur demandé plusieurs fois : calculé une seule fois par lot
+    assert all(len(call) == len(set(call)) for call in recommender.calls)
+    stats = batcher.stats()
+    assert stats['requests'] == len(requests) and stats['avg_batch_size'] > 1
+
+
+def test_batch_size_is_capped(make_batcher):
+    recommender = FakeRecommender()
+    recommender.gate.clear()
+    batcher = make_batcher(recommender, max_batch_size=4, max_wait_ms=50)
+
+    with ThreadPoolExecutor(11) as pool:
+        first = pool.submit(batcher.submit, 0, 1, 5)
+        assert recommender.entered.wait(2)
+        # Accumulées pendant que le modèle est occupé
+        futures = [pool.submit(batcher.submit, user_id, 1, 5) for user_id in range(1, 11)]
+        wait_for_queue(batcher, 10)
+        recommender.gate.set()
+        assert first.result(5) and all(future.result(5) for future in futures)
+
+    assert [len(call) for call in recommender.calls] == [1, 4, 4, 2]
+
+
+def test_lone_request_waits_at_most_max_wait(make_batcher):
+    batcher = make_batcher(FakeRecommender(), max_batch_size=64, max_wait_ms=20)
+    start = time.monotonic()
+    assert batcher.submit(1, 3, timeout=5)
+    assert time.monotonic() - start < 0.5
+
+
+def test_timeout_and_expired_requests_skipped(make_batcher):
+    recommender = FakeRecommender()
+    recommender.gate.clear()
+    batcher = make_batcher(recommender, max_wait_ms=1)
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(batcher.submit, 1, 1, 5)
+        assert recommender.entered.wait(2)
+        with pytest.raises(TimeoutError):
+            batcher.submit(2, 1, timeout=0.05)
+        recommender.gate.set()
+        assert first.result(5)
+
+    assert batcher.submit(3, 1, timeout=5)
+    # La requête expirée dans la file n'a jamais été calculée
+    assert recommender.calls == [[1], [3]]
+
+
+def test_full_queue_rejects_immediately(make_batcher):
+    recommender = FakeRecommender()
+    recommender.gate.clear()
+    batcher = make_batcher(recommender, max_wait_ms=1, max_queue=2)
+
+    with ThreadPoolExecutor(3) as pool:
+        first = pool.submit(batcher.submit, 0, 1, 5)
+        assert recommender.entered.wait(2)
+        queued = [pool.submit(batcher.submit, user_id, 1, 5) for user_id in (1, 2)]
+        wait_for_queue(batcher, 2)
+
+        start = time.monotonic()
+        with pytest.raises(OverloadedError):
+            batcher.submit(3, 1, timeout=5)
+        assert time.monotonic() - start < 0.1
+
+        recommender.gate.set()
+        assert first.result(5) and all(future.result(5) for future in queued)
+    # Place libérée : de nouveau accepté
+    assert batcher.submit(3, 1, timeout=5)
+
+
+def test_model_error_reaches_every_caller(make_batcher):
+    recommender = FakeRecommender(error=RuntimeError('modèle indisponible'))
+    recommender.gate.clear()
+    batcher = make_batcher(recommender, max_wait_ms=1)
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(batcher.submit, 0, 1, 5)]
+        assert recommender.entered.wait(2)
+        futures += [pool.submit(batcher.submit, user_id, 1, 5) for user_id in (1, 2, 3)]
+        wait_for_queue(batcher, 3)
+        recommender.gate.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match='modèle indisponible'):
+                future.result(5)
+    assert batcher.stats()['batches'] == 2
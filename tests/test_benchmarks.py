@@ -0,0 +1,48 @@
+"""Benchmarks : l'API bouchonnée passe par le même chemin que GoogleBooksAPI"""
+import argparse
+
+import pytest
+
+from benchmarks.run_benchmarks import StubGoogleBooksAPI, run
+from utils.rate_limiter import TokenBucket
+
+
+def test_stub_api_returns_metadata():
+    api = StubGoogleBooksAPI(latency=0, group_size=4)
+    isbns = [f'SYN{i:09d}' for i in range(6)]
+    results = api.search_many(isbns)
+    assert [book_info['title'] for book_info in results] == [f'Livre {isbn}' for isbn in isbns]
+    assert api.calls == 2
+    # Cache chaud : aucune nouvelle requête
+    api.search_many(isbns)
+    assert api.calls == 2
+
+
+def test_stub_api_charges_caller_limiter():
+    api = StubGoogleBooksAPI(latency=0, group_size=4)
+    isbns = [f'SYN{i:09d}' for i in range(8)]
+    found, remaining = api.prefetch(isbns, limiter=TokenBucket(1e-6, capacity=1))
+    assert (found, remaining, api.calls) == (4, isbns[4:], 1)
+
+
+def test_run_smoke():
+    pytest.importorskip('torch')
+    args = argparse.Namespace(
+        users=60, books=50, ratings_per_user=8, epochs=0, backend='numpy', precision='float32',
+        batch_size=8, k=5, nprobe=[2, 100], repeat=3, load_repeat=1, api_latency=0.0, eval_users=20, seed=1, output=None
+    )
+    results = run(args)
+    assert results['stages']['metadata_cold']['api_calls'] > 0
+    assert results['quality']['model']['users_evaluated'] > 0
+
+    engines = results['engines']
+    assert engines['numpy_float32']['max_abs_diff'] < 1e-5
+    assert engines['numpy_int8']['weights_mb'] < engines['numpy_float16']['weights_mb'] < engines['torch']['weights_mb']
+    cold = engines['numpy_float32']['cold_load']
+    assert cold['loaded'] and not cold['torch_imported']
+
+    item_index = results['item_index']
+    assert item_index['exact']['recall@5'] == 1.0
+    # Tous les clusters sondés : recherche exacte
+    assert item_index['ivf_nprobe100']['recall@5'] == 1.0
+    assert 0 < item_index['ivf_nprobe2']['recall@5'] <= 1.0
@@ -0,0 +1,38 @@
+"""BookCatalog : masques de filtres et expiration des livres introuvables"""
+import numpy as np
+
+from utils.book_catalog import BookCatalog
+
+MAPPING = {'A': 0, 'B': 1, 'C': 2}
+
+
+def test_missing_books_expire_after_ttl(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr('utils.book_catalog.time.time', lambda: now[0])
+    catalog = BookCatalog(str(tmp_path / 'catalog.npz'), MAPPING, missing_ttl=3600)
+    catalog.record('A', None)
+    catalog.record('B', {'language': 'fr', 'published_date': '1999-01-01'})
+
+    assert catalog.is_missing('A')
+    assert catalog.mask().tolist() == [False, True, True]
+    catalog.save()
+
+    now[0] += 3600
+    assert not catalog.is_missing('A')
+    assert catalog.mask().tolist() == [True, True, True]
+    assert catalog.is_unknown(np.arange(3)).tolist() == [True, False, True]
+
+    # La date est sauvegardée : le livre rechargé expire aussi
+    reloaded = BookCatalog(str(tmp_path / 'catalog.npz'), MAPPING, missing_ttl=3600)
+    reloaded.load()
+    assert not reloaded.is_missing('A')
+    assert reloaded.stats()['missing'] == 0
+
+
+def test_filters_keep_unknown_attributes():
+    catalog = BookCatalog(None, MAPPING)
+    catalog.record('A', {'language': 'fr', 'published_date': '1999'})
+    catalog.record('B', {'language': 'en', 'published_date': '2010'})
+
+    assert catalog.mask(language='fr').tolist() == [True, False, True]
+    assert catalog.mask(min_year=2000).tolist() == [False, True, True]
@@ -0,0 +1,113 @@
+"""Export du top-N : reprise depuis le manifeste après une interruption"""
+import csv
+import glob
+import json
+import os
+
+import pytest
+
+from utils.bulk_export import MANIFEST_FILE, SUCCESS_FILE, export_topn, partition_path
+from utils.id_index import IdIndex
+
+NUM_USERS = 23
+PARTITION_SIZE = 5
+K = 3
+
+
+class FakeLoader:
+    def __init__(self):
+        self.user_mapping = IdIndex.from_dict({1000 + i: i for i in range(NUM_USERS)})
+        self.model_version = 'model-v1'
+
+
+class FakeRecommender:
+    """Top-k déterministe par utilisateur ; `fail_on` simule un plantage en cours de partition"""
+
+    def __init__(self, fail_on=None):
+        self.model_loader = FakeLoader()
+        self.fail_on = fail_on
+        self.scored = []
+
+    def get_history_version(self):
+        return 'history-v1'
+
+    def recommend_batch(self, user_ids, k, exclude_rated=True):
+        if self.fail_on in user_ids:
+            raise RuntimeError('plantage simulé')
+        self.scored.extend(user_ids)
+        return {user_id: [(f'isbn-{user_id}-{rank}', 1.0 / (rank + 1)) for rank in range(k)] for user_id in user_ids}
+
+
+def export(recommender, output_dir, **kwargs):
+    options = dict(k=K, partition_size=PARTITION_SIZE, batch_size=2)
+    options.update(kwargs)
+    return export_topn(recommender, None, str(output_dir), **options)
+
+
+def read_rows(output_dir):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(output_dir, 'part-*.csv'))):
+        with open(path, newline='') as f:
+            rows.extend(csv.DictReader(f))
+    return rows
+
+
+def test_full_export(tmp_path):
+    stats = export(FakeRecommender(), tmp_path)
+
+    assert stats['partitions'] == 5 and stats['exported_users'] == NUM_USERS
+    rows = read_rows(tmp_path)
+    assert len(rows) == NUM_USERS * K
+    assert sorted({int(row['user_id']) for row in rows}) == [1000 + i for i in range(NUM_USERS)]
+    assert rows[0] == {'user_id': '1000', 'rank': '1', 'isbn': 'isbn-1000-0', 'score': '1.0'}
+    with open(tmp_path / MANIFEST_FILE) as f:
+        assert json.load(f)['model_version'] == 'model-v1'
+    assert (tmp_path / SUCCESS_FILE).exists()
+
+
+def test_resume_after_crash_skips_written_partitions(tmp_path):
+    # Plantage au milieu de la partition 2 (utilisateurs 1010 à 1014)
+    with pytest.raises(RuntimeError):
+        export(FakeRecommender(fail_on=1012), tmp_path)
+    assert [os.path.exists(partition_path(str(tmp_path), p, 'csv')) for p in range(5)] == \
+        [True, True, False, False, False]
+    assert not glob.glob(str(tmp_path / '*.tmp'))
+    assert not (tmp_path / SUCCESS_FILE).exists()
+
+    recommender = FakeRecommender()
+    stats = export(recommender, tmp_path)
+    assert sorted(recommender.scored) == [1000 + i for i in range(10, NUM_USERS)]
+    assert stats['exported_users'] == NUM_USERS - 10
+    reference = tmp_path / 'reference'
+    export(FakeRecommender(), reference)
+    assert read_rows(tmp_path) == read_rows(reference)
+
+
+def test_finished_export_is_not_recomputed(tmp_path):
+    export(FakeRecommender(), tmp_path)
+    recommender = FakeRecommender()
+    assert export(recommender, tmp_path)['exported_users'] == 0
+    assert recommender.scored == []
+
+
+def test_different_export_requires_overwrite(tmp_path):
+    export(FakeRecommender(), tmp_path)
+    changed = FakeRecommender()
+    changed.model_loader.model_version = 'model-v2'
+    with pytest.raises(SystemExit):
+        export(changed, tmp_path)
+    assert changed.scored == []
+
+    # Paramètres différents : les anciennes partitions sont supprimées puis recalculées
+    stats = export(changed, tmp_path, k=K + 1, overwrite=True)
+    assert stats['exported_users'] == NUM_USERS
+    assert len(read_rows(tmp_path)) == NUM_USERS * (K + 1)
+    with open(tmp_path / MANIFEST_FILE) as f:
+        assert json.load(f)['model_version'] == 'model-v2'
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="pool de processus par fork")
+def test_worker_pool_matches_single_process(tmp_path):
+    export(FakeRecommender(), tmp_path / 'single')
+    export(FakeRecommender(), tmp_path / 'pool', workers=3, threads_per_worker=1)
+    assert read_rows(tmp_path / 'pool') == read_rows(tmp_path / 'single')
@@ -0,0 +1,151 @@
+"""GoogleBooksAPI contre un serveur HTTP local bouchonné (aucun accès réseau)"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from utils.google_books import GoogleBooksAPI
+from utils.rate_limiter import TokenBucket
+
+ISBNS = [f'978000000{i:04d}' for i in range(10)]
+
+
+class StubBooksServer(ThreadingHTTPServer):
+    """Répond aux requêtes `isbn:A OR isbn:B` ; comportement réglable par test"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubBooksHandler)
+        self.requests = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.fail_groups = False
+        self.hidden_in_groups = set()
+        self.delay = 0.0
+        self.delays = {}
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/books/v1/volumes'
+
+    def single_requests(self):
+        return [isbns for _, isbns in self.requests if len(isbns) == 1]
+
+
+class StubBooksHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)['q'][0]
+        isbns = [part.split(':', 1)[1] for part in query.split(' OR ')]
+        with server.lock:
+            server.requests.append((time.monotonic(), isbns))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay + max(server.delays.get(isbn, 0.0) for isbn in isbns))
+            if len(isbns) > 1 and server.fail_groups:
+                self.send_error(503)
+                return
+            if len(isbns) > 1:
+                isbns = [isbn for isbn in isbns if isbn not in server.hidden_in_groups]
+            items = [
+                {'volumeInfo': {
+                    'title': f'Livre {isbn}',
+                    'industryIdentifiers': [{'type': 'ISBN_13', 'identifier': isbn}]
+                }}
+                for isbn in isbns
+            ]
+            body = json.dumps({'totalItems': len(items), 'items': items}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StubBooksServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_api(server, rate: float = 1000.0, capacity: float = 100.0, **kwargs) -> GoogleBooksAPI:
+    return GoogleBooksAPI('', server.url, rate_limiter=TokenBucket(rate, capacity), **kwargs)
+
+
+def test_failed_group_query_is_not_retried_per_isbn(server):
+    server.fail_groups = True
+    api = make_api(server)
+    assert api.search_many(ISBNS) == [None] * len(ISBNS)
+    assert len(server.requests) == 1
+
+    # Erreur transitoire : pas de mise en cache négative
+    server.fail_groups = False
+    assert all(api.search_many(ISBNS))
+    assert len(server.requests) == 2
+
+
+def test_missing_isbns_retried_concurrently(server):
+    server.hidden_in_groups = set(ISBNS[1:5])
+    server.delay = 0.2
+    api = make_api(server)
+
+    start = time.monotonic()
+    arrivals = []
+    for isbn, book_info in api.iter_search(ISBNS):
+        arrivals.append(time.monotonic() - start)
+        assert book_info['title'] == f'Livre {isbn}'
+
+    assert sorted(server.single_requests()) == [[isbn] for isbn in ISBNS[1:5]]
+    assert server.max_active == 4
+    # Premier livre produit dès la réponse groupée, sans attendre les requêtes individuelles
+    assert arrivals[0] < 0.35
+    assert arrivals[-1] < 0.6
+
+
+def test_results_follow_rank_order(server):
+    # Les livres les mieux classés répondent le plus lentement
+    server.delays = {isbn: 0.05 * (len(ISBNS) - rank) for rank, isbn in enumerate(ISBNS)}
+    api = make_api(server, group_size=1)
+    api.search_by_isbn(ISBNS[3])
+
+    assert [isbn for isbn, _ in api.iter_search(ISBNS)] == ISBNS
+    assert [book_info['title'] for book_info in api.search_many(ISBNS)] == [f'Livre {isbn}' for isbn in ISBNS]
+    # ISBN déjà en cache : une seule requête pour lui
+    assert sum(isbns == [ISBNS[3]] for _, isbns in server.requests) == 1
+
+
+def test_lookups_run_concurrently(server):
+    server.delay = 0.2
+    api = make_api(server, group_size=1, max_workers=8)
+
+    start = time.monotonic()
+    assert all(api.search_many(ISBNS[:8]))
+    elapsed = time.monotonic() - start
+    assert server.max_active >= 6
+    assert elapsed < 0.2 * 8 / 2
+
+
+def test_rate_limiter_paces_requests(server):
+    api = make_api(server, rate=20.0, capacity=1.0, group_size=1)
+
+    assert all(api.search_many(ISBNS[:6]))
+    times = sorted(at for at, _ in server.requests)
+    assert len(times) == 6
+    # 20 requêtes/s sans rafale : 5 intervalles d'au moins 50 ms (écart total, insensible à la gigue)
+    assert times[-1] - times[0] > 0.2
@@ -0,0 +1,57 @@
+"""IdIndex : mêmes réponses qu'un dict Python"""
+import numpy as np
+
+from utils.id_index import IdIndex
+
+
+def _shuffled_mapping(keys):
+    """Index dans un ordre différent de celui des clés (cas avec permutation)"""
+    values = np.random.default_rng(0).permutation(len(keys))
+    return {key: int(value) for key, value in zip(keys, values)}
+
+
+def test_lookup_batch_matches_dict_for_user_ids():
+    mapping = _shuffled_mapping([int(k) for k in np.random.default_rng(1).choice(10**6, 5000, replace=False)])
+    index = IdIndex.from_dict(mapping)
+    index[123_456_789] = len(mapping)  # nouvel utilisateur ajouté après la construction
+    expected = {**mapping, 123_456_789: len(mapping)}
+
+    queries = list(expected)[::7] + [-1, 0, 10**7, 123_456_789]
+    assert index.lookup_batch(np.array(queries)).tolist() == [expected.get(q, -1) for q in queries]
+    # Clés non entières : inconnues, jamais d'exception
+    assert index.lookup_batch(['12', None, 3.5]).tolist() == [-1, -1, -1]
+
+
+def test_lookup_batch_matches_dict_for_isbns():
+    keys = [f"{n:010d}" for n in np.random.default_rng(2).choice(10**9, 5000, replace=False)] + ['080652121X', 'é-isbn']
+    mapping = _shuffled_mapping(keys)
+    index = IdIndex.from_dict(mapping)
+
+    queries = keys[::5] + ['', 'unknown', '080652121x', '0' * 12]
+    expected = [mapping.get(q, -1) for q in queries]
+    assert index.lookup_batch(queries).tolist() == expected
+    assert index.lookup_batch(np.array(queries, dtype=object)).tolist() == expected
+    assert index.lookup_batch(np.array(queries)).tolist() == expected
+
+
+def test_keys_for_and_get_match_dict():
+    mapping = _shuffled_mapping([f"ISBN{n}" for n in range(1000)])
+    index = IdIndex.from_dict(mapping)
+    reverse = {value: key for key, value in mapping.items()}
+
+    assert index.keys_for([0, 999, 1000, -1]) == [reverse[0], reverse[999], None, None]
+    assert all(index.get(key) == value for key, value in mapping.items())
+    assert len(index) == len(mapping) and set(index) == set(mapping)
+
+
+def test_digest_ignores_storage():
+    mapping = _shuffled_mapping([f"ISBN{n}" for n in range(100)])
+    index = IdIndex.from_dict(mapping)
+    keys, values = index.key_arrays()
+    # Même contenu avec des clés plus larges (remplissage de l'artefact)
+    assert IdIndex(keys.astype('S32'), values).digest() == index.digest()
+
+    swapped = dict(mapping)
+    first, second = list(mapping)[:2]
+    swapped[first], swapped[second] = mapping[second], mapping[first]
+    assert IdIndex.from_dict(swapped).digest() != index.digest()
@@ -0,0 +1,71 @@
+"""DecoderMIPSIndex : recherche exacte et IVF face au score exact du décodeur"""
+import numpy as np
+import pytest
+
+from utils.item_index import DecoderMIPSIndex, recall_at_k
+from utils.numpy_engine import sigmoid, top_k
+
+
+@pytest.fixture(scope='module')
+def decoder():
+    rng = np.random.default_rng(0)
+    weight = rng.standard_normal((2000, 32)).astype(np.float32)
+    bias = rng.standard_normal(2000).astype(np.float32)
+    hidden = np.maximum(rng.standard_normal((50, 32)), 0).astype(np.float32)
+    return weight, bias, hidden
+
+
+def build(weight, bias, **kwargs) -> DecoderMIPSIndex:
+    return DecoderMIPSIndex(weight, bias, **kwargs).build()
+
+
+def test_exact_matches_brute_force(decoder):
+    weight, bias, hidden = decoder
+    indices, scores = build(weight, bias, mode='exact').search(hidden, 20)
+
+    expected_indices, expected_raw = top_k(hidden @ weight.T + bias, 20)
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(scores, sigmoid(expected_raw), rtol=1e-6)
+
+
+def test_ivf_recall_grows_with_nprobe(decoder):
+    weight, bias, hidden = decoder
+    index = build(weight, bias, mode='ivf', n_clusters=40)
+
+    recalls = []
+    for nprobe in (1, 4, 16, 40):
+        index.nprobe = nprobe
+        recalls.append(recall_at_k(index, hidden, 20))
+    # Clusters sondés emboîtés : le rappel ne peut que croître, et vaut 1 s'ils le sont tous
+    assert recalls == sorted(recalls)
+    assert recalls[0] < 1.0
+    assert recalls[-1] == 1.0
+
+
+def test_ivf_results_are_sorted_scores_of_real_items(decoder):
+    weight, bias, hidden = decoder
+    indices, scores = build(weight, bias, mode='ivf', n_clusters=40, nprobe=4).search(hidden, 20)
+
+    assert np.all(np.diff(scores, axis=1) <= 0)
+    valid = indices >= 0
+    raw = np.einsum('ij,ikj->ik', hidden, weight[np.maximum(indices, 0)]) + bias[np.maximum(indices, 0)]
+    np.testing.assert_allclose(scores[valid], sigmoid(raw)[valid], rtol=1e-5)
+
+
+def test_saved_partition_is_reused_for_same_version(tmp_path, decoder):
+    weight, bias, hidden = decoder
+    path = str(tmp_path / 'item_index.npz')
+    index = build(weight, bias, mode='ivf', n_clusters=40, nprobe=4, version='v1')
+    index.save(path)
+
+    reloaded = DecoderMIPSIndex(weight, bias, mode='ivf', nprobe=4, version='v1')
+    assert reloaded.load(path)
+    np.testing.assert_array_equal(reloaded.search(hidden, 20)[0], index.search(hidden, 20)[0])
+
+    assert not DecoderMIPSIndex(weight, bias, mode='ivf', version='v2').load(path)
+
+
+def test_unknown_mode_rejected(decoder):
+    weight, bias, _ = decoder
+    with pytest.raises(ValueError):
+        DecoderMIPSIndex(weight, bias, mode='hnsw')
@@ -0,0 +1,94 @@
+"""Table des voisins : calcul par blocs identique au calcul direct, version du modèle respectée"""
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import build_mappings, generate_ratings, random_model
+from utils.item_neighbors import ItemNeighborTable, build_item_neighbors, item_embeddings
+from utils.model_loader import ModelLoader
+from utils.recommender import BookRecommender
+
+torch = pytest.importorskip('torch')
+
+M = 10
+
+
+@pytest.fixture(scope='module')
+def loader(tmp_path_factory):
+    ratings = generate_ratings(60, 150, ratings_per_user=8, seed=4)
+    user_mapping, isbn_mapping = build_mappings(ratings)
+    path = str(tmp_path_factory.mktemp('model') / 'dae_model.pkl')
+    torch.save(
+        {'model': random_model(len(isbn_mapping)), 'user_mapping': user_mapping, 'isbn_mapping': isbn_mapping},
+        path
+    )
+    loader = ModelLoader(path)
+    assert loader.load_model()
+    return loader
+
+
+def build(loader, table_dir, **kwargs) -> ItemNeighborTable:
+    return build_item_neighbors(loader, str(table_dir), **kwargs)
+
+
+@pytest.mark.parametrize('source', ['decoder', 'encoder'])
+def test_blocks_match_full_similarity_matrix(tmp_path, loader, source):
+    # Blocs de 32 lignes : le dernier est incomplet
+    table = build(loader, tmp_path / 'neighbors', m=M, source=source, block_size=32)
+    embeddings = item_embeddings(loader, source)
+    similarities = embeddings @ embeddings.T
+    np.fill_diagonal(similarities, -np.inf)
+    expected = np.sort(similarities, axis=1)[:, ::-1][:, :M]
+
+    assert table.indices.shape == (len(embeddings), M)
+    np.testing.assert_allclose(table.scores, expected, atol=1e-5)
+    np.testing.assert_allclose(
+        np.take_along_axis(similarities, np.asarray(table.indices, dtype=np.int64), axis=1), table.scores, atol=1e-5
+    )
+    assert not np.any(table.indices == np.arange(len(embeddings))[:, None])
+    assert np.all(np.diff(table.scores, axis=1) <= 1e-6)
+
+
+def test_reload_from_disk(tmp_path, loader):
+    table_dir = tmp_path / 'neighbors'
+    built = build(loader, table_dir, m=M)
+    table = ItemNeighborTable(str(table_dir))
+    assert table.load()
+    assert table.size == M and table.meta['source'] == 'decoder'
+    indices, scores = table.lookup(3, 4)
+    np.testing.assert_array_equal(indices, built.indices[3, :4])
+    np.testing.assert_array_equal(scores, built.scores[3, :4])
+    assert isinstance(table.indices, np.memmap)
+    assert not ItemNeighborTable(str(tmp_path / 'absent')).load()
+
+
+def test_rebuild_replaces_table(tmp_path, loader):
+    table_dir = tmp_path / 'neighbors'
+    build(loader, table_dir, m=M)
+    table = build(loader, table_dir, m=M // 2)
+    assert table.size == M // 2
+    assert sorted(os.listdir(tmp_path)) == ['neighbors']
+
+
+def test_recommender_uses_fresh_table_only(tmp_path, loader):
+    table = build(loader, tmp_path / 'neighbors', m=M)
+    isbn = loader.isbn_array[0]
+    computed = BookRecommender(loader, None).similar_items(isbn, 5)
+
+    recommender = BookRecommender(loader, None, item_neighbors=table)
+    assert recommender.item_neighbors is table
+    from_table = recommender.similar_items(isbn, 5)
+    assert [book for book, _ in from_table] == [book for book, _ in computed]
+    np.testing.assert_allclose([s for _, s in from_table], [s for _, s in computed], atol=1e-5)
+    # Plus de voisins que la table n'en contient : calcul à la volée
+    assert len(recommender.similar_items(isbn, M + 5)) == M + 5
+
+    table.meta['model_version'] = 'other'
+    assert not recommender.set_item_neighbors(table)
+    assert recommender.item_neighbors is None
+
+
+def test_unknown_source_rejected(loader):
+    with pytest.raises(ValueError):
+        item_embeddings(loader, 'attention')
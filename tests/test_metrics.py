@@ -0,0 +1,80 @@
+"""Métriques et journalisation : lignes JSON, agrégation de /metrics entre workers pré-fork"""
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import pytest
+
+from utils.metrics import LOG_FORMATTERS, JsonFormatter, MetricsRegistry
+
+
+def make_record(message, exc_info=None):
+    return logging.LogRecord('book_recommender', logging.WARNING, __file__, 1, message, None, exc_info)
+
+
+def test_json_formatter_one_line_per_message():
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        record = make_record("Requête lente similar: 812 ms\n  12  recommender.py:similar_items", sys.exc_info())
+
+    line = JsonFormatter().format(record)
+    assert '\n' not in line
+    entry = json.loads(line)
+    assert entry['level'] == 'WARNING' and entry['logger'] == 'book_recommender'
+    assert entry['pid'] == os.getpid()
+    assert entry['message'].startswith('Requête lente')
+    assert 'ValueError: boom' in entry['exc_info']
+    assert entry['ts'].endswith('+00:00')
+
+
+def test_text_formatter_keeps_pid():
+    assert f"[{os.getpid()}]" in LOG_FORMATTERS['text']().format(make_record('message'))
+
+
+def test_unshared_registry_renders_local_values():
+    registry = MetricsRegistry()
+    registry.inc('requests_total', 2)
+    assert 'requests_total 2\n' in registry.render_prometheus()
+    assert registry.shared_dir is None
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="fork indisponible")
+def test_prefork_workers_are_aggregated(tmp_path):
+    shared_dir = str(tmp_path / 'metrics')
+    os.makedirs(shared_dir)
+    # Fichier d'une exécution précédente : ignoré
+    with open(os.path.join(shared_dir, '1.json'), 'w') as f:
+        json.dump({'requests_total': {'type': 'counter', 'help': '', 'value': 1000}}, f)
+
+    registry = MetricsRegistry()
+    # Valeurs du parent avant le fork : comptées une seule fois
+    registry.inc('requests_total', 1)
+    registry.histogram('http_request_duration_seconds').observe(0.002)
+    registry.share(shared_dir, flush_interval=0.05)
+
+    def worker(requests):
+        registry.after_fork()
+        for _ in range(requests):
+            registry.inc('requests_total')
+            with registry.span('http_request'):
+                pass
+        # Publication périodique, sans flush explicite
+        time.sleep(0.3)
+
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=worker, args=(requests,)) for requests in (3, 4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(10)
+        assert process.exitcode == 0
+
+    assert len(os.listdir(shared_dir)) == 3
+    text = registry.render_prometheus()
+    assert 'requests_total 8\n' in text
+    assert 'http_request_duration_seconds_count 8\n' in text
+    assert 'http_request_duration_seconds_bucket{le="+Inf"} 8\n' in text
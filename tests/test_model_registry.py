@@ -0,0 +1,153 @@
+"""ModelRegistry : bascule, refus et retour arrière, sans toucher l'historique du modèle actif"""
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from benchmarks.synthetic import build_mappings, generate_ratings, random_model, write_ratings
+from config import Config
+from utils.components import build_model_loader, build_recommender
+from utils.google_books import GoogleBooksAPI
+from utils.id_index import IdIndex
+from utils.model_registry import ModelRegistry, ServingBundle
+
+torch = pytest.importorskip('torch')
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    ratings = generate_ratings(80, 60, ratings_per_user=8, seed=5)
+    data_dir = tmp_path / 'data'
+    model_dir = tmp_path / 'models'
+    model_dir.mkdir()
+    for name, value in {
+        'MODEL_DIR': str(model_dir),
+        'MODEL_ACTIVE_FILE': str(model_dir / 'active.json'),
+        'RATINGS_FILE': write_ratings(ratings, str(data_dir)),
+        'USER_HISTORY_DIR': str(data_dir / 'user_history'),
+        'USER_HISTORY_CANDIDATES_DIR': str(data_dir / 'user_history_candidates'),
+        'RATING_DELTA_DIR': str(data_dir / 'rating_delta'),
+        'CATALOG_PATH': str(data_dir / 'book_catalog.npz'),
+        'TOPN_DIR': str(data_dir / 'topn'),
+        'ITEM_NEIGHBORS_DIR': str(data_dir / 'item_neighbors'),
+        'ITEM_INDEX_MODE': 'off',
+        'INFERENCE_BACKEND': 'torch',
+        'INFERENCE_PRECISION': 'float32',
+    }.items():
+        monkeypatch.setattr(Config, name, value)
+
+    user_mapping, isbn_mapping = build_mappings(ratings)
+
+    def save_model(name, seed=0, users=None, zero=False):
+        model = random_model(len(isbn_mapping), seed=seed)
+        if zero:
+            with torch.no_grad():
+                for param in model.parameters():
+                    param.zero_()
+        path = str(model_dir / name)
+        torch.save({'model': model, 'user_mapping': users or user_mapping, 'isbn_mapping': isbn_mapping}, path)
+        return path
+
+    initial_path = save_model('a.pkl', seed=1)
+    # Plus ancien que les modèles déposés ensuite par les tests
+    os.utime(initial_path, (time.time() - 60, time.time() - 60))
+    api = GoogleBooksAPI('', 'http://stub.invalid')
+    loader = build_model_loader(initial_path)
+    recommender = build_recommender(loader, api)
+    registry = ModelRegistry(
+        api, ServingBundle(loader, recommender, initial_path), str(model_dir),
+        active_file=Config.MODEL_ACTIVE_FILE, interval=0, settle=0
+    )
+    # Mappings différents : un utilisateur de moins
+    fewer_users = {u: i for i, u in enumerate(list(user_mapping)[:-1])}
+    return registry, save_model, fewer_users
+
+
+def load(registry, path):
+    return registry.load(path)
+
+
+def history_meta():
+    with open(os.path.join(Config.USER_HISTORY_DIR, 'meta.json')) as f:
+        return json.load(f)
+
+
+def test_swap_keeps_history_and_notifies(env):
+    registry, save_model, _ = env
+    initial = registry.current
+    swapped = []
+    registry.on_swap(swapped.append)
+
+    path = save_model('b.pkl', seed=2)
+    assert registry.check()
+    assert registry.current.path == path and registry.current.version != initial.version
+    assert registry.current.recommender.user_history is initial.recommender.user_history
+    assert swapped == [registry.current]
+    with open(Config.MODEL_ACTIVE_FILE) as f:
+        assert json.load(f)['version'] == registry.current.version
+    assert registry.versions[1]['version'] == initial.version
+
+
+def test_rejected_candidate_leaves_current_history(env):
+    registry, save_model, fewer_users = env
+    initial = registry.current
+    built_at = history_meta()['built_at']
+
+    # Mappings différents (historique propre au candidat) et scores constants (refusé)
+    assert not load(registry, save_model('bad.pkl', users=fewer_users, zero=True))
+    assert registry.current is initial
+    assert registry.api.catalog is initial.recommender.catalog
+    assert history_meta()['built_at'] == built_at
+    assert os.listdir(Config.USER_HISTORY_CANDIDATES_DIR)
+
+
+def test_activation_installs_history_and_rollback_restores_it(env):
+    registry, save_model, fewer_users = env
+    initial = registry.current
+    initial_digest = history_meta()['user_mapping_digest']
+
+    assert load(registry, save_model('c.pkl', seed=3, users=fewer_users))
+    candidate = registry.current
+    assert candidate.recommender.user_history is not initial.recommender.user_history
+    assert history_meta()['user_mapping_digest'] == IdIndex.from_dict(fewer_users).digest()
+    user_id = next(iter(fewer_users))
+    assert candidate.recommender.recommend_batch([user_id], 5)[user_id]
+
+    assert registry.rollback()
+    assert registry.current is initial
+    assert history_meta()['user_mapping_digest'] == initial_digest
+    # Version écartée : pas rechargée au passage suivant
+    assert not load(registry, candidate.path)
+
+
+def test_rollback_does_not_wait_for_swap_listeners(env):
+    registry, save_model, _ = env
+    initial = registry.current
+    entered, release = threading.Event(), threading.Event()
+    notified = []
+
+    def slow_listener(bundle):
+        notified.append(bundle)
+        if len(notified) == 1:
+            entered.set()
+            release.wait(5)
+
+    registry.on_swap(slow_listener)
+    path = save_model('b.pkl', seed=2)
+    loader_thread = threading.Thread(target=load, args=(registry, path))
+    loader_thread.start()
+    assert entered.wait(5)
+
+    rollback_thread = threading.Thread(target=registry.rollback)
+    rollback_thread.start()
+    deadline = time.monotonic() + 2
+    while registry.current is not initial and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert registry.current is initial
+
+    release.set()
+    loader_thread.join(5)
+    rollback_thread.join(5)
+    assert [bundle.path for bundle in notified] == [path, initial.path]
@@ -0,0 +1,71 @@
+"""Accord du moteur NumPy (float32 / float16 / int8) avec le modèle PyTorch"""
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from utils.dae_model import DenoisingAutoEncoder  # noqa: E402
+from utils.numpy_engine import NumpyDAE, top_k  # noqa: E402
+
+NUM_ITEMS = 3000
+K = 20
+
+# (écart absolu maximal sur les scores, recouvrement moyen minimal du top-k)
+TOLERANCES = {
+    'float32': (1e-5, 1.0),
+    'float16': (1e-4, 0.95),
+    'int8': (2e-3, 0.9),
+}
+
+
+@pytest.fixture(scope='module')
+def model():
+    torch.manual_seed(0)
+    model = DenoisingAutoEncoder(NUM_ITEMS)
+    model.eval()
+    return model
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    """Lignes creuses comme l'historique normalisé : ~30 notes dans [0, 1] par utilisateur"""
+    rng = np.random.default_rng(0)
+    x = np.zeros((64, NUM_ITEMS), dtype=np.float32)
+    for row in x:
+        rated = rng.choice(NUM_ITEMS, 30, replace=False)
+        row[rated] = rng.random(30)
+    return x
+
+
+@pytest.fixture(scope='module')
+def reference(model, inputs):
+    with torch.no_grad():
+        return model(torch.from_numpy(inputs)).numpy()
+
+
+@pytest.mark.parametrize('precision', list(TOLERANCES))
+def test_scores_match_torch(model, inputs, reference, precision):
+    max_error, _ = TOLERANCES[precision]
+    scores = NumpyDAE.from_torch(model, precision)(inputs)
+    assert scores.shape == reference.shape
+    assert scores.dtype == np.float32
+    assert np.abs(scores - reference).max() <= max_error
+
+
+@pytest.mark.parametrize('precision', list(TOLERANCES))
+def test_top_k_overlaps_torch(model, inputs, reference, precision):
+    _, min_overlap = TOLERANCES[precision]
+    expected, _ = top_k(reference, K)
+    ranked, _ = top_k(NumpyDAE.from_torch(model, precision)(inputs), K)
+    overlap = np.mean([len(set(a) & set(b)) / K for a, b in zip(ranked.tolist(), expected.tolist())])
+    assert overlap >= min_overlap
+
+
+def test_hidden_then_decoder_matches_forward(model, inputs):
+    engine = NumpyDAE.from_torch(model, 'int8')
+    np.testing.assert_array_equal(engine(inputs, hidden=engine.hidden(inputs)), engine(inputs))
+
+
+def test_unknown_precision_is_rejected(model):
+    with pytest.raises(ValueError):
+        NumpyDAE.from_torch(model, 'int4')
@@ -0,0 +1,106 @@
+"""IncrementalUserHistory : les notes ajoutées donnent les mêmes lignes qu'une reconstruction complète"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import build_mappings, generate_ratings, write_ratings
+from utils.rating_delta import IncrementalUserHistory
+from utils.user_history import UserHistoryStore
+
+USER, ISBN, RATING = UserHistoryStore.USER_COL, UserHistoryStore.ISBN_COL, UserHistoryStore.RATING_COL
+NEW_USER = 10**6
+
+
+@pytest.fixture(scope='module')
+def ratings():
+    return generate_ratings(200, 300, ratings_per_user=15, seed=7)
+
+
+@pytest.fixture(scope='module')
+def additions(ratings):
+    """Notes ajoutées : remplacements, nouveaux livres, nouvel utilisateur, notes ignorées"""
+    isbns = sorted(ratings[ISBN].unique())
+    first, second = (int(u) for u in sorted(ratings[USER].unique())[:2])
+    first_isbns = ratings.loc[ratings[USER] == first, ISBN].tolist()
+    rated = set(ratings.loc[ratings[USER].isin([first, second]), ISBN])
+    unrated = [isbn for isbn in isbns if isbn not in rated]
+    return [
+        (first, {first_isbns[0]: 9, unrated[0]: 4}),
+        (second, {unrated[1]: 7, 'UNKNOWN': 8, unrated[2]: 0}),
+        (NEW_USER, {unrated[3]: 6, unrated[4]: 8, unrated[5]: 5}),
+        (first, {first_isbns[0]: 3, unrated[6]: 8}),
+    ]
+
+
+def merged_ratings(ratings: pd.DataFrame, additions) -> pd.DataFrame:
+    """CSV équivalent : chaque note ajoutée remplace la note existante (même utilisateur et livre)"""
+    merged = ratings
+    for user_id, new_ratings in additions:
+        for isbn, rating in new_ratings.items():
+            same = (merged[USER] == user_id) & (merged[ISBN] == isbn)
+            merged = pd.concat(
+                [merged[~same], pd.DataFrame({USER: [user_id], ISBN: [isbn], RATING: [rating]})],
+                ignore_index=True
+            )
+    return merged
+
+
+def incremental(tmp_path, ratings, delta_dir=None):
+    user_mapping, isbn_mapping = build_mappings(ratings)
+    base = UserHistoryStore.build(
+        write_ratings(ratings, str(tmp_path), 'base.csv'), user_mapping, isbn_mapping, str(tmp_path / 'base')
+    )
+    return IncrementalUserHistory(base, user_mapping, isbn_mapping, delta_dir)
+
+
+def test_fold_in_matches_rebuild(tmp_path, ratings, additions):
+    history = incremental(tmp_path, ratings)
+    for user_id, new_ratings in additions:
+        history.add_ratings(user_id, new_ratings, log=False)
+    assert history.user_mapping[NEW_USER] == len(history.user_mapping) - 1
+
+    rebuilt = UserHistoryStore.build(
+        write_ratings(merged_ratings(ratings, additions), str(tmp_path), 'merged.csv'),
+        history.user_mapping, history.isbn_mapping, str(tmp_path / 'merged')
+    )
+    # Mêmes bornes de mise à l'échelle : le scaler de la base reste valable
+    assert rebuilt.meta['scaler_min'] == pytest.approx(history.meta['scaler_min'])
+    assert rebuilt.meta['scaler_max'] == pytest.approx(history.meta['scaler_max'])
+
+    users = range(len(history.user_mapping))
+    np.testing.assert_allclose(history.get_dense_batch(users), rebuilt.get_dense_batch(users), atol=1e-5)
+    assert sorted(history.updated_users()) == sorted(history.user_mapping[u] for u, _ in additions[:3])
+
+
+def test_replay_after_restart(tmp_path, ratings, additions):
+    delta_dir = str(tmp_path / 'delta')
+    history = incremental(tmp_path, ratings, delta_dir)
+    for user_id, new_ratings in additions:
+        history.add_ratings(user_id, new_ratings)
+
+    # Redémarrage : mappings du modèle d'origine, journal rejoué
+    restarted = incremental(tmp_path, ratings, delta_dir)
+    assert dict(restarted.user_mapping) == dict(history.user_mapping)
+    users = range(len(history.user_mapping))
+    np.testing.assert_array_equal(restarted.get_dense_batch(users), history.get_dense_batch(users))
+
+
+def test_sync_applies_entries_from_other_processes(tmp_path, ratings, additions):
+    delta_dir = str(tmp_path / 'delta')
+    writer = incremental(tmp_path, ratings, delta_dir)
+    reader = incremental(tmp_path, ratings, delta_dir)
+    assert reader.sync() == []
+
+    for user_id, new_ratings in additions:
+        writer.add_ratings(user_id, new_ratings)
+    changed = reader.sync()
+    assert sorted(set(changed)) == sorted(writer.updated_users())
+    assert reader.sync() == []
+
+    # Le lecteur écrit à son tour : il applique d'abord les entrées de l'autre processus
+    isbn = next(iter(additions[2][1]))
+    reader.add_ratings(NEW_USER + 1, {isbn: 9})
+    writer.sync()
+    assert dict(reader.user_mapping) == dict(writer.user_mapping)
+    users = range(len(writer.user_mapping))
+    np.testing.assert_array_equal(reader.get_dense_batch(users), writer.get_dense_batch(users))
@@ -0,0 +1,75 @@
+"""BookRecommender : les livres déjà notés sont exclus, y compris ceux notés à la moyenne"""
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import build_mappings, generate_ratings, random_model, write_ratings
+from utils.item_index import build_item_index
+from utils.model_loader import ModelLoader
+from utils.rating_delta import IncrementalUserHistory
+from utils.recommender import BookRecommender
+from utils.user_history import UserHistoryStore
+
+torch = pytest.importorskip('torch')
+
+USER, ISBN, RATING = UserHistoryStore.USER_COL, UserHistoryStore.ISBN_COL, UserHistoryStore.RATING_COL
+NEW_USER = 10**6
+
+
+@pytest.fixture(scope='module')
+def ratings():
+    ratings = generate_ratings(100, 120, ratings_per_user=10, seed=3)
+    # Utilisateur qui donne la même note à tous ses livres : ligne CSR vide
+    ratings.loc[ratings[USER] == ratings[USER].iloc[0], RATING] = 8
+    return ratings
+
+
+@pytest.fixture
+def setup(tmp_path, ratings):
+    user_mapping, isbn_mapping = build_mappings(ratings)
+    model_path = str(tmp_path / 'dae_model.pkl')
+    torch.save(
+        {'model': random_model(len(isbn_mapping)), 'user_mapping': user_mapping, 'isbn_mapping': isbn_mapping},
+        model_path
+    )
+    loader = ModelLoader(model_path)
+    assert loader.load_model()
+    base = UserHistoryStore.build(
+        write_ratings(ratings, str(tmp_path)), user_mapping, isbn_mapping, str(tmp_path / 'history')
+    )
+    return loader, base
+
+
+def recommended(recommender, user_id):
+    num_items = len(recommender.model_loader.isbn_mapping)
+    return [isbn for isbn, _ in recommender.recommend_batch([user_id], num_items, exclude_rated=True)[user_id]]
+
+
+@pytest.mark.parametrize('index_mode', [None, 'exact'])
+def test_excludes_books_rated_at_user_mean(setup, ratings, index_mode):
+    loader, base = setup
+    item_index = build_item_index(loader, index_mode, nprobe=4) if index_mode else None
+    recommender = BookRecommender(loader, None, base, item_index=item_index)
+
+    flat_user = int(ratings[USER].iloc[0])
+    rated = set(ratings.loc[ratings[USER] == flat_user, ISBN])
+    assert len(base.get_user_row(loader.user_mapping[flat_user])[0]) == 0
+
+    books = recommended(recommender, flat_user)
+    assert not rated & set(books)
+    assert len(books) == len(loader.isbn_mapping) - len(rated)
+
+
+def test_excludes_folded_in_books_rated_at_new_mean(setup, ratings):
+    loader, base = setup
+    history = IncrementalUserHistory(base, loader.user_mapping, loader.isbn_mapping)
+    isbns = sorted(loader.isbn_mapping)
+    new_ratings = {isbns[0]: 6, isbns[1]: 8, isbns[2]: 7}
+    history.add_ratings(NEW_USER, new_ratings, log=False)
+
+    user_idx = history.user_mapping[NEW_USER]
+    # La note 7 est la moyenne : absente de la ligne, mais bien notée
+    assert len(history.get_user_row(user_idx)[0]) == 2
+    assert sorted(history.get_rated_items(user_idx)) == sorted(loader.isbn_mapping[i] for i in new_ratings)
+
+    books = recommended(BookRecommender(loader, None, history), NEW_USER)
+    assert not set(new_ratings) & set(books)
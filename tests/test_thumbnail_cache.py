@@ -0,0 +1,201 @@
+"""ThumbnailCache contre un serveur d'images local : remplacement, déduplication, éviction"""
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.thumbnail_cache import LEGACY_PLACEHOLDER_URL, ThumbnailCache
+
+
+def noise_image(seed: int) -> bytes:
+    """PNG de bruit : chaque graine donne une couverture distincte, de taille JPEG voisine"""
+    pixels = np.random.default_rng(seed).integers(0, 256, (300, 200, 3), dtype=np.uint8)
+    output = io.BytesIO()
+    Image.fromarray(pixels).save(output, format='PNG')
+    return output.getvalue()
+
+
+class StubImageServer(ThreadingHTTPServer):
+    """Sert `images[chemin]`, 404 sinon ; compte les requêtes"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubImageHandler)
+        self.images = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0.0
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}{path}'
+
+    def count(self, path: str) -> int:
+        return self.requests.count(path)
+
+
+class StubImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            body = server.images.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StubImageServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+
+    def make_cache(**kwargs):
+        cache = ThumbnailCache(str(tmp_path / f'thumbnails{len(caches)}'), **kwargs)
+        caches.append(cache)
+        return cache
+
+    yield make_cache
+    for cache in caches:
+        cache.close()
+
+
+def last_access(cache, url):
+    return cache._lookup(url)[2]
+
+
+def test_placeholder_without_network(server, make_cache):
+    cache = make_cache()
+    placeholder = cache.placeholder()
+    assert Image.open(io.BytesIO(placeholder)).size == cache.size
+    assert cache.get('') == placeholder
+    assert cache.get(None) == placeholder
+    assert cache.get(LEGACY_PLACEHOLDER_URL) == placeholder
+    assert server.requests == []
+
+
+def test_failed_download_retried_after_ttl(server, make_cache):
+    url = server.url('/missing.png')
+    cache = make_cache(failure_ttl=3600)
+    assert cache.get(url) == cache.placeholder()
+    # Échec récent : aucun nouvel essai
+    assert cache.get(url) == cache.placeholder()
+    assert server.count('/missing.png') == 1
+
+    expired = make_cache(failure_ttl=0)
+    assert expired.get(url) == expired.placeholder()
+    server.images['/missing.png'] = noise_image(0)
+    data = expired.get(url)
+    assert data != expired.placeholder()
+    assert server.count('/missing.png') == 3
+
+
+def test_downscaled_and_served_from_disk(server, make_cache):
+    server.images['/a.png'] = noise_image(0)
+    cache = make_cache()
+    data = cache.get(server.url('/a.png'))
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.format == 'JPEG'
+        assert image.size[0] <= cache.size[0] and image.size[1] <= cache.size[1]
+    assert cache.get(server.url('/a.png')) == data
+    assert server.count('/a.png') == 1
+
+
+def test_identical_images_stored_once(server, make_cache):
+    server.images['/a.png'] = server.images['/b.png'] = noise_image(0)
+    server.images['/c.png'] = noise_image(1)
+    cache = make_cache()
+    first, second, third = (cache.get(server.url(path)) for path in ('/a.png', '/b.png', '/c.png'))
+    assert first == second != third
+    stats = cache.stats()
+    assert (stats['images'], stats['urls']) == (2, 3)
+    assert stats['bytes'] == len(first) + len(third)
+
+
+def test_least_recently_served_images_evicted(server, make_cache):
+    paths = [f'/{i}.png' for i in range(4)]
+    for seed, path in enumerate(paths):
+        server.images[path] = noise_image(seed)
+    probe = make_cache()
+    sizes = [len(probe._downscale(server.images[path])) for path in paths]
+
+    # Place pour les trois premières seulement
+    cache = make_cache(max_bytes=sum(sizes[:3]), touch_interval=0)
+    for path in paths[:3]:
+        cache.get(server.url(path))
+        time.sleep(0.01)
+    # Servie à nouveau : la plus récente, conservée
+    cache.get(server.url(paths[0]))
+    time.sleep(0.01)
+    cache.get(server.url(paths[3]))
+
+    assert cache.stats()['bytes'] <= cache.max_bytes
+    assert cache._lookup(server.url(paths[1])) is None
+    for path in (paths[0], paths[3]):
+        cache.get(server.url(path))
+        assert server.count(path) == 1
+
+
+def test_hits_touch_access_time_at_most_once_per_interval(server, make_cache):
+    server.images['/a.png'] = noise_image(0)
+    url = server.url('/a.png')
+
+    cache = make_cache(touch_interval=3600)
+    cache.get(url)
+    stored = last_access(cache, url)
+    time.sleep(0.01)
+    cache.get(url)
+    assert last_access(cache, url) == stored
+
+    cache.touch_interval = 0
+    cache.get(url)
+    assert last_access(cache, url) > stored
+
+
+def test_get_async_downloads_page_concurrently(server, make_cache):
+    paths = [f'/{i}.png' for i in range(6)]
+    for seed, path in enumerate(paths):
+        server.images[path] = noise_image(seed)
+    server.delay = 0.2
+    cache = make_cache(max_workers=8)
+
+    start = time.monotonic()
+    # Même URL demandée deux fois : un seul téléchargement
+    futures = [cache.get_async(server.url(path)) for path in paths + paths[:1]]
+    results = [future.result(5) for future in futures]
+    elapsed = time.monotonic() - start
+
+    assert results[0] == results[-1] != cache.placeholder()
+    assert server.count(paths[0]) == 1
+    assert server.max_active >= 4
+    assert elapsed < 0.2 * len(paths) / 2
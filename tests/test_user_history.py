@@ -0,0 +1,105 @@
+"""UserHistoryStore : mêmes lignes que le pivot_table et la normalisation du notebook"""
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import build_mappings, generate_ratings, write_ratings
+from utils.user_history import UserHistoryStore, load_or_build_user_history
+
+USER, ISBN, RATING = UserHistoryStore.USER_COL, UserHistoryStore.ISBN_COL, UserHistoryStore.RATING_COL
+
+
+def notebook_matrix(ratings: pd.DataFrame, user_mapping, isbn_mapping):
+    """Référence : pivot_table (moyenne des doublons), centrage par utilisateur, MinMaxScaler sur les non-nuls"""
+    ratings = ratings[
+        (ratings[RATING] > 0)
+        & ratings[USER].isin(list(user_mapping))
+        & ratings[ISBN].isin(list(isbn_mapping))
+    ]
+    pivot = ratings.pivot_table(index=USER, columns=ISBN, values=RATING, fill_value=0)
+    pivot = pivot.reindex(
+        index=sorted(user_mapping, key=user_mapping.get),
+        columns=sorted(isbn_mapping, key=isbn_mapping.get),
+        fill_value=0
+    )
+    matrix = pivot.to_numpy(dtype=np.float64)
+
+    with np.errstate(invalid='ignore'):
+        means = np.nan_to_num(matrix.sum(1) / (matrix > 0).sum(1))
+    centered = matrix - means[:, None]
+    centered[matrix == 0] = 0
+    nonzero = centered != 0
+    low, high = centered[nonzero].min(), centered[nonzero].max()
+    scaled = np.zeros_like(centered)
+    scaled[nonzero] = (centered[nonzero] - low) / (high - low)
+    return scaled, means
+
+
+@pytest.fixture(scope='module')
+def ratings():
+    ratings = generate_ratings(300, 400, ratings_per_user=20)
+    extra = pd.DataFrame({
+        # Doublon (moyenné), note implicite 0 (ignorée), ISBN et utilisateur hors mappings
+        USER: [ratings[USER].iloc[0], ratings[USER].iloc[0], 1, 10**6],
+        ISBN: [ratings[ISBN].iloc[0], ratings[ISBN].iloc[1], 'UNKNOWN', ratings[ISBN].iloc[2]],
+        RATING: [3, 0, 7, 8],
+    })
+    return pd.concat([ratings, extra], ignore_index=True)
+
+
+@pytest.fixture(scope='module')
+def mappings(ratings):
+    known = ratings[(ratings[USER] < 10**6) & (ratings[ISBN] != 'UNKNOWN')]
+    user_mapping, isbn_mapping = build_mappings(known)
+    # Index des livres dans l'ordre inverse des clés
+    isbn_mapping = {isbn: len(isbn_mapping) - 1 - idx for isbn, idx in isbn_mapping.items()}
+    return user_mapping, isbn_mapping
+
+
+def test_build_matches_notebook_pivot(tmp_path, ratings, mappings):
+    user_mapping, isbn_mapping = mappings
+    ratings_file = write_ratings(ratings, str(tmp_path))
+    store = UserHistoryStore.build(ratings_file, user_mapping, isbn_mapping, str(tmp_path / 'history'))
+
+    expected, means = notebook_matrix(ratings, user_mapping, isbn_mapping)
+    actual = store.get_dense_batch(range(len(user_mapping)))
+    np.testing.assert_allclose(actual, expected, atol=1e-6)
+    np.testing.assert_allclose(store.user_means, means, rtol=1e-6)
+
+
+def test_matches_checks_mapping_keys(tmp_path, ratings, mappings):
+    user_mapping, isbn_mapping = mappings
+    ratings_file = write_ratings(ratings, str(tmp_path))
+    store = UserHistoryStore.build(ratings_file, user_mapping, isbn_mapping, str(tmp_path / 'history'))
+    assert store.matches(user_mapping, isbn_mapping)
+
+    # Même taille, autre ordre : le store ne doit pas être réutilisé
+    first, second = list(isbn_mapping)[:2]
+    reordered = dict(isbn_mapping, **{first: isbn_mapping[second], second: isbn_mapping[first]})
+    assert not store.matches(user_mapping, reordered)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="fork indisponible")
+def test_concurrent_processes_build_once(tmp_path, ratings, mappings):
+    user_mapping, isbn_mapping = mappings
+    ratings_file = write_ratings(ratings, str(tmp_path))
+    store_dir = str(tmp_path / 'history')
+    context = multiprocessing.get_context('fork')
+    versions = context.Queue()
+
+    def worker():
+        store = load_or_build_user_history(store_dir, ratings_file, user_mapping, isbn_mapping)
+        versions.put(store.version)
+
+    processes = [context.Process(target=worker) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+    # Un seul processus construit, les autres ouvrent le même store
+    assert len({versions.get(timeout=5) for _ in processes}) == 1
+    assert not [name for name in os.listdir(store_dir) if name.endswith('.tmp')]
+    assert UserHistoryStore(store_dir).load()
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import struct
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from utils.id_index import IdIndex
+
+ARTIFACT_MAGIC = b'DAEART01'
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACT_EXT = '.dae'
+ALIGNMENT = 64
+
+# Couches Linear du DenoisingAutoEncoder (nom dans le state_dict -> nom plat)
+LAYERS = {
+    'encoder.0': 'enc1',
+    'encoder.3': 'enc2',
+    'decoder.0': 'dec1',
+    'decoder.3': 'dec2'
+}
+
+
+class ArtifactError(Exception):
+    """Artefact modèle invalide ou incompatible"""
+
+
+class FlatArtifact:
+    """Artefact modèle à plat : en-tête JSON + tableaux bruts alignés, lus en mmap
+
+    Format du fichier :
+        MAGIC (8 octets) | taille de l'en-tête (uint64) | en-tête JSON | tableaux
+
+    Chaque tableau est décrit dans l'en-tête par (dtype, shape, offset) et
+    ouvert comme une vue sur un unique `np.memmap` en lecture seule : les
+    processus qui ouvrent le même fichier partagent les mêmes pages.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header: Dict[str, Any] = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        self._mmap = None
+
+    def open(self) -> 'FlatArtifact':
+        with open(self.path, 'rb') as f:
+            magic = f.read(len(ARTIFACT_MAGIC))
+            if magic != ARTIFACT_MAGIC:
+                raise ArtifactError(f"Signature invalide pour {self.path}")
+            size_field = f.read(8)
+            if len(size_field) != 8:
+                raise ArtifactError(f"En-tête tronqué pour {self.path}")
+            (header_len,) = struct.unpack('<Q', size_field)
+            encoded = f.read(header_len)
+            if len(encoded) != header_len:
+                raise ArtifactError(f"En-tête tronqué pour {self.path}")
+            self.header = json.loads(encoded.decode('utf-8'))
+
+        if self.header.get('format_version') != ARTIFACT_FORMAT_VERSION:
+            raise ArtifactError(f"Version de format non supportée: {self.header.get('format_version')}")
+
+        self._mmap = np.memmap(self.path, dtype=np.uint8, mode='r')
+        for name, spec in self.header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'], dtype=np.int64))
+            if spec['offset'] + count * dtype.itemsize > len(self._mmap):
+                raise ArtifactError(f"Tableau {name} tronqué dans {self.path}")
+            self.arrays[name] = np.frombuffer(
+                self._mmap, dtype=dtype, count=count, offset=spec['offset']
+            ).reshape(spec['shape'])
+        return self
+
+    @property
+    def version(self) -> str:
+        return self.header['version']
+
+    @property
+    def num_items(self) -> int:
+        return self.header['num_items']
+
+    @property
+    def latent_dim(self) -> int:
+        return self.header['latent_dim']
+
+    def layer(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Retourne (weight, bias) d'une couche plate ('enc1', 'enc2', 'dec1', 'dec2')"""
+        return self.arrays[f'{name}.weight'], self.arrays[f'{name}.bias']
+
+    def mapping_arrays(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Retourne (clés triées, indices) d'un mapping ('user' ou 'isbn')"""
+        return self.arrays[f'{name}_keys'], self.arrays[f'{name}_values']
+
+    def mapping_dict(self, name: str) -> Dict:
+        """Reconstruit un mapping sous forme de dict Python"""
+        keys, values = self.mapping_arrays(name)
+        if keys.dtype.kind == 'S':
+            keys = np.char.decode(keys, 'utf-8')
+        return dict(zip(keys.tolist(), values.tolist()))
+
+    def validate(self):
+        """Vérifie la cohérence des formes avec DenoisingAutoEncoder et les mappings"""
+        num_items, latent_dim = self.num_items, self.latent_dim
+        expected = {
+            'enc1': (256, num_items),
+            'enc2': (latent_dim, 256),
+            'dec1': (256, latent_dim),
+            'dec2': (num_items, 256)
+        }
+        for name, shape in expected.items():
+            weight, bias = self.layer(name)
+            if weight.shape != shape or bias.shape != (shape[0],):
+                raise ArtifactError(
+                    f"Forme invalide pour {name}: {weight.shape}/{bias.shape}, attendu {shape}"
+                )
+
+        for name, size in (('user', self.header['num_users']), ('isbn', num_items)):
+            keys, values = self.mapping_arrays(name)
+            if len(keys) != size or len(values) != size:
+                raise ArtifactError(f"Taille invalide pour le mapping {name}")
+            if size > 1 and not np.all(keys[1:] > keys[:-1]):
+                raise ArtifactError(f"Clés du mapping {name} non triées ou dupliquées")
+        _, isbn_values = self.mapping_arrays('isbn')
+        if not np.array_equal(np.sort(isbn_values), np.arange(num_items)):
+            raise ArtifactError("Les indices ISBN ne couvrent pas toutes les colonnes du modèle")
+
+
+def _mapping_to_arrays(mapping: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    """Convertit un dict en (clés triées, valeurs) ; ISBN encodés en octets"""
+    if isinstance(mapping, IdIndex) and len(mapping) == len(mapping.key_arrays()[0]):
+        keys, values = mapping.key_arrays()
+        return np.asarray(keys), np.asarray(values, dtype=np.int32)
+    keys = list(mapping.keys())
+    if keys and isinstance(keys[0], str):
+        key_array = np.array([k.encode('utf-8') for k in keys])
+    else:
+        key_array = np.array(keys, dtype=np.int64)
+    values = np.array([mapping[k] for k in keys], dtype=np.int32)
+    order = np.argsort(key_array, kind='stable')
+    return key_array[order], values[order]
+
+
+def export_artifact(
+    model,
+    user_mapping: Dict,
+    isbn_mapping: Dict,
+    path: str,
+    version: Optional[str] = None,
+    extra: Optional[Dict[str, Any]] = None
+) -> str:
+    """Écrit un modèle DenoisingAutoEncoder et ses mappings au format plat"""
+    state = {k: v.detach().cpu().numpy() for k, v in model.state_dict().items()}
+    arrays = {}
+    for torch_name, flat_name in LAYERS.items():
+        arrays[f'{flat_name}.weight'] = np.ascontiguousarray(state[f'{torch_name}.weight'], dtype=np.float32)
+        arrays[f'{flat_name}.bias'] = np.ascontiguousarray(state[f'{torch_name}.bias'], dtype=np.float32)
+    arrays['user_keys'], arrays['user_values'] = _mapping_to_arrays(user_mapping)
+    arrays['isbn_keys'], arrays['isbn_values'] = _mapping_to_arrays(isbn_mapping)
+
+    if version is None:
+        digest = hashlib.sha256()
+        for name in sorted(arrays):
+            digest.update(name.encode())
+            digest.update(arrays[name].tobytes())
+        version = digest.hexdigest()[:16]
+
+    header = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'version': version,
+        'created_at': time.time(),
+        'num_items': arrays['enc1.weight'].shape[1],
+        'num_users': len(user_mapping),
+        'latent_dim': arrays['enc2.weight'].shape[0],
+        'arrays': {},
+        **(extra or {})
+    }
+
+    # Calcul des offsets : l'en-tête est écrit avec une taille fixée puis complétée
+    def layout(header_len: int) -> int:
+        offset = _align(len(ARTIFACT_MAGIC) + 8 + header_len)
+        for name, array in arrays.items():
+            header['arrays'][name] = {
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+                'offset': offset
+            }
+            offset = _align(offset + array.nbytes)
+        return offset
+
+    header_len = 4096
+    while True:
+        layout(header_len)
+        encoded = json.dumps(header).encode('utf-8')
+        if len(encoded) <= header_len:
+            break
+        header_len = _align(len(encoded) * 2)
+    encoded = encoded.ljust(header_len, b' ')
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(ARTIFACT_MAGIC)
+        f.write(struct.pack('<Q', header_len))
+        f.write(encoded)
+        for name, array in arrays.items():
+            f.seek(header['arrays'][name]['offset'])
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+    print(f"✅ Artefact exporté: {path} (version {version})")
+    return version
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+if __name__ == '__main__':
+    import sys
+
+    from config import Config
+    from utils.model_loader import ModelLoader
+
+    source = sys.argv[1] if len(sys.argv) > 1 else Config.MODEL_PATH
+    target = sys.argv[2] if len(sys.argv) > 2 else Config.ARTIFACT_PATH
+
+    loader = ModelLoader(source)
+    if loader.load_model():
+        export_artifact(loader.model, loader.user_mapping, loader.isbn_mapping, target)
@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+
+class OverloadedError(Exception):
+    """File d'attente pleine : la requête est refusée (backpressure)"""
+
+
+class MicroBatcher:
+    """Regroupe les requêtes concurrentes en une seule passe du modèle
+
+    Un thread dédié collecte les requêtes pendant au plus `max_wait_ms` ou
+    jusqu'à `max_batch_size`, puis appelle `recommender.recommend_batch` une
+    seule fois pour tout le lot. La file est bornée : au-delà de `max_queue`
+    requêtes en attente, `submit` lève `OverloadedError`.
+    """
+
+    def __init__(
+        self,
+        recommender,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 1024
+    ):
+        self.recommender = recommender
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self.batches = 0
+        self.requests = 0
+        self._thread.start()
+
+    def submit(self, user_id: int, k: int, timeout: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Top-k d'un utilisateur ; TimeoutError si le résultat n'arrive pas à temps"""
+        future: Future = Future()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self._queue.put_nowait((user_id, k, deadline, future))
+        except queue.Full:
+            raise OverloadedError("File d'attente du modèle pleine")
+        return future.result(timeout=timeout)
+
+    def _collect(self) -> list:
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        window_end = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = window_end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+
+            # Les requêtes déjà expirées côté client ne sont pas calculées
+            now = time.monotonic()
+            live = [
+                item for item in batch
+                if (item[2] is None or item[2] > now) and item[3].set_running_or_notify_cancel()
+            ]
+            if not live:
+                continue
+
+            try:
+                k_max = max(k for _, k, _, _ in live)
+                results: Dict[int, list] = self.recommender.recommend_batch(
+                    list(dict.fromkeys(user_id for user_id, _, _, _ in live)), k_max
+                )
+                for user_id, k, _, future in live:
+                    future.set_result(results.get(user_id, [])[:k])
+            except Exception as e:
+                for _, _, _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+
+            self.batches += 1
+            self.requests += len(live)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'avg_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'queue_size': self._queue.qsize()
+        }
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
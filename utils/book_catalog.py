@@ -0,0 +1,306 @@
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import logger
+
+_YEAR = re.compile(r'^\s*(\d{4})')
+
+
+class BookCatalog:
+    """Catalogue colonnaire des livres, aligné sur les index de `isbn_mapping`
+
+    Une entrée par livre du modèle, dans des tableaux NumPy :
+
+    - `status` : métadonnées inconnues (0), disponibles (1) ou introuvables (2) ;
+      un livre introuvable redevient inconnu `missing_ttl` secondes après
+      `missing_at` (même délai que le cache négatif de l'API) ;
+    - `language` / `category` : codes dans les vocabulaires `languages` /
+      `categories` (0 = inconnu ; seule la première catégorie est retenue) ;
+    - `year` : année de publication (0 = inconnue).
+
+    Le catalogue est alimenté par les résultats de `GoogleBooksAPI` (métadonnées
+    parsées et ISBN introuvables) et sert à construire des masques booléens
+    appliqués aux scores avant le top-k. Il est sauvegardé dans un seul
+    fichier .npz (écriture atomique), ré-aligné au chargement si le mapping
+    des ISBN a changé.
+    """
+
+    UNKNOWN = 0
+    AVAILABLE = 1
+    MISSING = 2
+
+    COLUMNS = ('status', 'language', 'category', 'year', 'missing_at')
+
+    def __init__(
+        self,
+        path: Optional[str],
+        isbn_mapping,
+        save_interval: float = 60.0,
+        missing_ttl: float = 24 * 3600
+    ):
+        self.path = path
+        self.isbn_mapping = isbn_mapping
+        self.save_interval = save_interval
+        self.missing_ttl = missing_ttl
+        num_items = len(isbn_mapping)
+        self.status = np.zeros(num_items, dtype=np.int8)
+        self.language = np.zeros(num_items, dtype=np.int16)
+        self.category = np.zeros(num_items, dtype=np.int16)
+        self.year = np.zeros(num_items, dtype=np.int16)
+        self.missing_at = np.zeros(num_items, dtype=np.float64)
+        self.languages: List[str] = ['']
+        self.categories: List[str] = ['']
+        self.version = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._masks: Dict[Tuple, Tuple[int, np.ndarray]] = {}
+        self._next_expiry = float('inf')
+
+    # Chargement / sauvegarde
+
+    def load(self) -> bool:
+        """Charge le catalogue sauvegardé et l'aligne sur le mapping courant"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as data:
+                isbns = data['isbns']
+                positions = self.isbn_mapping.lookup_batch(isbns) if hasattr(self.isbn_mapping, 'lookup_batch') \
+                    else np.array([self.isbn_mapping.get(i.decode('utf-8'), -1) for i in isbns.tolist()])
+                found = positions >= 0
+                self.languages = data['languages'].tolist()
+                self.categories = data['categories'].tolist()
+                for column in self.COLUMNS:
+                    # Ancien fichier sans date : introuvables considérés comme expirés
+                    if column in data.files:
+                        getattr(self, column)[positions[found]] = data[column][found]
+        except Exception as e:
+            logger.warning(f"Catalogue illisible ({self.path}): {e}")
+            return False
+
+        self._update_next_expiry()
+        self.version += 1
+        logger.info(f"Catalogue chargé: {int(found.sum())}/{len(isbns)} livres alignés sur le modèle")
+        return True
+
+    def save(self):
+        """Écrit le catalogue (fichier temporaire puis renommage)"""
+        if not self.path:
+            return
+        with self._save_lock:
+            self._write()
+
+    def _write(self):
+        with self._lock:
+            columns = {column: getattr(self, column).copy() for column in self.COLUMNS}
+            languages, categories = list(self.languages), list(self.categories)
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+        isbns = np.array([isbn.encode('utf-8') for isbn in self._isbns_by_index()])
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f, isbns=isbns, languages=np.array(languages), categories=np.array(categories), **columns
+            )
+        os.replace(tmp_path, self.path)
+
+    def maybe_save(self):
+        """Sauvegarde si le catalogue a changé depuis plus de `save_interval` secondes"""
+        if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            try:
+                self.save()
+            except OSError as e:
+                logger.warning(f"Sauvegarde du catalogue impossible: {e}")
+
+    def _isbns_by_index(self) -> List[str]:
+        if hasattr(self.isbn_mapping, 'keys_for'):
+            return self.isbn_mapping.keys_for(range(len(self.status)))
+        reverse = {idx: isbn for isbn, idx in self.isbn_mapping.items()}
+        return [reverse[idx] for idx in range(len(self.status))]
+
+    # Alimentation
+
+    def record(self, isbn: str, book_info: Optional[Dict]):
+        """Enregistre des métadonnées parsées, ou None pour un ISBN introuvable"""
+        idx = self.isbn_mapping.get(isbn)
+        if idx is None or idx >= len(self.status):
+            return
+        with self._lock:
+            if book_info is None:
+                self.status[idx] = self.MISSING
+                self.missing_at[idx] = time.time()
+                self._next_expiry = min(self._next_expiry, self.missing_at[idx] + self.missing_ttl)
+            else:
+                self.status[idx] = self.AVAILABLE
+                self.language[idx] = self._code(self.languages, self._language_of(book_info))
+                self.category[idx] = self._code(self.categories, self._category_of(book_info))
+                self.year[idx] = self._year_of(book_info)
+            self.version += 1
+            self._dirty = True
+        self.maybe_save()
+
+    def observe(self, isbn: str, book_info: Dict):
+        """Enregistre des métadonnées lues dans le cache si le livre n'est pas encore connu"""
+        idx = self.isbn_mapping.get(isbn)
+        if idx is not None and idx < len(self.status) and self.status[idx] != self.AVAILABLE:
+            self.record(isbn, book_info)
+
+    def expire_missing(self) -> int:
+        """Repasse en inconnus les livres introuvables depuis plus de `missing_ttl` secondes"""
+        if time.time() < self._next_expiry:
+            return 0
+        with self._lock:
+            expired = (self.status == self.MISSING) & (self.missing_at + self.missing_ttl <= time.time())
+            count = int(expired.sum())
+            if count:
+                self.status[expired] = self.UNKNOWN
+                self.version += 1
+                self._dirty = True
+            self._update_next_expiry()
+        return count
+
+    def _update_next_expiry(self):
+        missing = self.status == self.MISSING
+        self._next_expiry = float(self.missing_at[missing].min()) + self.missing_ttl if missing.any() else float('inf')
+
+    def fill_from_cache(self, cache) -> int:
+        """Complète le catalogue avec les entrées valides du cache de métadonnées"""
+        count = 0
+        for isbn, book_info in cache.iter_entries():
+            idx = self.isbn_mapping.get(isbn)
+            if idx is not None and idx < len(self.status) and self.status[idx] == self.UNKNOWN:
+                self.record(isbn, book_info)
+                count += 1
+        return count
+
+    @staticmethod
+    def _code(vocabulary: List[str], value: str) -> int:
+        if not value:
+            return 0
+        try:
+            return vocabulary.index(value)
+        except ValueError:
+            if len(vocabulary) >= np.iinfo(np.int16).max:
+                return 0
+            vocabulary.append(value)
+            return len(vocabulary) - 1
+
+    @staticmethod
+    def _language_of(book_info: Dict) -> str:
+        language = book_info.get('language') or ''
+        return '' if language == 'N/A' else language.lower()
+
+    @staticmethod
+    def _category_of(book_info: Dict) -> str:
+        categories = book_info.get('categories') or []
+        return categories[0] if categories else ''
+
+    @staticmethod
+    def _year_of(book_info: Dict) -> int:
+        match = _YEAR.match(str(book_info.get('published_date') or ''))
+        return int(match.group(1)) if match else 0
+
+    # Filtres
+
+    def mask(
+        self,
+        language: Optional[str] = None,
+        categories: Optional[Iterable[str]] = None,
+        min_year: Optional[int] = None,
+        max_year: Optional[int] = None
+    ) -> np.ndarray:
+        """Masque des livres recommandables (True) pour des filtres métier
+
+        Les livres introuvables sont toujours exclus. Un livre dont l'attribut
+        filtré est inconnu reste candidat : il est vérifié avec `matches` une
+        fois ses métadonnées récupérées.
+        """
+        self.expire_missing()
+        categories = tuple(sorted(categories)) if categories else ()
+        key = (language, categories, min_year, max_year)
+        cached = self._masks.get(key)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+
+        version = self.version
+        allowed = self.status != self.MISSING
+        if language:
+            code = self._lookup(self.languages, language.lower())
+            allowed &= (self.language == 0) | (self.language == code)
+        if categories:
+            codes = [c for c in (self._lookup(self.categories, name) for name in categories) if c > 0]
+            allowed &= (self.category == 0) | np.isin(self.category, codes)
+        if min_year:
+            allowed &= (self.year == 0) | (self.year >= min_year)
+        if max_year:
+            allowed &= (self.year == 0) | (self.year <= max_year)
+
+        if len(self._masks) > 64:
+            self._masks.clear()
+        self._masks[key] = (version, allowed)
+        return allowed
+
+    @staticmethod
+    def _lookup(vocabulary: List[str], value: str) -> int:
+        try:
+            return vocabulary.index(value)
+        except ValueError:
+            return -1
+
+    @classmethod
+    def matches(
+        cls,
+        book_info: Dict,
+        language: Optional[str] = None,
+        categories: Optional[Iterable[str]] = None,
+        min_year: Optional[int] = None,
+        max_year: Optional[int] = None
+    ) -> bool:
+        """Les métadonnées récupérées satisfont-elles les filtres ? (attributs inconnus acceptés)"""
+        book_language = cls._language_of(book_info)
+        if language and book_language and book_language != language.lower():
+            return False
+        category = cls._category_of(book_info)
+        if categories and category and category not in set(categories):
+            return False
+        year = cls._year_of(book_info)
+        if min_year and year and year < min_year:
+            return False
+        if max_year and year and year > max_year:
+            return False
+        return True
+
+    def is_missing(self, isbn: str) -> bool:
+        """Livre introuvable lors d'une recherche de moins de `missing_ttl` secondes"""
+        idx = self.isbn_mapping.get(isbn)
+        return (
+            idx is not None and idx < len(self.status)
+            and self.status[idx] == self.MISSING
+            and time.time() - self.missing_at[idx] < self.missing_ttl
+        )
+
+    def is_unknown(self, indices: np.ndarray) -> np.ndarray:
+        """Masque des livres sans métadonnées connues (introuvables expirés inclus)"""
+        self.expire_missing()
+        return self.status[indices] == self.UNKNOWN
+
+    def stats(self) -> Dict[str, int]:
+        self.expire_missing()
+        counts = np.bincount(self.status, minlength=3)
+        return {
+            'books': len(self.status),
+            'unknown': int(counts[self.UNKNOWN]),
+            'available': int(counts[self.AVAILABLE]),
+            'missing': int(counts[self.MISSING]),
+            'languages': len(self.languages) - 1,
+            'categories': len(self.categories) - 1
+        }
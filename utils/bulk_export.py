@@ -0,0 +1,309 @@
+"""Export nocturne du top-N de tous les utilisateurs (CSV ou Parquet partitionné)
+
+Le modèle, l'historique et les tables sont chargés une seule fois dans le
+processus parent, puis un pool de processus (fork) score les utilisateurs
+par partitions de `partition_size` index consécutifs. Chaque worker écrit sa
+partition lot par lot dans un fichier temporaire renommé à la fin : aucune
+partition n'est gardée entière en mémoire, et une partition présente dans
+le dossier de sortie est terminée.
+
+Relancer la même commande reprend l'export là où il s'était arrêté : les
+partitions déjà écrites sont ignorées, à condition que `_manifest.json`
+(modèle, historique, paramètres) corresponde.
+
+Usage :
+    python -m utils.bulk_export --output-dir exports/2026-10-18 --k 20 --workers 4
+    python -m utils.bulk_export --format parquet --with-metadata
+"""
+import argparse
+import csv
+import gc
+import json
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from utils.prefork import limit_threads
+
+MANIFEST_FILE = '_manifest.json'
+SUCCESS_FILE = '_SUCCESS'
+METADATA_COLUMNS = ['title', 'authors', 'language', 'published_date', 'categories']
+
+# Composants hérités par les workers au fork (chargés une seule fois)
+_state: Dict = {}
+
+
+class PartitionWriter:
+    """Écriture en flux d'une partition (CSV ou Parquet), publiée par renommage"""
+
+    def __init__(self, path: str, columns: List[str], fmt: str):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.columns = columns
+        self.fmt = fmt
+        if fmt == 'parquet':
+            self._writer = None
+        else:
+            self._file = open(self.tmp_path, 'w', newline='', encoding='utf-8')
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(columns)
+
+    def write(self, rows: List[Tuple]):
+        if self.fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pylist([dict(zip(self.columns, row)) for row in rows])
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.tmp_path, table.schema)
+            self._writer.write_table(table)
+        else:
+            self._csv.writerows(rows)
+
+    def close(self):
+        if self.fmt == 'parquet':
+            if self._writer is not None:
+                self._writer.close()
+            else:
+                # Partition sans ligne : fichier vide mais valide
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                pq.write_table(pa.table({c: [] for c in self.columns}), self.tmp_path)
+        else:
+            self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self.fmt != 'parquet':
+            self._file.close()
+        elif self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def partition_path(output_dir: str, partition: int, fmt: str) -> str:
+    return os.path.join(output_dir, f"part-{partition:05d}.{fmt}")
+
+
+def _init_worker(threads: int):
+    limit_threads(threads)
+    if _state['options']['with_metadata']:
+        # Connexion SQLite propre au processus
+        _state['api'].after_fork()
+
+
+def _export_partition(partition: int) -> Tuple[int, int, float]:
+    """Score et écrit une partition ; retourne (partition, utilisateurs, durée)"""
+    start = time.time()
+    recommender = _state['recommender']
+    api = _state['api']
+    options = _state['options']
+    user_mapping = recommender.model_loader.user_mapping
+
+    lo = partition * options['partition_size']
+    hi = min(lo + options['partition_size'], len(user_mapping))
+    columns = ['user_id', 'rank', 'isbn', 'score'] + (METADATA_COLUMNS if options['with_metadata'] else [])
+    writer = PartitionWriter(partition_path(options['output_dir'], partition, options['format']), columns, options['format'])
+    metadata: Dict[str, Optional[Dict]] = {}
+
+    try:
+        for offset in range(lo, hi, options['batch_size']):
+            user_ids = user_mapping.keys_for(range(offset, min(offset + options['batch_size'], hi)))
+            ranked = recommender.recommend_batch(user_ids, options['k'], options['exclude_rated'])
+            if options['with_metadata']:
+                missing = {isbn for items in ranked.values() for isbn, _ in items} - metadata.keys()
+                metadata.update(api.lookup_cached(list(missing)))
+
+            rows = []
+            for user_id in user_ids:
+                for rank, (isbn, score) in enumerate(ranked[user_id], 1):
+                    row = (user_id, rank, isbn, round(score, 6))
+                    if options['with_metadata']:
+                        row += _metadata_values(metadata.get(isbn))
+                    rows.append(row)
+            writer.write(rows)
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.close()
+    return partition, hi - lo, time.time() - start
+
+
+def _metadata_values(book_info: Optional[Dict]) -> Tuple:
+    """Colonnes de métadonnées (vides si le livre n'est pas dans le cache)"""
+    if not book_info:
+        return ('',) * len(METADATA_COLUMNS)
+    return (
+        book_info.get('title', ''),
+        '|'.join(book_info.get('authors', [])),
+        book_info.get('language', ''),
+        book_info.get('published_date', ''),
+        '|'.join(book_info.get('categories', []))
+    )
+
+
+def _check_manifest(output_dir: str, manifest: Dict, overwrite: bool):
+    """Vérifie qu'une reprise porte sur le même export ; sinon repart de zéro si `overwrite`"""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)
+        if previous != manifest:
+            if not overwrite:
+                raise SystemExit(
+                    f"❌ {output_dir} contient un export différent (modèle ou paramètres) : "
+                    "utilisez --overwrite ou un autre dossier"
+                )
+            for name in os.listdir(output_dir):
+                if name.startswith('part-') or name in (MANIFEST_FILE, SUCCESS_FILE):
+                    os.remove(os.path.join(output_dir, name))
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def export_topn(
+    recommender,
+    api,
+    output_dir: str,
+    k: int = Config.MAX_RECOMMENDATIONS,
+    fmt: str = 'csv',
+    workers: int = 1,
+    partition_size: int = Config.EXPORT_PARTITION_SIZE,
+    batch_size: int = 1024,
+    with_metadata: bool = False,
+    exclude_rated: bool = True,
+    threads_per_worker: Optional[int] = None,
+    overwrite: bool = False
+) -> Dict:
+    """Exporte le top-k de tous les utilisateurs de `user_mapping` par partitions"""
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("❌ Le format Parquet nécessite pyarrow (pip install pyarrow)")
+
+    model_loader = recommender.model_loader
+    num_users = len(model_loader.user_mapping)
+    num_partitions = max(1, -(-num_users // partition_size))
+    manifest = {
+        'model_version': model_loader.model_version,
+        'history_version': recommender.get_history_version(),
+        'num_users': num_users,
+        'k': k,
+        'format': fmt,
+        'partition_size': partition_size,
+        'with_metadata': with_metadata,
+        'exclude_rated': exclude_rated
+    }
+    _check_manifest(output_dir, manifest, overwrite)
+
+    pending = [p for p in range(num_partitions) if not os.path.exists(partition_path(output_dir, p, fmt))]
+    done_users = num_users - sum(
+        min(partition_size, num_users - p * partition_size) for p in pending
+    )
+    if done_users:
+        print(f"Reprise : {num_partitions - len(pending)}/{num_partitions} partitions déjà écrites")
+
+    _state.update(recommender=recommender, api=api, options={
+        'output_dir': output_dir,
+        'k': k,
+        'format': fmt,
+        'partition_size': partition_size,
+        'batch_size': batch_size,
+        'with_metadata': with_metadata,
+        'exclude_rated': exclude_rated
+    })
+
+    workers = max(1, min(workers, len(pending) or 1))
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    print(f"Export de {num_users} utilisateurs (top-{k}, {fmt}) : "
+          f"{len(pending)} partition(s), {workers} worker(s) x {threads} thread(s)")
+
+    start = time.time()
+    exported = 0
+    if workers == 1:
+        limit_threads(threads)
+        results = map(_export_partition, pending)
+        pool = None
+    else:
+        # Les workers héritent des composants par fork (poids et tables mappés en mémoire)
+        gc.collect()
+        gc.freeze()
+        pool = multiprocessing.get_context('fork').Pool(workers, initializer=_init_worker, initargs=(threads,))
+        results = pool.imap_unordered(_export_partition, pending)
+
+    try:
+        for completed, (partition, users, duration) in enumerate(results, 1):
+            exported += users
+            elapsed = time.time() - start
+            rate = exported / elapsed if elapsed > 0 else 0.0
+            remaining = num_users - done_users - exported
+            eta = remaining / rate if rate > 0 else 0.0
+            print(f"Partition {partition} écrite ({completed}/{len(pending)}) : "
+                  f"{done_users + exported}/{num_users} utilisateurs, "
+                  f"{rate:.0f} util./s, reste ~{eta:.0f}s")
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+            gc.unfreeze()
+
+    elapsed = time.time() - start
+    stats = {
+        'users': num_users,
+        'exported_users': exported,
+        'partitions': num_partitions,
+        'seconds': elapsed,
+        'users_per_second': exported / elapsed if elapsed > 0 else 0.0,
+        'finished_at': time.time()
+    }
+    with open(os.path.join(output_dir, SUCCESS_FILE), 'w') as f:
+        json.dump(stats, f, indent=2)
+    print(f"✅ Export terminé en {elapsed:.1f}s ({stats['users_per_second']:.0f} util./s) dans {output_dir}")
+    return stats
+
+
+if __name__ == '__main__':
+    from utils.components import build_components
+
+    parser = argparse.ArgumentParser(description="Export du top-N de tous les utilisateurs")
+    parser.add_argument('--output-dir', default=os.path.join(Config.EXPORT_DIR, time.strftime('%Y-%m-%d')))
+    parser.add_argument('--k', type=int, default=Config.MAX_RECOMMENDATIONS)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processus de scoring")
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help="Threads de calcul par worker (défaut : cœurs / workers)")
+    parser.add_argument('--partition-size', type=int, default=Config.EXPORT_PARTITION_SIZE,
+                        help="Utilisateurs par fichier de sortie")
+    parser.add_argument('--batch-size', type=int, default=1024, help="Utilisateurs par passe du modèle")
+    parser.add_argument('--with-metadata', action='store_true',
+                        help="Joint les métadonnées du cache (aucun appel à l'API)")
+    parser.add_argument('--include-rated', action='store_true', help="Garde les livres déjà notés")
+    parser.add_argument('--overwrite', action='store_true', help="Remplace un export incompatible")
+    args = parser.parse_args()
+
+    components = build_components()
+    if components is None:
+        raise SystemExit("Impossible de charger le modèle")
+    _, api, recommender = components
+
+    export_topn(
+        recommender,
+        api,
+        args.output_dir,
+        k=args.k,
+        fmt=args.format,
+        workers=args.workers,
+        partition_size=args.partition_size,
+        batch_size=args.batch_size,
+        with_metadata=args.with_metadata,
+        exclude_rated=not args.include_rated,
+        threads_per_worker=args.threads_per_worker,
+        overwrite=args.overwrite
+    )
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+from typing import Optional, Tuple
+
+from config import Config
+from utils.book_catalog import BookCatalog
+from utils.google_books import GoogleBooksAPI
+from utils.item_index import build_item_index
+from utils.item_neighbors import ItemNeighborTable
+from utils.metadata_cache import MetadataCache
+from utils.metrics import configure_profiling, setup_logging
+from utils.model_loader import ModelLoader
+from utils.rating_delta import IncrementalUserHistory
+from utils.rate_limiter import TokenBucket
+from utils.recommender import BookRecommender
+from utils.thumbnail_cache import ThumbnailCache
+from utils.topn_table import TopNTable
+from utils.user_history import load_or_build_user_history
+
+
+def resolve_model_path() -> str:
+    """Modèle actif du registre, sinon l'artefact plat (mmap) s'il a été exporté, sinon le pickle d'origine"""
+    try:
+        with open(Config.MODEL_ACTIVE_FILE) as f:
+            active = json.load(f).get('path')
+        if active and os.path.exists(active):
+            return active
+    except (OSError, ValueError):
+        pass
+    return Config.ARTIFACT_PATH if os.path.exists(Config.ARTIFACT_PATH) else Config.MODEL_PATH
+
+
+def build_model_loader(model_path: Optional[str] = None) -> Optional[ModelLoader]:
+    """Charge le modèle selon la configuration ; None en cas d'échec"""
+    model_loader = ModelLoader(
+        model_path or resolve_model_path(),
+        backend=Config.INFERENCE_BACKEND,
+        precision=Config.INFERENCE_PRECISION
+    )
+    if not model_loader.load_model():
+        return None
+    return model_loader
+
+
+def build_api() -> GoogleBooksAPI:
+    """Client Google Books avec cache persistant et limiteur de débit"""
+    metadata_cache = MetadataCache(
+        Config.METADATA_CACHE_PATH,
+        ttl=Config.METADATA_CACHE_TTL,
+        negative_ttl=Config.METADATA_CACHE_NEGATIVE_TTL,
+        forbidden_ttl=Config.METADATA_CACHE_FORBIDDEN_TTL,
+        max_entries=Config.METADATA_CACHE_MAX_ENTRIES,
+        touch_interval=Config.METADATA_CACHE_TOUCH_INTERVAL
+    )
+
+    return GoogleBooksAPI(
+        Config.GOOGLE_BOOKS_API_KEY,
+        Config.GOOGLE_BOOKS_BASE_URL,
+        metadata_cache,
+        rate_limiter=TokenBucket.from_delay(
+            Config.API_RATE_LIMIT_DELAY,
+            Config.API_RATE_LIMIT_BURST
+        ),
+        max_workers=Config.API_MAX_WORKERS,
+        group_size=Config.API_MULTI_ISBN_SIZE,
+        timeout=Config.API_TIMEOUT
+    )
+
+
+def build_thumbnail_cache() -> ThumbnailCache:
+    """Cache disque des couvertures réduites"""
+    return ThumbnailCache(
+        Config.THUMBNAIL_DIR,
+        max_bytes=Config.THUMBNAIL_MAX_BYTES,
+        size=Config.THUMBNAIL_SIZE,
+        quality=Config.THUMBNAIL_QUALITY,
+        timeout=Config.API_TIMEOUT,
+        failure_ttl=Config.THUMBNAIL_FAILURE_TTL,
+        touch_interval=Config.THUMBNAIL_TOUCH_INTERVAL,
+        max_workers=Config.THUMBNAIL_MAX_WORKERS
+    )
+
+
+def load_user_history(model_loader: ModelLoader, candidate: bool = False) -> Optional[IncrementalUserHistory]:
+    """Historique CSR aligné sur les mappings du modèle, avec le journal des notes ajoutées
+
+    Pour un modèle `candidate` (rechargement à chaud), l'historique courant
+    n'est jamais reconstruit : il sert le modèle actif. S'il ne correspond
+    pas aux mappings du candidat, celui-ci a son propre historique, dans un
+    dossier nommé d'après ses mappings, qui ne devient courant qu'à
+    l'activation (`activate_user_history`).
+    """
+    build_dir = None
+    if candidate:
+        key = hashlib.sha256(
+            (model_loader.user_mapping.digest() + model_loader.isbn_mapping.digest()).encode()
+        ).hexdigest()[:16]
+        build_dir = os.path.join(Config.USER_HISTORY_CANDIDATES_DIR, key)
+    user_history = load_or_build_user_history(
+        Config.USER_HISTORY_DIR,
+        Config.RATINGS_FILE,
+        model_loader.user_mapping,
+        model_loader.isbn_mapping,
+        build_dir=build_dir
+    )
+    if user_history is None:
+        return None
+    # Notes ajoutées depuis la construction de l'historique (journal rejoué)
+    return IncrementalUserHistory(
+        user_history,
+        model_loader.user_mapping,
+        model_loader.isbn_mapping,
+        Config.RATING_DELTA_DIR
+    )
+
+
+def activate_user_history(user_history) -> bool:
+    """Fait de l'historique d'un modèle activé l'historique courant (redémarrage, outils hors ligne)"""
+    if user_history is None:
+        return False
+    return getattr(user_history, 'base', user_history).install(Config.USER_HISTORY_DIR)
+
+
+def build_catalog(model_loader: ModelLoader, api: GoogleBooksAPI, attach: bool = True) -> BookCatalog:
+    """Catalogue colonnaire aligné sur le modèle, complété depuis le cache de métadonnées
+
+    Avec `attach=False` (modèle candidat), le catalogue n'est ni branché sur
+    l'API ni sauvegardé : il ne le sera qu'à la bascule, si le modèle est validé.
+    """
+    catalog = BookCatalog(
+        Config.CATALOG_PATH,
+        model_loader.isbn_mapping,
+        Config.CATALOG_SAVE_INTERVAL,
+        missing_ttl=Config.METADATA_CACHE_NEGATIVE_TTL
+    )
+    catalog.load()
+    if not attach:
+        api.fill_catalog(catalog)
+    elif api.attach_catalog(catalog):
+        catalog.save()
+    return catalog
+
+
+def build_recommender(
+    model_loader: ModelLoader,
+    api: GoogleBooksAPI,
+    previous: Optional[BookRecommender] = None
+) -> BookRecommender:
+    """Assemble le recommandeur et ses tables pré-calculées pour un modèle chargé
+
+    Avec `previous` (recommandeur du modèle remplacé) et des mappings
+    identiques, l'historique (notes ingérées comprises) et le catalogue sont
+    repris tels quels ; seules les structures liées à la version du modèle
+    (index, tables top-N et voisins) sont reconstruites ou rechargées.
+    """
+    if previous is not None and model_loader.user_mapping.same_keys(previous.model_loader.user_mapping) \
+            and model_loader.isbn_mapping.same_keys(previous.model_loader.isbn_mapping):
+        model_loader.adopt_mappings(previous.model_loader)
+        user_history = previous.user_history
+        catalog = previous.catalog
+    else:
+        if previous is not None and previous.catalog is not None:
+            previous.catalog.save()
+        user_history = load_user_history(model_loader, candidate=previous is not None)
+        catalog = build_catalog(model_loader, api, attach=previous is None)
+
+    item_index = None
+    if Config.ITEM_INDEX_MODE != 'off':
+        item_index = build_item_index(
+            model_loader,
+            Config.ITEM_INDEX_MODE,
+            Config.ITEM_INDEX_NPROBE,
+            Config.ITEM_INDEX_PATH
+        )
+
+    recommender = BookRecommender(
+        model_loader,
+        api,
+        user_history,
+        item_index=item_index,
+        catalog=catalog
+    )
+
+    topn_table = TopNTable(Config.TOPN_DIR)
+    if topn_table.load():
+        recommender.set_topn_table(topn_table)
+
+    item_neighbors = ItemNeighborTable(Config.ITEM_NEIGHBORS_DIR)
+    if item_neighbors.load():
+        recommender.set_item_neighbors(item_neighbors)
+
+    return recommender
+
+
+def build_components() -> Optional[Tuple[ModelLoader, GoogleBooksAPI, BookRecommender]]:
+    """Initialise modèle, client API et recommandeur ; None si le modèle est introuvable"""
+    setup_logging(Config.LOG_DIR, Config.LOG_LEVEL, Config.LOG_FORMAT)
+    if Config.PROFILE_SLOW_MS > 0:
+        configure_profiling(Config.PROFILE_SLOW_MS / 1000, Config.PROFILE_SAMPLE_RATE)
+    model_loader = build_model_loader()
+    if model_loader is None:
+        return None
+    api = build_api()
+    return model_loader, api, build_recommender(model_loader, api)
@@ -1,47 +1,293 @@
 import requests
-from typing import Dict, List, Optional
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.metadata_cache import MetadataCache
+from utils.metrics import logger, metrics
+from utils.rate_limiter import TokenBucket
+
+class BudgetExhausted(Exception):
+    """Plus de jeton dans le limiteur propre à l'appelant (préchauffage) : requête non envoyée"""
+
 
 class GoogleBooksAPI:
     """Interface pour l'API Google Books"""
     
-    def __init__(self, api_key: str, base_url: str):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        cache: Optional[MetadataCache] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_workers: int = 8,
+        timeout: float = 5,
+        group_size: int = 10,
+        catalog=None
+    ):
         self.api_key = api_key
         self.base_url = base_url
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._cache = cache if cache is not None else MetadataCache(':memory:')
+        self.rate_limiter = rate_limiter if rate_limiter is not None else TokenBucket.from_delay(0.1)
+        self.group_size = max(1, group_size)
+        # Catalogue colonnaire (BookCatalog) alimenté par les résultats de l'API
+        self.catalog = catalog
+        self._init_io()
+    
+    def _init_io(self):
+        """Session HTTP, pool de threads et registre des requêtes en cours"""
         self.session = requests.Session()
-        self._cache = {}
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='google-books')
+        # Requêtes en cours : un seul appel HTTP par ISBN, les autres appelants attendent
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        # Dernier défaut de cache d'une requête utilisateur et dernier 403 (préchauffage)
+        self._last_live_miss = float('-inf')
+        self._last_forbidden = float('-inf')
+    
+    def after_fork(self, quota_share: float = 1.0):
+        """Réinitialise les ressources propres au processus dans un worker issu d'un fork
+
+        `quota_share` est la part du débit API attribuée à ce worker, pour que
+        l'ensemble des workers respecte le quota global.
+        """
+        self._cache.reopen()
+        self._init_io()
+        if quota_share < 1.0:
+            self.rate_limiter = TokenBucket(
+                self.rate_limiter.rate * quota_share,
+                self.rate_limiter.capacity * quota_share
+            )
+    
+    def attach_catalog(self, catalog) -> int:
+        """Branche le catalogue colonnaire et le complète depuis le cache ; retourne le nombre d'ajouts"""
+        self.catalog = catalog
+        return self.fill_catalog(catalog)
+    
+    def fill_catalog(self, catalog) -> int:
+        """Complète un catalogue depuis le cache sans le brancher (modèle candidat)"""
+        return catalog.fill_from_cache(self._cache)
     
     def search_by_isbn(self, isbn: str) -> Optional[Dict]:
         """Recherche un livre par ISBN"""
-        if isbn in self._cache:
-            return self._cache[isbn]
+        found, book_info = self._cache.get(isbn)
+        if found:
+            metrics.inc('metadata_cache_hits_total')
+            return book_info
+        metrics.inc('metadata_cache_misses_total')
+        self._last_live_miss = time.monotonic()
+        
+        owned, futures = self._claim([isbn])
+        if not owned:
+            return futures[isbn].result()
+        return self._fetch_and_resolve(isbn)
+    
+    def _claim(self, isbn_list: List[str]) -> Tuple[List[str], Dict[str, Future]]:
+        """Réserve les ISBN qui ne sont pas déjà en cours de récupération
+
+        Retourne les ISBN réservés (à récupérer puis résoudre par l'appelant)
+        et le Future de chaque ISBN demandé, réservé ici ou par un autre appelant.
+        """
+        owned, futures = [], {}
+        with self._inflight_lock:
+            for isbn in isbn_list:
+                if isbn not in self._inflight:
+                    self._inflight[isbn] = Future()
+                    owned.append(isbn)
+                futures[isbn] = self._inflight[isbn]
+        return owned, futures
+    
+    def _resolve(self, isbn: str, book_info: Optional[Dict]):
+        """Publie le résultat aux appelants en attente et libère l'ISBN"""
+        with self._inflight_lock:
+            future = self._inflight.pop(isbn, None)
+        if future is not None:
+            future.set_result(book_info)
+    
+    def _query(
+        self,
+        query: str,
+        max_results: Optional[int] = None,
+        limiter: Optional[TokenBucket] = None
+    ) -> Optional[Dict]:
+        """Exécute une requête Google Books ; None en cas d'erreur
+
+        `limiter` (budget de l'appelant) est débité d'un jeton par requête, en
+        plus du limiteur global ; s'il est vide, `BudgetExhausted` est levée
+        sans envoyer la requête.
+        """
+        if limiter is not None and not limiter.try_acquire():
+            raise BudgetExhausted()
+        params = {'q': query}
+        if max_results:
+            params['maxResults'] = max_results
         
+        if self.api_key:
+            params['key'] = self.api_key
+        
+        with metrics.span('rate_limit_wait'):
+            self.rate_limiter.acquire()
+        
+        metrics.inc('api_requests_total')
+        with metrics.span('metadata_fetch'):
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except requests.exceptions.Timeout:
+                metrics.inc('api_timeouts_total')
+                raise
+            except Exception:
+                metrics.inc('api_errors_total')
+                raise
+        
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 403:
+            self._last_forbidden = time.monotonic()
+            metrics.inc('api_forbidden_total')
+            logger.warning("Limite API atteinte ou clé invalide")
+            return {'status': 403}
+        metrics.inc('api_errors_total')
+        logger.warning(f"Réponse API inattendue: HTTP {response.status_code}")
+        return None
+    
+    def _fetch_single(self, isbn: str, limiter: Optional[TokenBucket] = None) -> Optional[Dict]:
+        """Récupère un ISBN auprès de l'API et met le résultat en cache"""
         try:
-            params = {'q': f'isbn:{isbn}'}
+            data = self._query(f'isbn:{isbn}', limiter=limiter)
+            if data is None:
+                return None
             
-            if self.api_key:
-                params['key'] = self.api_key
+            if data.get('status') == 403:
+                self._cache.set_negative(isbn, MetadataCache.STATUS_FORBIDDEN)
+                return None
             
-            response = self.session.get(self.base_url, params=params, timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('totalItems', 0) > 0:
-                    book_info = self._parse_book_info(data['items'][0])
-                    self._cache[isbn] = book_info
-                    return book_info
-            elif response.status_code == 403:
-                print("Limite API atteinte ou clé invalide")
+            if data.get('totalItems', 0) > 0:
+                book_info = self._parse_book_info(data['items'][0])
+                self._store(isbn, book_info)
+                return book_info
             
+            self._store(isbn, None)
             return None
             
+        except BudgetExhausted:
+            raise
         except requests.exceptions.Timeout:
-            print(f"Timeout pour ISBN {isbn}")
+            logger.warning(f"Timeout pour ISBN {isbn}")
             return None
         except Exception as e:
-            print(f"Erreur API pour ISBN {isbn}: {e}")
+            logger.warning(f"Erreur API pour ISBN {isbn}: {e}")
             return None
     
+    def _fetch_group(
+        self,
+        isbn_list: List[str],
+        limiter: Optional[TokenBucket] = None
+    ) -> Tuple[Dict[str, Optional[Dict]], List[str]]:
+        """Récupère plusieurs ISBN en une requête `isbn:A OR isbn:B ...`
+
+        Chaque ISBN est résolu dès la réponse groupée, sauf ceux qui en sont
+        absents : retournés à part, toujours réservés, pour être retentés
+        individuellement (`_fetch_singles`). Si la requête échoue (réseau,
+        5xx), tout le lot est résolu en erreur, sans nouvelle requête ni mise
+        en cache. `BudgetExhausted` est propagée, lot résolu à None.
+        """
+        if len(isbn_list) == 1:
+            return {}, list(isbn_list)
+        
+        results = {}
+        retry = []
+        try:
+            try:
+                data = self._query(
+                    ' OR '.join(f'isbn:{isbn}' for isbn in isbn_list),
+                    max_results=40,
+                    limiter=limiter
+                )
+            except BudgetExhausted:
+                raise
+            except Exception as e:
+                logger.warning(f"Erreur API pour le lot {isbn_list[0]}...: {e}")
+                data = None
+            
+            if data is None:
+                return dict.fromkeys(isbn_list), retry
+            
+            if data.get('status') == 403:
+                for isbn in isbn_list:
+                    self._cache.set_negative(isbn, MetadataCache.STATUS_FORBIDDEN)
+                    results[isbn] = None
+                return results, retry
+            
+            wanted = {self._normalize_isbn(isbn): isbn for isbn in isbn_list}
+            for item in data.get('items', []):
+                identifiers = item.get('volumeInfo', {}).get('industryIdentifiers', [])
+                for identifier in identifiers:
+                    isbn = wanted.get(self._normalize_isbn(identifier.get('identifier', '')))
+                    if isbn is not None and isbn not in results:
+                        book_info = self._parse_book_info(item)
+                        self._store(isbn, book_info)
+                        results[isbn] = book_info
+                        self._resolve(isbn, book_info)
+            
+            retry = [isbn for isbn in isbn_list if isbn not in results]
+            return results, retry
+        
+        finally:
+            for isbn in isbn_list:
+                if isbn not in retry:
+                    self._resolve(isbn, results.get(isbn))
+    
+    def _fetch_singles(
+        self,
+        isbn_list: List[str],
+        limiter: Optional[TokenBucket] = None
+    ) -> Dict[str, Future]:
+        """Lance en parallèle une requête par ISBN réservé ; chacun est résolu dès sa réponse"""
+        return {
+            isbn: self._executor.submit(self._fetch_and_resolve, isbn, limiter)
+            for isbn in isbn_list
+        }
+    
+    def _fetch_and_resolve(self, isbn: str, limiter: Optional[TokenBucket] = None) -> Optional[Dict]:
+        book_info = None
+        try:
+            book_info = self._fetch_single(isbn, limiter)
+        finally:
+            self._resolve(isbn, book_info)
+        return book_info
+    
+    def _fetch_misses(self, isbn_list: List[str]):
+        """Tâche du pool : requête groupée, puis requêtes individuelles lancées sans les attendre"""
+        retry = list(isbn_list)
+        try:
+            _, retry = self._fetch_group(isbn_list)
+            self._fetch_singles(retry)
+        except Exception as e:
+            logger.warning(f"Erreur API pour le lot {isbn_list[0]}...: {e}")
+            # Les appelants en attente ne doivent pas rester bloqués
+            for isbn in retry:
+                self._resolve(isbn, None)
+    
+    def _store(self, isbn: str, book_info: Optional[Dict]):
+        """Met en cache un livre trouvé (ou introuvable si None) et l'enregistre au catalogue"""
+        if book_info is None:
+            self._cache.set_negative(isbn, MetadataCache.STATUS_NOT_FOUND)
+        else:
+            self._cache.set(isbn, book_info)
+        if self.catalog is not None:
+            self.catalog.record(isbn, book_info)
+    
+    @staticmethod
+    def _normalize_isbn(isbn: str) -> str:
+        return isbn.replace('-', '').strip().upper()
+    
     def _parse_book_info(self, item: Dict) -> Dict:
         """Parse les informations du livre"""
         volume_info = item.get('volumeInfo', {})
@@ -56,10 +302,8 @@ class GoogleBooksAPI:
             'page_count': volume_info.get('pageCount', 'N/A'),
             'categories': volume_info.get('categories', []),
             'language': volume_info.get('language', 'N/A'),
-            'thumbnail': volume_info.get('imageLinks', {}).get(
-                'thumbnail', 
-                'https://via.placeholder.com/128x200?text=No+Cover'
-            ).replace('http://', 'https://'),
+            # Vide si aucune couverture : image de remplacement servie localement (ThumbnailCache)
+            'thumbnail': volume_info.get('imageLinks', {}).get('thumbnail', '').replace('http://', 'https://'),
             'preview_link': volume_info.get('previewLink', '#'),
             'average_rating': volume_info.get('averageRating', 'N/A'),
             'ratings_count': volume_info.get('ratingsCount', 0)
@@ -73,18 +317,101 @@ class GoogleBooksAPI:
                 return identifier.get('identifier', '')
         return ''
     
-    def batch_search(self, isbn_list: List[str], delay: float = 0.1) -> Dict[str, Dict]:
-        """Recherche plusieurs livres avec rate limiting"""
-        results = {}
-        total = len(isbn_list)
+    def seconds_since_live_miss(self) -> float:
+        """Temps écoulé depuis qu'une requête utilisateur a eu besoin de l'API"""
+        return time.monotonic() - self._last_live_miss
+    
+    def seconds_since_forbidden(self) -> float:
+        """Temps écoulé depuis la dernière réponse 403 (quota atteint)"""
+        return time.monotonic() - self._last_forbidden
+    
+    def prefetch(
+        self,
+        isbn_list: List[str],
+        limiter: Optional[TokenBucket] = None
+    ) -> Tuple[int, List[str]]:
+        """Récupère en arrière-plan les ISBN absents du cache, dans le thread appelant
+
+        Contrairement à `iter_search`, ne compte pas comme trafic utilisateur.
+        Chaque requête envoyée débite un jeton de `limiter` ; s'il est épuisé,
+        le lot s'arrête. Retourne (livres trouvés, ISBN non demandés à l'API).
+        """
+        misses = [isbn for isbn in dict.fromkeys(isbn_list) if not self._cache.get(isbn)[0]]
+        owned, _ = self._claim(misses)
+        found = 0
+        remaining = []
+        # ISBN réservés pas encore confiés à `_fetch_group`, qui résout les siens
+        pending = owned
+        try:
+            for i in range(0, len(owned), self.group_size):
+                group = owned[i:i + self.group_size]
+                pending = owned[i + self.group_size:]
+                try:
+                    results, retry = self._fetch_group(group, limiter)
+                except BudgetExhausted:
+                    remaining = group + pending
+                    break
+                for isbn, future in self._fetch_singles(retry, limiter).items():
+                    try:
+                        results[isbn] = future.result()
+                    except BudgetExhausted:
+                        remaining.append(isbn)
+                found += sum(1 for book_info in results.values() if book_info)
+                if remaining:
+                    remaining += pending
+                    break
+        finally:
+            # Aucun appelant ne doit rester en attente d'un ISBN réservé ici
+            for isbn in pending:
+                self._resolve(isbn, None)
+        return found, remaining
+    
+    def lookup_cached(self, isbn_list: List[str]) -> Dict[str, Optional[Dict]]:
+        """Métadonnées présentes dans le cache, sans appel à l'API (None si absentes)"""
+        return {isbn: self._cache.get(isbn)[1] for isbn in isbn_list}
+    
+    def search_many(self, isbn_list: List[str]) -> List[Optional[Dict]]:
+        """Recherche plusieurs ISBN en parallèle ; résultats dans l'ordre d'entrée"""
+        return [book_info for _, book_info in self.iter_search(isbn_list)]
+    
+    def iter_search(self, isbn_list: List[str]) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """Produit (isbn, métadonnées) dans l'ordre d'entrée dès que chaque résultat est prêt
+
+        Les ISBN absents du cache sont regroupés en requêtes multi-ISBN lancées
+        en parallèle, et ceux déjà en cours de récupération par un autre
+        appelant sont attendus. Chaque ISBN est produit dès sa propre
+        résolution, sans attendre les requêtes individuelles de son lot.
+        """
+        cached = {}
+        misses = []
+        for isbn in dict.fromkeys(isbn_list):
+            found, book_info = self._cache.get(isbn)
+            if found:
+                cached[isbn] = book_info
+                if book_info and self.catalog is not None:
+                    self.catalog.observe(isbn, book_info)
+            else:
+                misses.append(isbn)
+        metrics.inc('metadata_cache_hits_total', len(cached))
+        metrics.inc('metadata_cache_misses_total', len(misses))
+        if misses:
+            self._last_live_miss = time.monotonic()
         
-        for idx, isbn in enumerate(isbn_list, 1):
-            print(f"Recherche {idx}/{total}: {isbn}")
-            book_info = self.search_by_isbn(isbn)
-            
+        owned, futures = self._claim(misses)
+        for i in range(0, len(owned), self.group_size):
+            self._executor.submit(self._fetch_misses, owned[i:i + self.group_size])
+        
+        for isbn in isbn_list:
+            if isbn in cached:
+                yield isbn, cached[isbn]
+            else:
+                yield isbn, futures[isbn].result()
+    
+    def batch_search(self, isbn_list: List[str]) -> Dict[str, Dict]:
+        """Recherche plusieurs livres en parallèle, débit limité par le seau de jetons"""
+        logger.info(f"Recherche de {len(isbn_list)} ISBN...")
+        results = {}
+        for isbn, book_info in zip(isbn_list, self.search_many(isbn_list)):
             if book_info:
                 results[isbn] = book_info
-            
-            time.sleep(delay)
-        
-        return results
\ No newline at end of file
+        return results
@@ -0,0 +1,244 @@
+import hashlib
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+Key = Union[int, str]
+
+
+class IdIndex(Mapping):
+    """Correspondance identifiant <-> index de colonne/ligne sur tableaux NumPy triés
+
+    Remplace les dicts `user_mapping` / `isbn_mapping` avec la même interface
+    de lecture (`in`, `[]`, `get`, `len`, itération) :
+
+    - clés triées (int64 pour les utilisateurs, octets UTF-8 de largeur fixe
+      pour les ISBN) et index associés, éventuellement mappés en mémoire
+      depuis l'artefact : aucun objet Python par entrée ;
+    - recherche clé -> index en O(log n) (`searchsorted`), index -> clé en O(1) ;
+    - recherches vectorisées (`lookup_batch`, `keys_for`) ;
+    - recherche paginée par préfixe (`search`) pour l'interface.
+
+    Les clés ajoutées après la construction (nouveaux utilisateurs) sont
+    conservées dans un petit dict à part, avec les index suivants.
+    """
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray):
+        self._keys = keys
+        self._values = values
+        self._is_str = keys.dtype.kind == 'S'
+        n = len(keys)
+        if n and np.array_equal(values, np.arange(n)):
+            # Index dans l'ordre des clés triées (pivot_table du notebook) : pas de permutation
+            self._order = None
+        else:
+            self._order = np.empty(n, dtype=np.int64)
+            self._order[values] = np.arange(n)
+        self._extra: Dict[Key, int] = {}
+        self._extra_keys: List[Key] = []
+
+    @classmethod
+    def from_dict(cls, mapping: Dict) -> 'IdIndex':
+        if isinstance(mapping, IdIndex):
+            return mapping
+        keys = list(mapping.keys())
+        if keys and isinstance(keys[0], str):
+            key_array = np.array([k.encode('utf-8') for k in keys])
+        else:
+            key_array = np.array(keys, dtype=np.int64)
+        values = np.fromiter(mapping.values(), dtype=np.int64, count=len(keys))
+        order = np.argsort(key_array, kind='stable')
+        return cls(key_array[order], values[order])
+
+    # Interface Mapping
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._extra_keys)
+
+    def __iter__(self) -> Iterator[Key]:
+        return iter(self.keys())
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __getitem__(self, key: Key) -> int:
+        idx = self.get(key)
+        if idx is None:
+            raise KeyError(key)
+        return idx
+
+    def get(self, key: Key, default=None) -> Optional[int]:
+        encoded = self._encode(key)
+        if encoded is not None:
+            pos = int(np.searchsorted(self._keys, encoded))
+            if pos < len(self._keys) and self._keys[pos] == encoded:
+                return int(self._values[pos])
+        return self._extra.get(key, default)
+
+    def __setitem__(self, key: Key, value: int):
+        """Ajoute une nouvelle clé à la suite des index existants"""
+        if key in self:
+            raise ValueError(f"Clé déjà présente: {key}")
+        if value != len(self):
+            raise ValueError(f"L'index d'une nouvelle clé doit être {len(self)}")
+        self._extra[key] = value
+        self._extra_keys.append(key)
+
+    def keys(self) -> List[Key]:
+        return self._decode(self._keys) + list(self._extra_keys)
+
+    def values(self) -> np.ndarray:
+        extra = np.fromiter(self._extra.values(), dtype=np.int64, count=len(self._extra))
+        return np.concatenate([np.asarray(self._values, dtype=np.int64), extra])
+
+    def items(self) -> List[Tuple[Key, int]]:
+        return list(zip(self.keys(), self.values().tolist()))
+
+    # Accès vectorisés
+
+    def key_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(clés triées, index) de la partie tableau, sans les clés ajoutées"""
+        return self._keys, self._values
+
+    def same_keys(self, other) -> bool:
+        """Même partie tableau (clés et index) qu'un autre IdIndex, sans comparer les clés ajoutées"""
+        if not isinstance(other, IdIndex):
+            return False
+        other_keys, other_values = other.key_arrays()
+        return np.array_equal(self._keys, other_keys) and np.array_equal(self._values, other_values)
+
+    def digest(self) -> str:
+        """Empreinte sha256 des clés et index, indépendante du stockage (dict, tableau ou mmap)"""
+        keys = self._keys
+        if self._is_str:
+            # Largeur canonique : l'artefact et `from_dict` peuvent remplir différemment
+            width = int(np.char.str_len(keys).max()) if len(keys) else 1
+            keys = keys.astype(f'S{max(width, 1)}')
+        else:
+            keys = keys.astype('<i8')
+        sha = hashlib.sha256(str(keys.dtype).encode())
+        sha.update(np.ascontiguousarray(keys).tobytes())
+        sha.update(np.asarray(self._values, dtype='<i8').tobytes())
+        for key in self._extra_keys:
+            sha.update(f"\0{key}={self._extra[key]}".encode('utf-8'))
+        return sha.hexdigest()
+
+    def lookup_batch(self, keys: Iterable[Key]) -> np.ndarray:
+        """Index de chaque clé, -1 pour les clés inconnues"""
+        keys = np.asarray(list(keys) if not isinstance(keys, np.ndarray) else keys)
+        if self._is_str:
+            if keys.dtype.kind in 'UO':
+                keys = np.char.encode(keys.astype(str), 'utf-8')
+        else:
+            if keys.dtype.kind not in 'iu':
+                # Clés non entières : valeur sentinelle jamais présente dans l'index
+                missing = np.iinfo(np.int64).min
+                keys = np.array([
+                    missing if (k := self._to_int(v)) is None else k for v in keys.tolist()
+                ], dtype=np.int64)
+            keys = keys.astype(np.int64)
+
+        result = np.full(len(keys), -1, dtype=np.int64)
+        if len(self._keys):
+            pos = np.searchsorted(self._keys, keys)
+            pos_clipped = np.minimum(pos, len(self._keys) - 1)
+            found = (pos < len(self._keys)) & (self._keys[pos_clipped] == keys)
+            result[found] = self._values[pos_clipped[found]]
+        if self._extra:
+            for i in np.flatnonzero(result < 0):
+                key = keys[i].decode('utf-8') if self._is_str else int(keys[i])
+                result[i] = self._extra.get(key, -1)
+        return result
+
+    def key_of(self, idx: int) -> Optional[Key]:
+        """Clé associée à un index (O(1))"""
+        return self.keys_for([idx])[0]
+
+    def keys_for(self, indices: Iterable[int]) -> List[Optional[Key]]:
+        """Clés associées à des index (None pour un index inconnu)"""
+        indices = np.asarray(list(indices) if not isinstance(indices, np.ndarray) else indices, dtype=np.int64)
+        n = len(self._keys)
+        base = indices[(indices >= 0) & (indices < n)]
+        positions = base if self._order is None else self._order[base]
+        decoded = iter(self._decode(self._keys[positions]))
+        return [
+            next(decoded) if 0 <= i < n
+            else (self._extra_keys[i - n] if n <= i < len(self) else None)
+            for i in indices.tolist()
+        ]
+
+    def search(self, prefix: str = '', offset: int = 0, limit: int = 50) -> Tuple[List[Key], int]:
+        """Clés commençant par `prefix` (page `offset`/`limit`) et nombre total de correspondances"""
+        ranges = self._prefix_ranges(prefix.strip())
+        total = sum(hi - lo for lo, hi in ranges)
+        page: List[Key] = []
+        skip = offset
+        for lo, hi in ranges:
+            if len(page) >= limit:
+                break
+            if skip >= hi - lo:
+                skip -= hi - lo
+                continue
+            start = lo + skip
+            skip = 0
+            page.extend(self._decode(self._keys[start:min(hi, start + limit - len(page))]))
+
+        extra = [k for k in self._extra_keys if str(k).startswith(prefix.strip())]
+        if len(page) < limit:
+            extra_offset = max(0, offset - total)
+            page.extend(extra[extra_offset:extra_offset + limit - len(page)])
+        return page, total + len(extra)
+
+    def _prefix_ranges(self, prefix: str) -> List[Tuple[int, int]]:
+        """Plages [lo, hi) de clés triées commençant par `prefix`"""
+        n = len(self._keys)
+        if not prefix:
+            return [(0, n)]
+        if self._is_str:
+            encoded = prefix.encode('utf-8')
+            lo = int(np.searchsorted(self._keys, encoded, side='left'))
+            hi = int(np.searchsorted(self._keys, encoded + b'\xff', side='left'))
+            return [(lo, hi)] if hi > lo else []
+
+        if not prefix.isdigit() or n == 0:
+            return []
+        # Entiers dont l'écriture décimale commence par `prefix` : une plage par nombre de chiffres
+        value = int(prefix)
+        max_digits = len(str(int(self._keys[-1])))
+        ranges = []
+        for digits in range(len(prefix), max_digits + 1):
+            if value == 0 and digits > 1:
+                break
+            scale = 10 ** (digits - len(prefix))
+            lo = int(np.searchsorted(self._keys, value * scale, side='left'))
+            hi = int(np.searchsorted(self._keys, (value + 1) * scale, side='left'))
+            if hi > lo:
+                ranges.append((lo, hi))
+        return ranges
+
+    # Conversions
+
+    def _encode(self, key):
+        if self._is_str:
+            return key.encode('utf-8') if isinstance(key, str) else None
+        return self._to_int(key)
+
+    @staticmethod
+    def _to_int(key) -> Optional[int]:
+        if isinstance(key, (bool, np.bool_)):
+            return None
+        if isinstance(key, (int, np.integer)):
+            return int(key)
+        return None
+
+    def _decode(self, keys: np.ndarray) -> List[Key]:
+        if self._is_str:
+            return [k.decode('utf-8') for k in keys.tolist()]
+        return keys.tolist()
+
+    @property
+    def nbytes(self) -> int:
+        """Mémoire des tableaux (hors clés ajoutées)"""
+        order = 0 if self._order is None else self._order.nbytes
+        return self._keys.nbytes + self._values.nbytes + order
@@ -0,0 +1,179 @@
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import logger
+from utils.numpy_engine import sigmoid, top_k
+
+INDEX_MODES = ('exact', 'ivf')
+
+
+class DecoderMIPSIndex:
+    """Index de produit scalaire maximal sur la dernière couche du décodeur
+
+    Le score d'un livre j est sigmoid(w_j · h + b_j), où h est l'activation
+    de dimension 256 et (w_j, b_j) la ligne j de `Linear(256, num_items)`.
+    La sigmoïde étant monotone, le top-k se calcule sur w_j · h + b_j.
+
+    - 'exact' : produit matriciel complet puis argpartition
+    - 'ivf'   : partition k-means des livres ; seuls les `nprobe` clusters les
+      plus prometteurs sont scorés. Les vecteurs [w_j, b_j] sont augmentés
+      d'une coordonnée sqrt(M² - ||x_j||²) pour ramener le MIPS à une
+      recherche du plus proche voisin (L2), adaptée au k-means.
+    """
+
+    def __init__(
+        self,
+        weight: np.ndarray,
+        bias: np.ndarray,
+        mode: str = 'ivf',
+        n_clusters: Optional[int] = None,
+        nprobe: int = 16,
+        version: Optional[str] = None
+    ):
+        if mode not in INDEX_MODES:
+            raise ValueError(f"Mode d'index inconnu: {mode} (attendu: {', '.join(INDEX_MODES)})")
+        self.weight = np.asarray(weight, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.mode = mode
+        self.nprobe = nprobe
+        self.version = version
+        num_items = len(self.bias)
+        self.n_clusters = n_clusters or max(1, int(np.sqrt(num_items)))
+
+        self.centroids = None
+        self.order = None
+        self.offsets = None
+        self.sorted_weight = None
+        self.sorted_bias = None
+        self.max_norm = None
+
+    def _augmented_items(self) -> np.ndarray:
+        items = np.hstack([self.weight, self.bias[:, None]])
+        norms = np.einsum('ij,ij->i', items, items)
+        self.max_norm = float(np.sqrt(norms.max())) if len(norms) else 1.0
+        extra = np.sqrt(np.maximum(self.max_norm ** 2 - norms, 0))
+        return np.hstack([items, extra[:, None]]).astype(np.float32)
+
+    def _augmented_queries(self, hidden: np.ndarray) -> np.ndarray:
+        queries = np.hstack([
+            hidden,
+            np.ones((len(hidden), 1), dtype=np.float32),
+            np.zeros((len(hidden), 1), dtype=np.float32)
+        ])
+        # Mise à l'échelle de la requête à la norme M (ne change pas l'ordre MIPS)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        return queries * (self.max_norm / np.maximum(norms, 1e-12))
+
+    def build(self, n_iter: int = 10, seed: int = 42) -> 'DecoderMIPSIndex':
+        """Construit la partition k-means (mode 'ivf')"""
+        if self.mode == 'exact':
+            return self
+
+        start = time.time()
+        items = self._augmented_items()
+        rng = np.random.default_rng(seed)
+        n_clusters = min(self.n_clusters, len(items))
+        centroids = items[rng.choice(len(items), n_clusters, replace=False)].copy()
+
+        item_sq = np.einsum('ij,ij->i', items, items)
+        for _ in range(n_iter):
+            # ||x - c||² = ||x||² - 2 x·c + ||c||²
+            distances = item_sq[:, None] - 2 * items @ centroids.T + np.einsum('ij,ij->i', centroids, centroids)
+            assignment = distances.argmin(axis=1)
+            counts = np.bincount(assignment, minlength=n_clusters)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, items)
+            non_empty = counts > 0
+            centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+
+        self.centroids = centroids
+        self.order = np.argsort(assignment, kind='stable')
+        self.offsets = np.zeros(n_clusters + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_clusters), out=self.offsets[1:])
+        self.sorted_weight = np.ascontiguousarray(self.weight[self.order])
+        self.sorted_bias = self.bias[self.order]
+        self.n_clusters = n_clusters
+
+        logger.info(f"Index IVF construit en {time.time() - start:.1f}s "
+                    f"({len(items)} livres, {n_clusters} clusters)")
+        return self
+
+    def search(self, hidden: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k par ligne de `hidden` : (indices livres, scores sigmoïdes) triés"""
+        hidden = np.atleast_2d(np.asarray(hidden, dtype=np.float32))
+        if self.mode == 'exact' or self.centroids is None:
+            raw = hidden @ self.weight.T + self.bias
+            indices, scores = top_k(raw, k)
+            return indices, sigmoid(scores)
+
+        queries = self._augmented_queries(hidden)
+        centroid_scores = queries @ self.centroids.T - 0.5 * np.einsum('ij,ij->i', self.centroids, self.centroids)
+        nprobe = min(self.nprobe, self.n_clusters)
+        probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        k_out = min(k, len(self.bias))
+        all_indices = np.full((len(hidden), k_out), -1, dtype=np.int64)
+        all_scores = np.full((len(hidden), k_out), -np.inf, dtype=np.float32)
+        for row, clusters in enumerate(probes):
+            positions = np.concatenate([
+                np.arange(self.offsets[c], self.offsets[c + 1]) for c in clusters
+            ])
+            raw = self.sorted_weight[positions] @ hidden[row] + self.sorted_bias[positions]
+            top, top_raw = top_k(raw[None, :], k_out)
+            found = top.shape[1]
+            all_indices[row, :found] = self.order[positions[top[0]]]
+            all_scores[row, :found] = top_raw[0]
+        return all_indices, sigmoid(all_scores)
+
+    def save(self, path: str):
+        """Sauvegarde la partition IVF (.npz) avec la version du modèle"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(
+            path,
+            centroids=self.centroids,
+            order=self.order,
+            offsets=self.offsets,
+            max_norm=np.float32(self.max_norm),
+            version=np.array(self.version or '')
+        )
+
+    def load(self, path: str) -> bool:
+        """Recharge une partition IVF si elle correspond à la version du modèle"""
+        if not os.path.exists(path):
+            return False
+        data = np.load(path)
+        if str(data['version']) != (self.version or '') or data['order'].shape[0] != len(self.bias):
+            logger.warning("Index IVF obsolète : reconstruction")
+            return False
+        self.centroids = data['centroids']
+        self.order = data['order']
+        self.offsets = data['offsets']
+        self.max_norm = float(data['max_norm'])
+        self.n_clusters = len(self.centroids)
+        self.sorted_weight = np.ascontiguousarray(self.weight[self.order])
+        self.sorted_bias = self.bias[self.order]
+        return True
+
+
+def recall_at_k(index: DecoderMIPSIndex, hidden: np.ndarray, k: int) -> float:
+    """Proportion du top-k exact retrouvée par l'index"""
+    exact, _ = top_k(hidden @ index.weight.T + index.bias, k)
+    approx, _ = index.search(hidden, k)
+    hits = [len(np.intersect1d(e, a)) for e, a in zip(exact, approx)]
+    return float(np.sum(hits) / exact.size)
+
+
+def build_item_index(model_loader, mode: str, nprobe: int, cache_path: Optional[str] = None) -> DecoderMIPSIndex:
+    """Construit (ou recharge) l'index sur les poids du décodeur du modèle chargé"""
+    weight, bias = model_loader.decoder_weights()
+    index = DecoderMIPSIndex(weight, bias, mode=mode, nprobe=nprobe, version=model_loader.model_version)
+    if mode == 'ivf':
+        if cache_path is None or not index.load(cache_path):
+            index.build()
+            if cache_path is not None:
+                index.save(cache_path)
+    return index
+
@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import logger
+from utils.numpy_engine import top_k
+
+EMBEDDING_SOURCES = ('decoder', 'encoder')
+
+
+def item_embeddings(model_loader, source: str = 'decoder') -> np.ndarray:
+    """Embeddings livres (num_items x 256) normalisés L2, dérivés du DAE
+
+    - 'decoder' : lignes de la dernière couche `Linear(256, num_items)`
+    - 'encoder' : colonnes de la première couche `Linear(num_items, 256)`
+    """
+    if source not in EMBEDDING_SOURCES:
+        raise ValueError(f"Source inconnue: {source} (attendu: {', '.join(EMBEDDING_SOURCES)})")
+    if source == 'decoder':
+        weight, _ = model_loader.layer_weights('dec2')
+    else:
+        weight = model_loader.layer_weights('enc1')[0].T
+    embeddings = np.ascontiguousarray(weight, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class ItemNeighborTable:
+    """Top-M voisins de chaque livre (indices + similarités cosinus), lus en mmap"""
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, table_dir: str):
+        self.table_dir = table_dir
+        self.indices = None
+        self.scores = None
+        self.meta = {}
+        self.is_loaded_flag = False
+
+    def load(self) -> bool:
+        if not os.path.exists(os.path.join(self.table_dir, self.META_FILE)):
+            logger.info(f"Table de voisins introuvable: {self.table_dir}")
+            return False
+
+        try:
+            with open(os.path.join(self.table_dir, self.META_FILE)) as f:
+                self.meta = json.load(f)
+            self.indices = np.load(os.path.join(self.table_dir, 'indices.npy'), mmap_mode='r')
+            self.scores = np.load(os.path.join(self.table_dir, 'scores.npy'), mmap_mode='r')
+        except Exception as e:
+            logger.error(f"Erreur chargement table de voisins: {e}")
+            return False
+
+        self.is_loaded_flag = True
+        return True
+
+    def is_loaded(self) -> bool:
+        return self.is_loaded_flag
+
+    @property
+    def size(self) -> int:
+        return self.meta.get('m', 0)
+
+    def is_fresh(self, model_version: Optional[str]) -> bool:
+        return self.is_loaded_flag and self.meta.get('model_version') == model_version
+
+    def lookup(self, item_idx: int, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Voisins d'un livre, du plus au moins similaire"""
+        return self.indices[item_idx, :n], self.scores[item_idx, :n]
+
+
+def build_item_neighbors(
+    model_loader,
+    table_dir: str,
+    m: int = 50,
+    source: str = 'decoder',
+    block_size: int = 1024
+) -> ItemNeighborTable:
+    """Pré-calcule les M plus proches voisins de chaque livre par blocs de lignes
+
+    Seul un bloc (block_size x num_items) de similarités est en mémoire à la
+    fois : la matrice livre x livre complète n'est jamais construite.
+    """
+    start = time.time()
+    embeddings = item_embeddings(model_loader, source)
+    num_items = len(embeddings)
+    m = min(m, num_items - 1)
+
+    tmp_dir = f"{table_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    indices = np.lib.format.open_memmap(
+        os.path.join(tmp_dir, 'indices.npy'), mode='w+', dtype=np.int32, shape=(num_items, m)
+    )
+    scores = np.lib.format.open_memmap(
+        os.path.join(tmp_dir, 'scores.npy'), mode='w+', dtype=np.float32, shape=(num_items, m)
+    )
+
+    for offset in range(0, num_items, block_size):
+        end = min(offset + block_size, num_items)
+        similarities = embeddings[offset:end] @ embeddings.T
+        # Un livre n'est pas son propre voisin
+        similarities[np.arange(end - offset), np.arange(offset, end)] = -np.inf
+        indices[offset:end], scores[offset:end] = top_k(similarities, m)
+
+    indices.flush()
+    scores.flush()
+    del indices, scores
+
+    meta = {
+        'm': m,
+        'num_items': num_items,
+        'source': source,
+        'model_version': model_loader.model_version,
+        'built_at': time.time()
+    }
+    with open(os.path.join(tmp_dir, ItemNeighborTable.META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(table_dir, ignore_errors=True)
+    os.replace(tmp_dir, table_dir)
+
+    logger.info(f"Voisins top-{m} calculés en {time.time() - start:.1f}s ({num_items} livres)")
+
+    table = ItemNeighborTable(table_dir)
+    table.load()
+    return table
+
+
+if __name__ == '__main__':
+    from config import Config
+    from utils.components import build_model_loader
+    from utils.metrics import setup_logging
+
+    setup_logging(Config.LOG_DIR, Config.LOG_LEVEL, Config.LOG_FORMAT)
+    # Même modèle que celui servi (registre, artefact ou pickle) : la version doit correspondre
+    loader = build_model_loader()
+    if loader is None:
+        raise SystemExit("Impossible de charger le modèle")
+    build_item_neighbors(
+        loader,
+        Config.ITEM_NEIGHBORS_DIR,
+        Config.ITEM_NEIGHBORS_SIZE,
+        Config.ITEM_EMBEDDING_SOURCE
+    )
@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class MetadataCache:
+    """Cache persistant des métadonnées Google Books (SQLite)
+
+    - TTL distincts pour les livres trouvés, les ISBN introuvables et les 403
+    - Éviction LRU au-delà de `max_entries` ; la date d'accès n'est réécrite
+      que si elle date de plus de `touch_interval` secondes, pour que les
+      lectures restent des lectures (pas de transaction d'écriture par hit)
+    - Mode WAL : plusieurs processus peuvent partager le même fichier
+    """
+
+    STATUS_OK = 'ok'
+    STATUS_NOT_FOUND = 'not_found'
+    STATUS_FORBIDDEN = 'forbidden'
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl: float = 30 * 24 * 3600,
+        negative_ttl: float = 24 * 3600,
+        forbidden_ttl: float = 600,
+        max_entries: int = 100_000,
+        touch_interval: float = 3600
+    ):
+        self.db_path = db_path
+        self.ttls = {
+            self.STATUS_OK: ttl,
+            self.STATUS_NOT_FOUND: negative_ttl,
+            self.STATUS_FORBIDDEN: forbidden_ttl
+        }
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        if self.db_path != ':memory:':
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS metadata ('
+            ' isbn TEXT PRIMARY KEY,'
+            ' status TEXT NOT NULL,'
+            ' payload TEXT,'
+            ' expires_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_metadata_last_access ON metadata(last_access)'
+        )
+        return conn
+
+    def reopen(self):
+        """Ouvre une nouvelle connexion (à appeler dans un processus issu d'un fork)
+
+        Une connexion SQLite ne doit pas être utilisée de part et d'autre d'un
+        fork ; celle héritée du parent est abandonnée sans être fermée.
+        """
+        self._lock = threading.Lock()
+        self._inherited_conn = self._conn
+        self._conn = self._connect()
+
+    def get(self, isbn: str) -> Tuple[bool, Optional[Dict]]:
+        """Retourne (présent, métadonnées) ; (True, None) pour un échec mis en cache"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, payload, expires_at, last_access FROM metadata WHERE isbn = ?',
+                (isbn,)
+            ).fetchone()
+            if row is None:
+                return False, None
+
+            status, payload, expires_at, last_access = row
+            if expires_at < now:
+                self._conn.execute('DELETE FROM metadata WHERE isbn = ?', (isbn,))
+                return False, None
+
+            # Précision suffisante pour l'éviction LRU, sans écriture à chaque lecture
+            if now - last_access >= self.touch_interval:
+                self._conn.execute(
+                    'UPDATE metadata SET last_access = ? WHERE isbn = ?', (now, isbn)
+                )
+
+        if status == self.STATUS_OK:
+            return True, json.loads(payload)
+        return True, None
+
+    def set(self, isbn: str, book_info: Dict):
+        """Met en cache les métadonnées d'un livre trouvé"""
+        self._put(isbn, self.STATUS_OK, json.dumps(book_info))
+
+    def set_negative(self, isbn: str, status: str = STATUS_NOT_FOUND):
+        """Met en cache un échec (ISBN introuvable ou 403)"""
+        self._put(isbn, status, None)
+
+    def iter_entries(self) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """Entrées valides (isbn, métadonnées) ; None pour un ISBN introuvable, 403 exclus"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT isbn, status, payload FROM metadata WHERE expires_at >= ? AND status != ?',
+                (time.time(), self.STATUS_FORBIDDEN)
+            ).fetchall()
+        for isbn, status, payload in rows:
+            yield isbn, json.loads(payload) if status == self.STATUS_OK else None
+
+    def _put(self, isbn: str, status: str, payload: Optional[str]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO metadata (isbn, status, payload, expires_at, last_access)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (isbn, status, payload, now + self.ttls[status], now)
+            )
+            self._writes_since_evict += 1
+            # Éviction amortie : vérifiée tous les 1 % de la capacité
+            if self._writes_since_evict >= max(1, self.max_entries // 100):
+                self._writes_since_evict = 0
+                self._evict()
+
+    def _evict(self):
+        """Supprime les entrées expirées puis les moins récemment utilisées"""
+        self._conn.execute('DELETE FROM metadata WHERE expires_at < ?', (time.time(),))
+        count = self._conn.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                'DELETE FROM metadata WHERE isbn IN ('
+                ' SELECT isbn FROM metadata ORDER BY last_access ASC LIMIT ?)',
+                (excess,)
+            )
+
+    def __contains__(self, isbn: str) -> bool:
+        return self.get(isbn)[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM metadata')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,190 @@
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from config import Config
+from utils.metrics import logger, metrics
+from utils.rate_limiter import TokenBucket
+
+
+class MetadataWarmer:
+    """Préchauffage du cache de métadonnées avec les livres les plus recommandés
+
+    Au démarrage (et après chaque changement de modèle), un thread compte
+    la fréquence de chaque livre dans le top-N des utilisateurs, lue dans la
+    table top-N si elle est à jour, sinon calculée depuis les scores du
+    modèle sur un échantillon de `user_mapping`. Les métadonnées des livres
+    les plus fréquents sont ensuite récupérées par lots :
+
+    - au plus `quota_share` du débit du limiteur de l'API : chaque requête
+      envoyée (groupée ou individuelle) débite un jeton, en plus du limiteur
+      global, et un lot interrompu faute de jeton reprend une fois le budget
+      reconstitué ;
+    - en pause tant qu'une requête utilisateur a eu besoin de l'API depuis
+      moins de `idle_seconds`, ou après une réponse 403.
+    """
+
+    FORBIDDEN_BACKOFF = 600
+
+    def __init__(
+        self,
+        api,
+        quota_share: float = 0.3,
+        idle_seconds: float = 2.0,
+        max_isbns: int = 5000,
+        sample_users: int = 20000,
+        top_n: int = 20,
+        batch_size: int = 512
+    ):
+        self.api = api
+        self.quota_share = quota_share
+        self.idle_seconds = idle_seconds
+        self.max_isbns = max_isbns
+        self.sample_users = sample_users
+        self.top_n = top_n
+        self.batch_size = batch_size
+        # Un lot coûte au plus une requête groupée + une requête par ISBN
+        self.bucket = TokenBucket(
+            max(api.rate_limiter.rate * quota_share, 1e-3), capacity=api.group_size + 1
+        )
+        self.progress = {'state': 'idle', 'ranked': 0, 'done': 0, 'fetched': 0}
+        self._recommender = None
+        self._generation = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, recommender) -> 'MetadataWarmer':
+        """Démarre le thread et lance le préchauffage pour `recommender`"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='metadata-warmer', daemon=True)
+            self._thread.start()
+        self.warm(recommender)
+        return self
+
+    def warm(self, recommender):
+        """(Re)lance le préchauffage pour un recommandeur (nouveau modèle) ; interrompt le précédent"""
+        self._recommender = recommender
+        self._generation += 1
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            generation = self._generation
+            try:
+                self._warm(self._recommender, generation)
+            except Exception as e:
+                logger.exception(f"Erreur du préchauffage des métadonnées: {e}")
+            self.progress['state'] = 'idle'
+
+    def _cancelled(self, generation: int) -> bool:
+        return self._stop.is_set() or generation != self._generation
+
+    # Classement
+
+    def rank_isbns(self, recommender, generation: Optional[int] = None) -> np.ndarray:
+        """Index des livres triés par fréquence décroissante dans le top-N des utilisateurs"""
+        model_loader = recommender.model_loader
+        num_users = len(model_loader.user_mapping)
+        num_items = len(model_loader.isbn_mapping)
+        # Échantillon régulier d'utilisateurs : coût borné quel que soit le nombre d'utilisateurs
+        users = np.unique(np.linspace(0, num_users - 1, min(num_users, self.sample_users)).astype(np.int64))
+
+        counts = np.zeros(num_items, dtype=np.int64)
+        table = recommender.topn_table
+        if table is not None and table.exclude_rated and table.size >= self.top_n:
+            rows = np.asarray(table.indices[users[users < len(table.indices)], :self.top_n])
+            counts += np.bincount(rows[rows >= 0], minlength=num_items)
+        else:
+            for offset in range(0, len(users), self.batch_size):
+                if generation is not None and self._cancelled(generation):
+                    return np.empty(0, dtype=np.int64)
+                self._wait_idle(generation)
+                indices, _ = recommender._rank(users[offset:offset + self.batch_size].tolist(), self.top_n, True)
+                counts += np.bincount(indices[indices >= 0], minlength=num_items)
+
+        ranked = np.argsort(-counts, kind='stable')
+        return ranked[counts[ranked] > 0][:self.max_isbns]
+
+    # Préchauffage
+
+    def _warm(self, recommender, generation: int):
+        start = time.time()
+        self.progress = {'state': 'ranking', 'ranked': 0, 'done': 0, 'fetched': 0}
+        ranked = self.rank_isbns(recommender, generation)
+        if self._cancelled(generation):
+            return
+
+        catalog = recommender.catalog
+        if catalog is not None:
+            # Livres déjà décrits ou connus comme introuvables : rien à demander
+            ranked = ranked[catalog.is_unknown(ranked)]
+        isbns = recommender.model_loader.isbn_array[ranked].tolist()
+        self.progress.update(state='fetching', ranked=len(isbns))
+        logger.info(f"Préchauffage des métadonnées : {len(isbns)} livres à vérifier")
+
+        group_size = self.api.group_size
+        for offset in range(0, len(isbns), group_size):
+            group = isbns[offset:offset + group_size]
+            while group:
+                if self._cancelled(generation):
+                    return
+                self._wait_idle(generation)
+                # Budget du pire cas, pour ne pas renvoyer la requête groupée à chaque reprise
+                self.bucket.wait(len(group) + 1)
+                fetched, group = self.api.prefetch(group, limiter=self.bucket)
+                metrics.inc('warmup_books_fetched_total', fetched)
+                self.progress['fetched'] += fetched
+            self.progress['done'] = min(offset + group_size, len(isbns))
+
+        logger.info(
+            f"✅ Préchauffage terminé en {time.time() - start:.0f}s "
+            f"({self.progress['fetched']} livres récupérés sur {len(isbns)})"
+        )
+
+    def _wait_idle(self, generation: Optional[int]):
+        """Attend que le trafic utilisateur n'ait plus besoin de l'API (et la fin d'un 403)"""
+        paused = False
+        while not (generation is not None and self._cancelled(generation)):
+            wait = max(
+                self.idle_seconds - self.api.seconds_since_live_miss(),
+                self.FORBIDDEN_BACKOFF - self.api.seconds_since_forbidden()
+            )
+            if wait <= 0:
+                break
+            if not paused:
+                paused = True
+                metrics.inc('warmup_pauses_total')
+                self.progress['state'] = 'paused'
+            self._stop.wait(min(wait, 1.0))
+        if paused:
+            self.progress['state'] = 'fetching'
+
+
+def start_metadata_warmer(registry) -> Optional[MetadataWarmer]:
+    """Préchauffe le cache pour le modèle courant, puis après chaque bascule du registre"""
+    if not Config.WARMUP_ENABLED:
+        return None
+    warmer = MetadataWarmer(
+        registry.api,
+        quota_share=Config.WARMUP_QUOTA_SHARE,
+        idle_seconds=Config.WARMUP_IDLE_SECONDS,
+        max_isbns=Config.WARMUP_MAX_ISBNS,
+        sample_users=Config.WARMUP_SAMPLE_USERS,
+        top_n=Config.WARMUP_TOPN
+    )
+    registry.on_swap(lambda bundle: warmer.warm(bundle.recommender))
+    return warmer.start(registry.current.recommender)
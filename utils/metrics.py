@@ -0,0 +1,413 @@
+import bisect
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger('book_recommender')
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str = ''):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> str:
+        help_line = f"# HELP {self.name} {self.help_text}\n" if self.help_text else ""
+        return f"{help_line}# TYPE {self.name} counter\n{self.name} {self.value:g}\n"
+
+    def dump(self) -> Dict:
+        return {'type': 'counter', 'help': self.help_text, 'value': self.value}
+
+    def merge(self, state: Dict):
+        self.value += state['value']
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str = '', buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Quantile approché (borne supérieure du bucket)"""
+        with self._lock:
+            if not self.count:
+                return None
+            target = q * self.count
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+                cumulative += count
+                if cumulative >= target:
+                    return bound
+        return None
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            cumulative = 0
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+            lines.append(f"{self.name}_sum {self.sum:g}")
+            lines.append(f"{self.name}_count {self.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self) -> Dict:
+        with self._lock:
+            return {
+                'type': 'histogram', 'help': self.help_text, 'buckets': list(self.buckets),
+                'counts': list(self.counts), 'sum': self.sum, 'count': self.count
+            }
+
+    def merge(self, state: Dict):
+        if tuple(state['buckets']) != self.buckets:
+            return
+        self.counts = [a + b for a, b in zip(self.counts, state['counts'])]
+        self.sum += state['sum']
+        self.count += state['count']
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class SamplingProfiler:
+    """Échantillonne la pile d'un thread à intervalle fixe pendant une requête"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = StackCounter()
+        self._stop = threading.Event()
+        self._active = threading.Event()
+        self._active.set()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self._active.is_set():
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)[-8:]
+            self.samples[' <- '.join(
+                f"{os.path.basename(f.filename)}:{f.name}:{f.lineno}" for f in reversed(stack)
+            )] += 1
+
+    def start(self) -> 'SamplingProfiler':
+        self._thread.start()
+        return self
+
+    def pause(self):
+        """Suspend l'échantillonnage (le thread exécute du code hors de la requête)"""
+        self._active.clear()
+
+    def resume(self):
+        self._active.set()
+
+    def stop(self) -> StackCounter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+class MetricsRegistry:
+    """Compteurs, histogrammes de latence et spans de chronométrage (export Prometheus)
+
+    En pré-fork, chaque worker a ses propres valeurs : après `share`, chaque
+    processus publie les siennes dans `<shared_dir>/<pid>.json` (toutes les
+    `flush_interval` secondes et à chaque rendu) et `/metrics`, quel que soit
+    le worker qui répond, renvoie la somme de tous les processus.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self.slow_threshold: Optional[float] = None
+        self.profile_fraction = 0.0
+        self.shared_dir: Optional[str] = None
+        self.flush_interval = 5.0
+        self._flusher: Optional[threading.Thread] = None
+
+    def counter(self, name: str, help_text: str = '') -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text)
+            return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str = '') -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text)
+            return self._metrics[name]
+
+    def inc(self, name: str, amount: float = 1.0, help_text: str = ''):
+        self.counter(name, help_text).inc(amount)
+
+    @contextmanager
+    def span(self, name: str, profile: bool = False) -> Iterator[None]:
+        """Chronomètre un bloc et l'enregistre dans `<name>_duration_seconds`
+
+        Avec `profile=True`, une fraction `profile_fraction` des appels est
+        échantillonnée ; la pile est journalisée si le bloc dépasse `slow_threshold`.
+        """
+        profiler = None
+        if profile and self.slow_threshold is not None and random.random() < self.profile_fraction:
+            profiler = SamplingProfiler(threading.get_ident()).start()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - start, profiler)
+
+    def span_iter(self, name: str, iterable: Iterable, profile: bool = False) -> Iterator:
+        """Comme `span` pour un générateur consommé élément par élément
+
+        Seul le temps passé à produire les éléments est chronométré (et
+        échantillonné) : le traitement de l'appelant entre deux éléments,
+        générateur suspendu, n'est pas compté.
+        """
+        profiler = None
+        if profile and self.slow_threshold is not None and random.random() < self.profile_fraction:
+            profiler = SamplingProfiler(threading.get_ident()).start()
+
+        iterator = iter(iterable)
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                    if profiler is not None:
+                        profiler.pause()
+                yield item
+                if profiler is not None:
+                    profiler.resume()
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            self._record(name, elapsed, profiler)
+
+    def _record(self, name: str, elapsed: float, profiler: Optional[SamplingProfiler]):
+        self.histogram(f"{name}_duration_seconds", f"Durée de {name} (secondes)").observe(elapsed)
+        if profiler is not None:
+            samples = profiler.stop()
+            if elapsed >= self.slow_threshold:
+                self._log_slow(name, elapsed, samples)
+
+    def _log_slow(self, name: str, elapsed: float, samples: StackCounter):
+        self.inc('slow_requests_total', help_text="Requêtes profilées au-delà du seuil de lenteur")
+        top = "\n".join(f"  {count:4d}  {stack}" for stack, count in samples.most_common(10)) or "  (aucun échantillon)"
+        logger.warning(f"Requête lente {name}: {elapsed * 1000:.0f} ms\n{top}")
+
+    def render_prometheus(self) -> str:
+        if self.shared_dir is not None:
+            return self._render_shared()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() for metric in sorted(metrics, key=lambda m: m.name))
+
+    # Agrégation entre processus (pré-fork)
+
+    def share(self, directory: str, flush_interval: float = 5.0):
+        """Processus parent, avant le fork : valeurs publiées dans `directory`
+
+        Les fichiers d'une exécution précédente sont supprimés ; ceux des
+        workers arrêtés puis relancés sont gardés (compteurs monotones).
+        """
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            os.remove(path)
+        self.shared_dir = directory
+        self.flush_interval = flush_interval
+        self.flush()
+
+    def after_fork(self):
+        """Worker : repart de zéro (valeurs du parent déjà publiées) et publie périodiquement"""
+        self._lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric.reset()
+        if self.shared_dir is None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning(f"Publication des métriques impossible: {e}")
+
+    def flush(self):
+        """Écrit les valeurs du processus courant dans `<shared_dir>/<pid>.json`"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        state = {metric.name: metric.dump() for metric in metrics}
+        path = os.path.join(self.shared_dir, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def _render_shared(self) -> str:
+        """Somme des valeurs publiées par tous les processus"""
+        self.flush()
+        merged: Dict[str, object] = {}
+        for path in glob.glob(os.path.join(self.shared_dir, '*.json')):
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, metric_state in state.items():
+                metric = merged.get(name)
+                if metric is None:
+                    if metric_state['type'] == 'counter':
+                        metric = Counter(name, metric_state['help'])
+                    else:
+                        metric = Histogram(name, metric_state['help'], tuple(metric_state['buckets']))
+                    merged[name] = metric
+                metric.merge(metric_state)
+        return "".join(metric.render() for metric in sorted(merged.values(), key=lambda m: m.name))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Vue résumée (compteurs, p50/p99 approchés) pour l'affichage"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        result = {}
+        for metric in metrics:
+            if isinstance(metric, Counter):
+                result[metric.name] = {'value': metric.value}
+            else:
+                result[metric.name] = {
+                    'count': metric.count,
+                    'p50': metric.quantile(0.5),
+                    'p99': metric.quantile(0.99)
+                }
+        return result
+
+
+metrics = MetricsRegistry()
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objet JSON par ligne : exploitable tel quel par les outils d'agrégation de logs
+
+    Le pid distingue les workers pré-fork ; les messages sur plusieurs lignes
+    (piles des requêtes lentes, exceptions) restent sur une seule ligne.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+LOG_FORMATTERS = {
+    'json': JsonFormatter,
+    'text': lambda: logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(process)d] %(message)s')
+}
+
+
+def setup_logging(log_dir: str, level: str = 'INFO', fmt: str = 'json'):
+    """Journalisation console + fichier dans `log_dir` pour le logger de l'application
+
+    `fmt` : 'json' (une ligne JSON par message) ou 'text' (lecture à l'écran).
+    """
+    if logger.handlers:
+        return
+    if fmt not in LOG_FORMATTERS:
+        raise ValueError(f"Format de log inconnu: {fmt} (attendu: {', '.join(LOG_FORMATTERS)})")
+    logger.setLevel(level.upper())
+    formatter = LOG_FORMATTERS[fmt]()
+    os.makedirs(log_dir, exist_ok=True)
+    for handler in (logging.StreamHandler(), logging.FileHandler(os.path.join(log_dir, 'app.log'))):
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+
+
+def configure_profiling(slow_threshold: Optional[float], profile_fraction: float):
+    """Active l'échantillonnage des requêtes lentes (seuil en secondes)"""
+    metrics.slow_threshold = slow_threshold
+    metrics.profile_fraction = profile_fraction
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = metrics.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(host: str, port: int) -> Optional[ThreadingHTTPServer]:
+    """Expose /metrics dans un thread d'arrière-plan ; None si le port est occupé"""
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"Endpoint de métriques indisponible sur {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
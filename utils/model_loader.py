@@ -1,99 +1,236 @@
 
+import hashlib
 import pickle
 import pandas as pd
 import numpy as np
-import torch
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import os
+import warnings
 
-from utils.dae_model import DenoisingAutoEncoder
+from utils.artifact import ARTIFACT_EXT, LAYERS, ArtifactError, FlatArtifact
+from utils.id_index import IdIndex
+from utils.metrics import logger, metrics
+from utils.numpy_engine import PRECISIONS, NumpyDAE
 
 class ModelLoader:
     """Charge et gère le modèle DAE"""
     
-    def __init__(self, model_path: str):
+    BACKENDS = ('torch', 'numpy')
+    
+    def __init__(self, model_path: str, backend: str = 'torch', precision: str = 'float32'):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Backend inconnu: {backend} (attendu: {', '.join(self.BACKENDS)})")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Précision inconnue: {precision} (attendu: {', '.join(PRECISIONS)})")
         self.model_path = model_path
+        self.backend = backend
+        self.precision = precision
         self.model = None
         self.user_mapping = None
         self.isbn_mapping = None
-        self.reverse_isbn_mapping = None
+        self._reverse_isbn_mapping = None
+        self.isbn_array = None
+        self.model_version = None
+        self.artifact = None
         self.is_loaded_flag = False
     
     def load_model(self) -> bool:
-        """Charge le modèle depuis le fichier pickle"""
+        """Charge le modèle depuis le fichier pickle ou un artefact plat (.dae)"""
+        with metrics.span('model_load'):
+            return self._load()
+    
+    def _load(self) -> bool:
         try:
             if not os.path.exists(self.model_path):
-                print(f"Fichier modèle introuvable: {self.model_path}")
+                logger.error(f"Fichier modèle introuvable: {self.model_path}")
                 return False
             
-            print(f"Chargement du modèle depuis {self.model_path}...")
+            logger.info(f"Chargement du modèle depuis {self.model_path}...")
             
-            # Charger avec torch.load
-            try:
-                data = torch.load(self.model_path, map_location='cpu', weights_only=False)
-                print("✅ Chargé avec torch.load")
-            except Exception as e:
-                print(f"❌ Erreur torch.load: {e}")
-                return False
-            
-            # Vérifier le type de data
-            if isinstance(data, dict):
-                # Format: {'model': ..., 'user_mapping': ..., 'isbn_mapping': ...}
-                print("Format: Dictionnaire")
-                self.model = data.get('model')
-                self.user_mapping = data.get('user_mapping', {})
-                self.isbn_mapping = data.get('isbn_mapping', {})
-            elif isinstance(data, DenoisingAutoEncoder):
-                # Format: Le modèle directement (ERREUR - mappings manquants)
-                print("⚠️ Format: Modèle seul (sans mappings)")
-                print("❌ ERREUR: Le fichier .pkl doit contenir user_mapping et isbn_mapping")
-                print("\nVotre modèle doit être sauvegardé comme:")
-                print("torch.save({")
-                print("    'model': model,")
-                print("    'user_mapping': user_mapping,")
-                print("    'isbn_mapping': isbn_mapping")
-                print("}, 'dae_model.pkl')")
-                return False
-            else:
-                print(f"⚠️ Format inconnu: {type(data)}")
+            if self.model_path.endswith(ARTIFACT_EXT):
+                if not self._load_artifact():
+                    return False
+            elif not self._load_pickle():
                 return False
             
             # Vérifications
             if not self.user_mapping:
-                print("❌ ERREUR: user_mapping vide ou manquant")
+                logger.error("user_mapping vide ou manquant")
                 return False
             
             if not self.isbn_mapping:
-                print("❌ ERREUR: isbn_mapping vide ou manquant")
+                logger.error("isbn_mapping vide ou manquant")
                 return False
             
             if self.model is None:
-                print("❌ ERREUR: Modèle est None")
+                logger.error("Modèle est None")
                 return False
             
-            # Créer le mapping inverse
-            self.reverse_isbn_mapping = {
-                v: k for k, v in self.isbn_mapping.items()
-            }
+            # Index sur tableaux triés : pas d'objet Python par utilisateur ou par ISBN
+            self.user_mapping = IdIndex.from_dict(self.user_mapping)
+            self.isbn_mapping = IdIndex.from_dict(self.isbn_mapping)
             
-            # Mode évaluation
-            self.model.eval()
+            # Tableau index -> ISBN pour le classement vectorisé (chaînes de largeur
+            # fixe : un seul tampon, sans objets Python, partageable après un fork)
+            isbn_keys, positions = self.isbn_mapping.key_arrays()
+            self.isbn_array = np.empty(len(isbn_keys), dtype=f'U{max(1, isbn_keys.dtype.itemsize)}')
+            self.isbn_array[positions] = np.char.decode(isbn_keys, 'utf-8')
+            self._reverse_isbn_mapping = None
             
-            self.is_loaded_flag = True
-            print(f"✅ Modèle chargé avec succès!")
-            print(f"   - Utilisateurs: {len(self.user_mapping)}")
-            print(f"   - Livres: {len(self.isbn_mapping)}")
+            if self.backend == 'numpy':
+                if not isinstance(self.model, NumpyDAE):
+                    self.model = NumpyDAE.from_torch(self.model, self.precision)
+            else:
+                # Mode évaluation
+                self.model.eval()
             
-            sample_users = list(self.user_mapping.keys())[:5]
-            print(f"   - Exemples IDs: {sample_users}")
+            self.is_loaded_flag = True
+            sample_users, _ = self.user_mapping.search(limit=5)
+            logger.info(
+                f"Modèle chargé: {len(self.user_mapping)} utilisateurs, "
+                f"{len(self.isbn_mapping)} livres (exemples IDs: {sample_users})"
+            )
             
             return True
             
         except Exception as e:
-            print(f"❌ Erreur: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Erreur lors du chargement du modèle: {e}")
+            return False
+    
+    def _load_pickle(self) -> bool:
+        """Charge le modèle complet et ses mappings avec torch.load"""
+        import torch
+        from utils.dae_model import DenoisingAutoEncoder
+        
+        # Charger avec torch.load
+        try:
+            data = torch.load(self.model_path, map_location='cpu', weights_only=False)
+            logger.debug("Chargé avec torch.load")
+        except Exception as e:
+            logger.error(f"Erreur torch.load: {e}")
+            return False
+        
+        # Vérifier le type de data
+        if isinstance(data, dict):
+            # Format: {'model': ..., 'user_mapping': ..., 'isbn_mapping': ...}
+            logger.debug("Format: Dictionnaire")
+            self.model = data.get('model')
+            self.user_mapping = data.get('user_mapping', {})
+            self.isbn_mapping = data.get('isbn_mapping', {})
+        elif isinstance(data, DenoisingAutoEncoder):
+            # Format: Le modèle directement (ERREUR - mappings manquants)
+            logger.error(
+                "Le fichier .pkl contient le modèle seul, sans user_mapping ni isbn_mapping. "
+                "Votre modèle doit être sauvegardé comme: torch.save({'model': model, "
+                "'user_mapping': user_mapping, 'isbn_mapping': isbn_mapping}, 'dae_model.pkl')"
+            )
             return False
+        else:
+            logger.error(f"Format inconnu: {type(data)}")
+            return False
+        
+        self.model_version = self._compute_version(self.model_path)
+        return True
+    
+    def _load_artifact(self) -> bool:
+        """Charge un artefact plat : poids en mmap (sans copie) et mappings triés"""
+        try:
+            artifact = FlatArtifact(self.model_path).open()
+            artifact.validate()
+        except (ArtifactError, OSError, ValueError, KeyError) as e:
+            logger.error(f"Artefact invalide: {e}")
+            return False
+        logger.info(f"Artefact chargé (version {artifact.version})")
+        
+        self.artifact = artifact
+        # Clés triées et index lus directement dans l'artefact (mmap, sans copie)
+        self.user_mapping = IdIndex(*artifact.mapping_arrays('user'))
+        self.isbn_mapping = IdIndex(*artifact.mapping_arrays('isbn'))
+        self.model_version = artifact.version
+        
+        if self.backend == 'numpy':
+            # Inférence NumPy : PyTorch n'est jamais importé
+            self.model = NumpyDAE.from_artifact(artifact, self.precision)
+            return True
+        
+        import torch
+        from utils.dae_model import DenoisingAutoEncoder
+        
+        # Modèle construit sur le device 'meta' : aucune allocation avant l'injection des poids
+        with torch.device('meta'):
+            model = DenoisingAutoEncoder(artifact.num_items, latent_dim=artifact.latent_dim)
+        with warnings.catch_warnings():
+            # Tenseurs en lecture seule partagés avec le mmap : aucune copie
+            warnings.simplefilter('ignore', UserWarning)
+            for torch_name, flat_name in LAYERS.items():
+                weight, bias = artifact.layer(flat_name)
+                layer = model.get_submodule(torch_name)
+                if tuple(layer.weight.shape) != weight.shape or tuple(layer.bias.shape) != bias.shape:
+                    logger.error(f"Forme incompatible pour {torch_name}: {weight.shape}")
+                    return False
+                layer.weight = torch.nn.Parameter(torch.from_numpy(weight), requires_grad=False)
+                layer.bias = torch.nn.Parameter(torch.from_numpy(bias), requires_grad=False)
+        
+        self.model = model
+        return True
+    
+    def adopt_mappings(self, other: 'ModelLoader'):
+        """Reprend les mappings d'un autre modèle aux clés identiques (utilisateurs ajoutés compris)"""
+        self.user_mapping = other.user_mapping
+        self.isbn_mapping = other.isbn_mapping
+        self.isbn_array = other.isbn_array
+        self._reverse_isbn_mapping = None
+    
+    @property
+    def reverse_isbn_mapping(self) -> Dict[int, str]:
+        """Mapping index -> ISBN, construit à la première utilisation"""
+        if self._reverse_isbn_mapping is None and self.isbn_array is not None:
+            self._reverse_isbn_mapping = dict(enumerate(self.isbn_array.tolist()))
+        return self._reverse_isbn_mapping
+    
+    def predict(self, user_matrix: np.ndarray) -> np.ndarray:
+        """Scores du modèle (n_users x n_books) pour une matrice d'entrée"""
+        with metrics.span('forward'):
+            if self.backend == 'numpy':
+                return self.model(user_matrix)
+            
+            import torch
+            with torch.no_grad():
+                return self.model(torch.from_numpy(user_matrix)).numpy()
+    
+    def hidden(self, user_matrix: np.ndarray) -> np.ndarray:
+        """Activation de dimension 256 en entrée de la dernière couche du décodeur"""
+        with metrics.span('forward_hidden'):
+            if self.backend == 'numpy':
+                return self.model.hidden(user_matrix)
+            
+            import torch
+            with torch.no_grad():
+                encoded = self.model.encoder(torch.from_numpy(user_matrix))
+                return self.model.decoder[:3](encoded).numpy()
+    
+    def decoder_weights(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Poids (num_items x 256) et biais de la dernière couche du décodeur, en float32"""
+        return self.layer_weights('dec2')
+    
+    def layer_weights(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Poids et biais float32 d'une couche ('enc1', 'enc2', 'dec1', 'dec2')"""
+        if self.backend == 'numpy':
+            layer = getattr(self.model, name)
+            return layer.dequantize(), layer.bias
+        
+        torch_name = {flat: torch_name for torch_name, flat in LAYERS.items()}[name]
+        layer = self.model.get_submodule(torch_name)
+        return layer.weight.detach().numpy(), layer.bias.detach().numpy()
+    
+    @staticmethod
+    def _compute_version(path: str) -> str:
+        """Empreinte courte du fichier modèle (sha256 du contenu)"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()[:16]
     
     def get_user_vector(self, user_id: int) -> Optional[int]:
         if not self.is_loaded_flag:
@@ -107,5 +244,7 @@ class ModelLoader:
         return {
             'users': len(self.user_mapping) if self.user_mapping else 0,
             'books': len(self.isbn_mapping) if self.isbn_mapping else 0,
-            'loaded': self.is_loaded_flag
+            'loaded': self.is_loaded_flag,
+            'version': self.model_version,
+            'backend': self.backend
         }
\ No newline at end of file
@@ -0,0 +1,352 @@
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from utils.artifact import ARTIFACT_EXT
+from utils.components import activate_user_history, build_components, build_model_loader, build_recommender
+from utils.metrics import logger, metrics
+
+
+class ServingBundle:
+    """Modèle chargé et recommandeur associé : unité de bascule du registre"""
+
+    def __init__(self, model_loader, recommender, path: str):
+        self.model_loader = model_loader
+        self.recommender = recommender
+        self.path = path
+        self.version = model_loader.model_version
+        self.loaded_at = time.time()
+
+    def describe(self) -> Dict:
+        return {'version': self.version, 'path': self.path, 'loaded_at': self.loaded_at}
+
+
+class ModelRegistry:
+    """Rechargement à chaud des modèles déposés dans `model_dir`
+
+    Un thread surveille les artefacts (.dae) et pickles (.pkl) du dossier.
+    Tout fichier nouveau ou modifié, stable depuis `settle` secondes, est
+    chargé et validé en arrière-plan (formes, score de contrôle) puis
+    remplace le modèle courant en une seule affectation : les requêtes en
+    cours terminent avec les objets de l'ancienne version.
+
+    Les `keep` versions précédentes restent en mémoire pour un retour
+    arrière immédiat (`rollback`). Le modèle actif est noté dans
+    `active_file`, relu au démarrage et surveillé : un retour arrière fait
+    dans un processus est suivi par les autres workers.
+    """
+
+    MODEL_PATTERNS = (f'*{ARTIFACT_EXT}', '*.pkl')
+
+    def __init__(
+        self,
+        api,
+        initial: ServingBundle,
+        model_dir: str,
+        active_file: Optional[str] = None,
+        interval: float = 30.0,
+        settle: float = 5.0,
+        keep: int = 2
+    ):
+        self.api = api
+        self.model_dir = model_dir
+        self.active_file = active_file
+        self.interval = interval
+        self.settle = settle
+        self.current = initial
+        self._previous = deque(maxlen=max(0, keep))
+        self._rejected = set()
+        self._listeners: List[Callable[[ServingBundle], None]] = []
+        self._lock = threading.Lock()  # bascules (rapides)
+        self._load_lock = threading.Lock()  # chargements (lents), sans bloquer un retour arrière
+        self._notify_lock = threading.Lock()  # suites de bascule (lentes), hors de `_lock`
+        self._notified = initial
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Fichiers déjà présents et pas plus récents que le modèle chargé : ignorés
+        current_mtime = self._signature(initial.path)[0] if os.path.exists(initial.path) else 0.0
+        self._seen: Dict[str, Tuple[float, int]] = {
+            path: signature for path, signature in self._scan().items() if signature[0] <= current_mtime
+        }
+        self._seen[os.path.abspath(initial.path)] = self._signature(initial.path) if os.path.exists(initial.path) else (0.0, 0)
+
+    # Abonnements
+
+    def on_swap(self, callback: Callable[[ServingBundle], None]):
+        """Appelle `callback(bundle)` après chaque bascule (nouveau modèle ou retour arrière)"""
+        self._listeners.append(callback)
+
+    @property
+    def versions(self) -> List[Dict]:
+        """Version courante puis versions disponibles pour un retour arrière"""
+        return [self.current.describe()] + [bundle.describe() for bundle in reversed(self._previous)]
+
+    def can_rollback(self) -> bool:
+        return bool(self._previous)
+
+    # Surveillance
+
+    def start(self) -> 'ModelRegistry':
+        """Démarre le thread de surveillance (à appeler dans le processus qui sert les requêtes)"""
+        if self.interval > 0 and (self._thread is None or not self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='model-registry', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.exception(f"Erreur du registre de modèles: {e}")
+
+    def check(self) -> bool:
+        """Suit le fichier du modèle actif puis charge le plus récent des nouveaux fichiers"""
+        if self._follow_active():
+            return True
+
+        now = time.time()
+        candidates = []
+        for path, signature in self._scan().items():
+            if self._seen.get(path) == signature:
+                continue
+            if now - signature[0] < self.settle:
+                # Copie probablement en cours : nouvel essai au prochain passage
+                continue
+            candidates.append((signature[0], path, signature))
+        if not candidates:
+            return False
+
+        # Seul le plus récent est chargé ; les fichiers plus anciens sont ignorés
+        candidates.sort()
+        for _, path, signature in candidates:
+            self._seen[path] = signature
+        return self.load(candidates[-1][1])
+
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        found = {}
+        for pattern in self.MODEL_PATTERNS:
+            for path in glob.glob(os.path.join(self.model_dir, pattern)):
+                try:
+                    found[os.path.abspath(path)] = self._signature(path)
+                except OSError:
+                    pass
+        return found
+
+    @staticmethod
+    def _signature(path: str) -> Tuple[float, int]:
+        stat = os.stat(path)
+        return stat.st_mtime, stat.st_size
+
+    # Chargement et bascule
+
+    def load(self, path: str) -> bool:
+        """Charge, valide et active le modèle de `path` ; l'ancien reste servi en cas d'échec"""
+        start = time.time()
+        with self._load_lock:
+            logger.info(f"Nouveau modèle détecté: {path}")
+            model_loader = build_model_loader(path)
+            if model_loader is None:
+                return self._reject(path, None, "chargement impossible")
+            version = model_loader.model_version
+            if version == self.current.version:
+                logger.info(f"Modèle {version} déjà actif")
+                return False
+            if version in self._rejected:
+                logger.info(f"Modèle {version} écarté précédemment (retour arrière) : ignoré")
+                return False
+
+            error = self._validate_shapes(model_loader)
+            if error:
+                return self._reject(path, version, error)
+
+            try:
+                recommender = build_recommender(model_loader, self.api, previous=self.current.recommender)
+            except Exception as e:
+                logger.exception(f"Assemblage du recommandeur impossible: {e}")
+                return self._reject(path, version, f"assemblage impossible ({e})")
+
+            error = self._smoke_score(recommender)
+            if error:
+                return self._reject(path, version, error)
+
+            with self._lock:
+                history_kept = recommender.user_history is self.current.recommender.user_history
+                self._previous.append(self.current)
+                self._activate(ServingBundle(model_loader, recommender, path))
+
+        self._after_swap()
+        metrics.inc('model_swaps_total')
+        logger.info(
+            f"✅ Modèle {version} actif en {time.time() - start:.1f}s "
+            f"(historique {'conservé' if history_kept else 'rechargé'}, "
+            f"table top-N {'valide' if recommender.topn_table is not None else 'à reconstruire'})"
+        )
+        return True
+
+    def rollback(self) -> bool:
+        """Revient immédiatement à la version précédente, gardée en mémoire"""
+        with self._lock:
+            if not self._previous:
+                logger.warning("Aucune version précédente pour un retour arrière")
+                return False
+            rejected = self.current
+            self._rejected.add(rejected.version)
+            self._activate(self._previous.pop())
+        self._after_swap()
+        metrics.inc('model_rollbacks_total')
+        logger.warning(f"↩️ Retour arrière : {rejected.version} -> {self.current.version}")
+        return True
+
+    def _activate(self, bundle: ServingBundle):
+        """Bascule atomique (verrou `_lock` tenu) : une seule affectation, catalogue et fichier du modèle actif
+
+        Le catalogue du modèle n'est branché sur l'API qu'ici : un candidat
+        refusé n'enregistre jamais de métadonnées et n'écrase pas le fichier
+        du catalogue. Le reste de la bascule se fait hors du verrou (`_after_swap`).
+        """
+        self.current = bundle
+        if self.api is not None:
+            self.api.catalog = bundle.recommender.catalog
+        self._write_active(bundle)
+
+    def _after_swap(self):
+        """Suite d'une bascule, hors de `_lock` : un retour arrière n'attend pas ce travail
+
+        Le catalogue est complété des livres mis en cache depuis sa
+        construction (ou depuis la mise à l'écart d'une version reprise),
+        l'historique du modèle devient l'historique courant, puis les abonnés
+        sont prévenus. Appliqué à la version courante : après deux bascules
+        rapprochées, seule la dernière est traitée.
+        """
+        with self._notify_lock:
+            bundle = self.current
+            if bundle is self._notified:
+                return
+            self._notified = bundle
+            catalog = bundle.recommender.catalog
+            if self.api is not None and catalog is not None:
+                self.api.fill_catalog(catalog)
+            try:
+                activate_user_history(bundle.recommender.user_history)
+            except OSError as e:
+                logger.warning(f"Activation de l'historique impossible: {e}")
+            for callback in self._listeners:
+                callback(bundle)
+
+    def _reject(self, path: str, version: Optional[str], reason: str) -> bool:
+        metrics.inc('model_rejections_total')
+        logger.error(f"❌ Modèle refusé ({path}, version {version}): {reason}")
+        return False
+
+    # Validation
+
+    def _validate_shapes(self, model_loader) -> Optional[str]:
+        """Cohérence des mappings et de la taille de sortie du modèle ; message d'erreur ou None"""
+        num_items = len(model_loader.isbn_mapping)
+        if len(model_loader.isbn_array) != num_items:
+            return f"isbn_array ({len(model_loader.isbn_array)}) incohérent avec isbn_mapping ({num_items})"
+        values = np.sort(model_loader.isbn_mapping.values())
+        if not np.array_equal(values, np.arange(num_items)):
+            return "index de isbn_mapping non contigus"
+        try:
+            output = model_loader.predict(np.zeros((1, num_items), dtype=np.float32))
+        except Exception as e:
+            return f"passe du modèle impossible ({e})"
+        if output.shape != (1, num_items):
+            return f"sortie du modèle {output.shape}, attendu (1, {num_items})"
+        return None
+
+    def _smoke_score(self, recommender, sample_size: int = 8, k: int = 10) -> Optional[str]:
+        """Recommandations de contrôle sur quelques utilisateurs ; message d'erreur ou None"""
+        user_ids, _ = recommender.model_loader.user_mapping.search(limit=sample_size)
+        user_indices = [recommender.model_loader.user_mapping[u] for u in user_ids]
+        scores = recommender._score_batch(user_indices)
+        if not np.all(np.isfinite(scores)):
+            return "scores non finis"
+        if np.ptp(scores) == 0:
+            return "scores constants"
+        ranked = recommender.recommend_batch(user_ids, k, exclude_rated=False)
+        if any(len(ranked[u]) < min(k, len(recommender.model_loader.isbn_mapping)) for u in user_ids):
+            return "classement incomplet"
+        return None
+
+    # Modèle actif (partagé entre processus)
+
+    def _write_active(self, bundle: ServingBundle):
+        if not self.active_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.active_file)), exist_ok=True)
+            tmp_path = f"{self.active_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'path': bundle.path, 'version': bundle.version, 'at': time.time()}, f)
+            os.replace(tmp_path, self.active_file)
+        except OSError as e:
+            logger.warning(f"Écriture du modèle actif impossible: {e}")
+
+    def _follow_active(self) -> bool:
+        """Bascule vers la version notée dans `active_file` si un autre processus l'a changée"""
+        if not self.active_file:
+            return False
+        try:
+            with open(self.active_file) as f:
+                active = json.load(f)
+        except (OSError, ValueError):
+            return False
+        version = active.get('version')
+        if not version or version == self.current.version:
+            return False
+
+        with self._lock:
+            bundle = next((bundle for bundle in self._previous if bundle.version == version), None)
+            if bundle is not None:
+                # Retour arrière décidé ailleurs : même bascule qu'en local
+                self._rejected.add(self.current.version)
+                self._previous.remove(bundle)
+                self._activate(bundle)
+        if bundle is not None:
+            self._after_swap()
+            logger.info(f"Modèle actif changé par un autre processus : {version}")
+            return True
+        if version in self._rejected:
+            return False
+        path = active.get('path')
+        if path and os.path.exists(path):
+            self._seen[os.path.abspath(path)] = self._signature(path)
+            return self.load(path)
+        return False
+
+
+def build_registry(start: bool = True) -> Optional[ModelRegistry]:
+    """Composants initiaux enveloppés dans un registre surveillant `Config.MODEL_DIR`"""
+    components = build_components()
+    if components is None:
+        return None
+    model_loader, api, recommender = components
+    registry = ModelRegistry(
+        api,
+        ServingBundle(model_loader, recommender, model_loader.model_path),
+        Config.MODEL_DIR,
+        active_file=Config.MODEL_ACTIVE_FILE,
+        interval=Config.MODEL_WATCH_INTERVAL,
+        settle=Config.MODEL_SETTLE_SECONDS,
+        keep=Config.MODEL_KEEP_VERSIONS
+    )
+    if start:
+        registry.start()
+    return registry
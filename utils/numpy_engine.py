@@ -0,0 +1,146 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from utils.artifact import LAYERS
+
+PRECISIONS = ('float32', 'float16', 'int8')
+
+
+class QuantizedLinear:
+    """Couche Linear en NumPy, poids en float32, float16 ou int8 (échelle par ligne)
+
+    En précision réduite, les poids sont déquantifiés par blocs au moment du
+    calcul : la mémoire résidente reste celle des poids compressés.
+    """
+
+    BLOCK = 4096
+
+    def __init__(self, weight: np.ndarray, bias: np.ndarray, precision: str = 'float32'):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Précision inconnue: {precision} (attendu: {', '.join(PRECISIONS)})")
+        self.precision = precision
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.scale = None
+
+        if precision == 'float32':
+            # Conserve les vues mmap float32 telles quelles (aucune copie)
+            self.weight = weight if weight.dtype == np.float32 else weight.astype(np.float32)
+        elif precision == 'float16':
+            self.weight = weight.astype(np.float16)
+        else:
+            max_abs = np.abs(weight).max(axis=1)
+            self.scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            self.weight = np.round(weight / self.scale[:, None]).astype(np.int8)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.weight.shape
+
+    @property
+    def nbytes(self) -> int:
+        scale_bytes = 0 if self.scale is None else self.scale.nbytes
+        return self.weight.nbytes + self.bias.nbytes + scale_bytes
+
+    def dequantize(self, rows: slice = slice(None), cols: slice = slice(None)) -> np.ndarray:
+        """Bloc de poids en float32"""
+        block = self.weight[rows, cols].astype(np.float32)
+        if self.scale is not None:
+            block *= self.scale[rows, None]
+        return block
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        if self.precision == 'float32':
+            return x @ self.weight.T + self.bias
+
+        out_dim, in_dim = self.weight.shape
+        if out_dim >= in_dim:
+            # Grande dimension de sortie (décodeur) : blocs de lignes
+            out = np.empty((x.shape[0], out_dim), dtype=np.float32)
+            for start in range(0, out_dim, self.BLOCK):
+                rows = slice(start, start + self.BLOCK)
+                out[:, rows] = x @ self.dequantize(rows=rows).T
+        else:
+            # Grande dimension d'entrée (encodeur) : accumulation par blocs de colonnes
+            out = np.zeros((x.shape[0], out_dim), dtype=np.float32)
+            for start in range(0, in_dim, self.BLOCK):
+                cols = slice(start, start + self.BLOCK)
+                out += x[:, cols] @ self.dequantize(cols=cols).T
+        out += self.bias
+        return out
+
+
+class NumpyDAE:
+    """Inférence du DenoisingAutoEncoder en NumPy pur (mode évaluation, sans dropout)
+
+    Équivalent à `DenoisingAutoEncoder.forward` : Linear-ReLU-Linear-ReLU
+    pour l'encodeur, Linear-ReLU-Linear-Sigmoid pour le décodeur. La
+    précision réduite s'applique aux deux grandes couches (entrée de
+    l'encodeur et sortie du décodeur).
+    """
+
+    def __init__(self, layers: dict, precision: str = 'float32'):
+        self.precision = precision
+        self.enc1 = QuantizedLinear(*layers['enc1'], precision=precision)
+        self.enc2 = QuantizedLinear(*layers['enc2'])
+        self.dec1 = QuantizedLinear(*layers['dec1'])
+        self.dec2 = QuantizedLinear(*layers['dec2'], precision=precision)
+
+    @classmethod
+    def from_artifact(cls, artifact, precision: str = 'float32') -> 'NumpyDAE':
+        return cls({name: artifact.layer(name) for name in LAYERS.values()}, precision)
+
+    @classmethod
+    def from_torch(cls, model, precision: str = 'float32') -> 'NumpyDAE':
+        state = {k: v.detach().cpu().numpy() for k, v in model.state_dict().items()}
+        layers = {
+            flat_name: (state[f'{torch_name}.weight'], state[f'{torch_name}.bias'])
+            for torch_name, flat_name in LAYERS.items()
+        }
+        return cls(layers, precision)
+
+    @property
+    def num_items(self) -> int:
+        return self.dec2.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(layer.nbytes for layer in (self.enc1, self.enc2, self.dec1, self.dec2))
+
+    def hidden(self, x: np.ndarray) -> np.ndarray:
+        """Activation de dimension 256 en entrée de la dernière couche du décodeur"""
+        x = np.asarray(x, dtype=np.float32)
+        h = np.maximum(self.enc1(x), 0)
+        h = np.maximum(self.enc2(h), 0)
+        return np.maximum(self.dec1(h), 0)
+
+    def forward(self, x: np.ndarray, hidden: Optional[np.ndarray] = None) -> np.ndarray:
+        if hidden is None:
+            hidden = self.hidden(x)
+        return sigmoid(self.dec2(hidden))
+
+    __call__ = forward
+
+
+def sigmoid(z: np.ndarray) -> np.ndarray:
+    with np.errstate(over='ignore'):
+        return 1.0 / (1.0 + np.exp(-z))
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices et scores des k meilleurs éléments par ligne, triés par score décroissant"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(scores.dtype)
+
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), (scores.shape[0], k))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return (
+        np.take_along_axis(candidates, order, axis=1),
+        np.take_along_axis(candidate_scores, order, axis=1)
+    )
@@ -0,0 +1,109 @@
+"""Service multi-processus en pré-fork
+
+Le processus parent charge les composants une seule fois puis crée N
+workers par fork. Les poids (artefact .dae), l'historique CSR et les tables
+top-N / voisins sont des fichiers mappés en mémoire : leurs pages sont
+partagées par le cache du noyau. `gc.freeze()` avant le fork évite que le
+ramasse-miettes ne recopie les objets Python hérités du parent.
+"""
+import gc
+import os
+import signal
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from utils.metrics import logger
+
+
+def limit_threads(num_threads: int):
+    """Fixe le nombre de threads de calcul (BLAS, OpenMP, PyTorch) du processus courant"""
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(num_threads)
+
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(num_threads)
+    except ImportError:
+        # Sans threadpoolctl, seules les bibliothèques chargées après ce point respectent la limite
+        pass
+
+    if 'torch' in sys.modules:
+        import torch
+        torch.set_num_threads(num_threads)
+
+
+def memory_usage(pid: Optional[int] = None) -> Dict[str, int]:
+    """RSS et PSS (pages partagées réparties entre processus) en octets, via /proc (Linux)"""
+    path = f"/proc/{pid or os.getpid()}/smaps_rollup"
+    usage = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] in ('Rss:', 'Pss:', 'Shared_Clean:', 'Private_Dirty:'):
+                    usage[parts[0][:-1].lower()] = int(parts[1]) * 1024
+    except OSError:
+        pass
+    return usage
+
+
+def serve_prefork(server, workers: int, setup_worker: Callable[[int], None]) -> List[int]:
+    """Lance `workers` processus qui partagent la socket d'écoute de `server`
+
+    `setup_worker(index)` est appelé dans chaque worker juste après le fork
+    (threads, connexions, etc.). Le parent supervise les workers et les
+    relance s'ils s'arrêtent ; SIGINT/SIGTERM arrête l'ensemble.
+    """
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, int] = {}
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                setup_worker(index)
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children[pid] = index
+
+    for index in range(workers):
+        spawn(index)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        while not stopping:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid and pid in children and not stopping:
+                index = children.pop(pid)
+                logger.warning(f"Worker {index} (pid {pid}) arrêté, relance")
+                spawn(index)
+            time.sleep(0.2)
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+    return list(children)
@@ -0,0 +1,65 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Limiteur de débit à seau de jetons, partagé entre threads
+
+    `rate` jetons sont ajoutés par seconde, jusqu'à `capacity` jetons
+    (taille maximale d'une rafale).
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate doit être strictement positif")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_delay(cls, delay: float, capacity: float = 1.0) -> 'TokenBucket':
+        """Construit un limiteur équivalent à un délai fixe entre deux appels"""
+        return cls(1.0 / delay if delay > 0 else float('inf'), capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Prend des jetons sans attendre ; False si le seau est vide"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Attend que des jetons soient disponibles ; False si `timeout` expire"""
+        return self._wait(tokens, timeout, take=True)
+
+    def wait(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Attend que des jetons soient disponibles, sans les prendre ; False si `timeout` expire"""
+        return self._wait(min(tokens, self.capacity), timeout, take=False)
+
+    def _wait(self, tokens: float, timeout: Optional[float], take: bool) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    if take:
+                        self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
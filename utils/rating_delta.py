@@ -0,0 +1,270 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import logger
+from utils.user_history import UserHistoryStore
+
+try:
+    import fcntl
+except ImportError:  # Windows : un seul processus écrit le journal
+    fcntl = None
+
+
+class IncrementalUserHistory:
+    """Historique de base (CSR en mmap) + notes ajoutées depuis sa construction
+
+    Expose la même interface de lecture que UserHistoryStore. Les lignes des
+    utilisateurs modifiés sont recalculées à l'ingestion (centrage sur la
+    nouvelle moyenne, mise à l'échelle avec le scaler de la base) et servies
+    depuis la mémoire ; les autres lignes restent lues dans la base.
+
+    Les nouveaux utilisateurs sont ajoutés à `user_mapping` à la suite des
+    index existants. Les notes sont journalisées (JSON lines) dans
+    `delta_dir`, rejouées au démarrage puis suivies (`sync`) : les notes
+    reçues par un autre worker sont appliquées dans l'ordre du journal, donc
+    avec les mêmes index utilisateurs dans tous les processus.
+    """
+
+    LOG_FILE = 'ratings.jsonl'
+
+    def __init__(
+        self,
+        base: UserHistoryStore,
+        user_mapping: Dict,
+        isbn_mapping: Dict,
+        delta_dir: Optional[str] = None
+    ):
+        self.base = base
+        self.user_mapping = user_mapping
+        self.isbn_mapping = isbn_mapping
+        self.delta_dir = delta_dir
+        self._raw: Dict[int, Dict[int, float]] = {}
+        self._rows: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        # Livres notés à la nouvelle moyenne (valeur 0, absents de `_rows`)
+        self._mean_rated: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+        # Position lue dans le journal et utilisateurs modifiés depuis le dernier `sync`
+        self._log_lock = threading.Lock()
+        self._offset = 0
+        self._synced: List[int] = []
+
+        meta = base.meta
+        self._scaler_min = meta.get('scaler_min', 0.0)
+        scaler_max = meta.get('scaler_max', 1.0)
+        self._scaler_range = scaler_max - self._scaler_min if scaler_max > self._scaler_min else 1.0
+
+        if delta_dir:
+            self._replay()
+
+    # Interface de lecture (identique à UserHistoryStore)
+
+    @property
+    def meta(self) -> Dict:
+        return self.base.meta
+
+    @property
+    def version(self) -> Optional[str]:
+        # Version de la base : les tables pré-calculées restent valides,
+        # seules les lignes des utilisateurs modifiés sont invalidées
+        return self.base.version
+
+    def is_loaded(self) -> bool:
+        return self.base.is_loaded()
+
+    def matches(self, user_mapping: Dict, isbn_mapping: Dict) -> bool:
+        return self.base.matches(user_mapping, isbn_mapping)
+
+    def get_user_row(self, user_idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        row = self._rows.get(user_idx)
+        if row is not None:
+            return row
+        if user_idx >= self.base.meta['num_users']:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        return self.base.get_user_row(user_idx)
+
+    def get_mean_rated(self, user_idx: int) -> np.ndarray:
+        mean_rated = self._mean_rated.get(user_idx)
+        if mean_rated is not None:
+            return mean_rated
+        if user_idx >= self.base.meta['num_users']:
+            return np.empty(0, dtype=np.int32)
+        return self.base.get_mean_rated(user_idx)
+
+    def get_rated_items(self, user_idx: int) -> np.ndarray:
+        indices, _ = self.get_user_row(user_idx)
+        mean_rated = self.get_mean_rated(user_idx)
+        return np.concatenate([indices, mean_rated]) if len(mean_rated) else indices
+
+    def get_dense_vector(self, user_idx: int) -> np.ndarray:
+        return self.get_dense_batch([user_idx])[0]
+
+    def get_dense_batch(self, user_indices: Iterable[int]) -> np.ndarray:
+        user_indices = list(user_indices)
+        batch = np.zeros((len(user_indices), self.meta['num_items']), dtype=np.float32)
+        for row, user_idx in enumerate(user_indices):
+            indices, values = self.get_user_row(user_idx)
+            batch[row, indices] = values
+        return batch
+
+    # Ingestion
+
+    def updated_users(self) -> List[int]:
+        """Index des utilisateurs dont la ligne diffère de la base"""
+        return list(self._rows)
+
+    def add_ratings(self, user_id: int, ratings: Dict[str, float], log: bool = True) -> Dict:
+        """Ajoute ou remplace des notes (ISBN -> note 1-10) pour un utilisateur
+
+        Les notes 0 (implicites) et les ISBN hors catalogue du modèle sont
+        ignorés. Retourne l'index utilisateur et le détail de l'ingestion.
+        """
+        if not (log and self.delta_dir):
+            return self._apply(user_id, ratings)[0]
+
+        os.makedirs(self.delta_dir, exist_ok=True)
+        with self._log_lock, open(self._log_path(), 'ab') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Entrées des autres processus d'abord : même ordre d'application partout
+                self._read_log()
+                result, kept = self._apply(user_id, ratings)
+                if result['accepted']:
+                    line = json.dumps({'user_id': user_id, 'ratings': kept, 'at': time.time()}) + '\n'
+                    if os.fstat(f.fileno()).st_size > self._offset:
+                        # Dernière ligne incomplète (écriture interrompue) : isolée
+                        line = '\n' + line
+                    f.write(line.encode('utf-8'))
+                    f.flush()
+                    self._offset = os.fstat(f.fileno()).st_size
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return result
+
+    def sync(self) -> List[int]:
+        """Applique les notes journalisées par d'autres processus ; index des utilisateurs modifiés"""
+        if self.delta_dir:
+            try:
+                size = os.path.getsize(self._log_path())
+            except OSError:
+                size = 0
+            if size > self._offset:
+                with self._log_lock:
+                    self._read_log()
+        if not self._synced:
+            return []
+        with self._log_lock:
+            changed, self._synced = self._synced, []
+        return changed
+
+    def _apply(self, user_id: int, ratings: Dict[str, float]) -> Tuple[Dict, Dict[str, float]]:
+        kept = {}
+        ignored = []
+        for isbn, rating in ratings.items():
+            if isbn not in self.isbn_mapping or not rating or rating <= 0:
+                ignored.append(isbn)
+            else:
+                kept[isbn] = float(rating)
+        accepted = {self.isbn_mapping[isbn]: rating for isbn, rating in kept.items()}
+
+        with self._lock:
+            new_user = user_id not in self.user_mapping
+            if new_user and not accepted:
+                return {'user_index': None, 'new_user': True, 'accepted': 0, 'ignored': ignored}, kept
+            if new_user:
+                self.user_mapping[user_id] = len(self.user_mapping)
+            user_idx = self.user_mapping[user_id]
+
+            if accepted:
+                raw = self._raw.get(user_idx)
+                if raw is None:
+                    raw = self._base_ratings(user_idx)
+                raw.update(accepted)
+                self._raw[user_idx] = raw
+                indices, values, mean_rated = self._scale_row(user_idx, raw)
+                self._mean_rated[user_idx] = mean_rated
+                self._rows[user_idx] = indices, values
+
+        return {'user_index': user_idx, 'new_user': new_user, 'accepted': len(accepted), 'ignored': ignored}, kept
+
+    def _base_ratings(self, user_idx: int) -> Dict[int, float]:
+        """Notes brutes d'un utilisateur reconstruites depuis la base (dé-normalisation)"""
+        if user_idx >= self.base.meta['num_users']:
+            return {}
+        indices, values = self.base.get_user_row(user_idx)
+        mean = float(self.base.user_means[user_idx])
+        raw = np.asarray(values, dtype=np.float64) * self._scaler_range + self._scaler_min + mean
+        ratings = dict.fromkeys(np.asarray(self.base.get_mean_rated(user_idx)).tolist(), mean)
+        ratings.update(zip(np.asarray(indices).tolist(), raw.tolist()))
+        return ratings
+
+    def _scale_row(self, user_idx: int, raw: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Centrage sur la nouvelle moyenne puis mise à l'échelle [0, 1] du scaler de la base
+
+        Retourne (indices, valeurs) de la ligne et les livres notés exactement
+        à la nouvelle moyenne, qui en sont exclus comme dans la base.
+        """
+        indices = np.fromiter(raw.keys(), dtype=np.int32, count=len(raw))
+        ratings = np.fromiter(raw.values(), dtype=np.float64, count=len(raw))
+
+        # Notes égales à l'ancienne moyenne, absentes du CSR : reprises depuis `get_mean_rated`
+        # (store récent) ou seulement comptées dans la moyenne (store sans ces tableaux)
+        hidden, old_mean = 0, 0.0
+        if user_idx < self.base.meta['num_users'] and self.base.user_counts is not None:
+            start, end = self.base.indptr[user_idx], self.base.indptr[user_idx + 1]
+            known = int(end - start) + len(self.base.get_mean_rated(user_idx))
+            hidden = max(0, int(self.base.user_counts[user_idx]) - known)
+            old_mean = float(self.base.user_means[user_idx])
+
+        mean = (ratings.sum() + hidden * old_mean) / (len(ratings) + hidden)
+        centered = ratings - mean
+        keep = centered != 0
+        order = np.argsort(indices[keep])
+        scaled = np.clip((centered[keep] - self._scaler_min) / self._scaler_range, 0.0, 1.0)
+        return indices[keep][order], scaled[order].astype(np.float32), np.sort(indices[~keep])
+
+    # Journal
+
+    def _log_path(self) -> str:
+        return os.path.join(self.delta_dir, self.LOG_FILE)
+
+    def _replay(self):
+        if not os.path.exists(self._log_path()):
+            return
+        with self._log_lock:
+            count = self._read_log()
+            self._synced = []
+        logger.info(f"{count} ajouts de notes rejoués ({len(self._rows)} utilisateurs modifiés)")
+
+    def _read_log(self) -> int:
+        """Applique les entrées complètes écrites après `_offset` (verrou `_log_lock` tenu)"""
+        count = 0
+        try:
+            f = open(self._log_path(), 'rb')
+        except OSError:
+            return 0
+        with f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Entrée en cours d'écriture par un autre processus : relue plus tard
+                    break
+                self._offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Entrée illisible ignorée dans {self._log_path()}")
+                    continue
+                result, _ = self._apply(entry['user_id'], entry['ratings'])
+                if result['accepted']:
+                    self._synced.append(result['user_index'])
+                count += 1
+        return count
@@ -1,67 +1,415 @@
 import numpy as np
-import pandas as pd
-import torch
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, Iterable, Iterator, List, Dict, Tuple, Optional
+
+from utils.book_catalog import BookCatalog
+from utils.item_neighbors import item_embeddings
+from utils.metrics import logger, metrics
+from utils.numpy_engine import top_k
 
 class BookRecommender:
     """Génère des recommandations de livres"""
     
-    def __init__(self, model_loader, google_books_api):
+    def __init__(
+        self,
+        model_loader,
+        google_books_api,
+        user_history=None,
+        topn_table=None,
+        item_index=None,
+        item_neighbors=None,
+        catalog=None
+    ):
         self.model_loader = model_loader
         self.api = google_books_api
+        self.user_history = user_history
+        self.catalog = catalog
+        self.item_index = item_index
+        self.item_neighbors = None
+        self._item_embeddings = None
+        if item_neighbors is not None:
+            self.set_item_neighbors(item_neighbors)
+        self.topn_table = None
+        if topn_table is not None:
+            self.set_topn_table(topn_table)
+    
+    def set_topn_table(self, topn_table) -> bool:
+        """Active la table top-N si elle correspond au modèle et à l'historique"""
+        if topn_table.is_fresh(self.model_loader.model_version, self.get_history_version()):
+            # Utilisateurs dont l'historique a changé depuis la base : lignes obsolètes
+            if hasattr(self.user_history, 'updated_users'):
+                for user_idx in self.user_history.updated_users():
+                    topn_table.invalidate(user_idx)
+            if not topn_table.exclude_rated:
+                logger.warning("Table top-N construite sans exclusion des livres notés : à reconstruire")
+            self.topn_table = topn_table
+            return True
+        logger.warning("Table top-N obsolète : inférence à la volée")
+        self.topn_table = None
+        return False
+    
+    def set_item_neighbors(self, item_neighbors) -> bool:
+        """Active la table de voisins si elle correspond au modèle courant"""
+        if item_neighbors.is_fresh(self.model_loader.model_version):
+            self.item_neighbors = item_neighbors
+            return True
+        logger.warning("Table de voisins obsolète : calcul à la volée")
+        self.item_neighbors = None
+        return False
+    
+    def get_history_version(self) -> Optional[str]:
+        if self.user_history is not None and self.user_history.is_loaded():
+            return self.user_history.version
+        return None
+    
+    def ingest_ratings(self, user_id: int, ratings: Dict[str, float], refresh: bool = True) -> Dict:
+        """Ajoute des notes (ISBN -> note) à l'historique d'un utilisateur, sans réentraînement
+
+        Seule la ligne top-N de cet utilisateur est recalculée (ou invalidée si
+        `refresh` est faux) ; les nouveaux utilisateurs sont créés à la volée.
+        """
+        if not hasattr(self.user_history, 'add_ratings'):
+            raise ValueError("Historique incrémental indisponible")
+
+        with metrics.span('ingest_ratings'):
+            self.sync_history()
+            result = self.user_history.add_ratings(user_id, ratings)
+            user_idx = result['user_index']
+            if user_idx is not None and result['accepted'] and self.topn_table is not None:
+                if refresh:
+                    indices, scores = self._rank([user_idx], self.topn_table.size, self.topn_table.exclude_rated)
+                    self.topn_table.refresh(user_idx, indices[0], scores[0])
+                else:
+                    self.topn_table.invalidate(user_idx)
+        metrics.inc('ratings_ingested_total', result['accepted'])
+        return result
+    
+    def sync_history(self):
+        """Applique les notes reçues par les autres workers (journal partagé) et invalide leurs lignes top-N"""
+        sync = getattr(self.user_history, 'sync', None)
+        if sync is None:
+            return
+        for user_idx in sync():
+            if self.topn_table is not None:
+                self.topn_table.invalidate(user_idx)
     
     def get_recommendations(
         self,
         user_id: int,
         n_recommendations: int = 10,
-        exclude_rated: bool = True
+        exclude_rated: bool = True,
+        filters: Optional[Dict] = None
     ) -> List[Tuple[str, float, Dict]]:
         """Génère des recommandations pour un utilisateur"""
         try:
-            if not self.model_loader.is_loaded():
-                print("Modèle non chargé")
-                return []
+            return list(self.iter_recommendations(user_id, n_recommendations, exclude_rated, filters))
             
-            if user_id not in self.model_loader.user_mapping:
-                print(f"Utilisateur {user_id} non trouvé")
-                return []
-            
-            user_idx = self.model_loader.user_mapping[user_id]
-            num_books = len(self.model_loader.isbn_mapping)
-            user_vector = np.zeros(num_books)
-            
-            with torch.no_grad():
-                user_tensor = torch.FloatTensor(user_vector).unsqueeze(0)
-                predictions = self.model_loader.model(user_tensor).squeeze(0).numpy()
-            
-            recommendations_df = pd.DataFrame({
-                'isbn': list(self.model_loader.isbn_mapping.keys()),
-                'score': predictions
-            })
-            
-            recommendations_df = recommendations_df.sort_values('score', ascending=False)
-            buffer = min(n_recommendations * 2, len(recommendations_df))
-            top_recommendations = recommendations_df.head(buffer)
-            
-            results = []
-            for _, row in top_recommendations.iterrows():
-                if len(results) >= n_recommendations:
+        except Exception as e:
+            metrics.inc('recommendation_errors_total')
+            logger.exception(f"Erreur lors de la génération des recommandations: {e}")
+            return []
+    
+    def iter_recommendations(
+        self,
+        user_id: int,
+        n_recommendations: int = 10,
+        exclude_rated: bool = True,
+        filters: Optional[Dict] = None
+    ) -> Iterator[Tuple[str, float, Dict]]:
+        """Produit les recommandations une à une, dès que les métadonnées de chaque livre arrivent
+
+        `filters` (langue, catégories, années, cf. `BookCatalog.mask`) et
+        l'exclusion des livres déjà notés sont appliqués aux scores avant le
+        top-k. Les candidats sont tirés du classement au fur et à mesure,
+        jusqu'à obtenir exactement `n_recommendations` livres avec métadonnées
+        (ou épuisement du catalogue).
+        """
+        if not self.model_loader.is_loaded():
+            logger.error("Modèle non chargé")
+            return
+        
+        self.sync_history()
+        if user_id not in self.model_loader.user_mapping:
+            logger.info(f"Utilisateur {user_id} non trouvé")
+            return
+        
+        candidates = self._iter_ranked(
+            lambda k: self.recommend_batch([user_id], k, exclude_rated, filters)[user_id],
+            n_recommendations * 2
+        )
+        # Temps de classement et de récupération des métadonnées uniquement (pas l'affichage de l'appelant)
+        yield from metrics.span_iter(
+            'recommend', self._iter_with_metadata(candidates, n_recommendations, filters), profile=True
+        )
+    
+    def _iter_ranked(
+        self,
+        fetch: Callable[[int], List[Tuple[str, float]]],
+        k: int
+    ) -> Iterator[Tuple[str, float]]:
+        """Parcourt un classement top-k en agrandissant k tant que les candidats sont consommés"""
+        limit = len(self.model_loader.isbn_mapping)
+        k = min(k, limit)
+        seen = set()
+        while True:
+            ranked = fetch(k)
+            for isbn, score in ranked:
+                if isbn not in seen:
+                    seen.add(isbn)
+                    yield isbn, score
+            if k >= limit or len(ranked) < k:
+                return
+            metrics.inc('candidate_expansions_total')
+            k = min(k * 4, limit)
+    
+    def _iter_with_metadata(
+        self,
+        candidates: Iterable[Tuple[str, float]],
+        n: int,
+        filters: Optional[Dict] = None
+    ) -> Iterator[Tuple[str, float, Dict]]:
+        """Associe les métadonnées aux candidats, par vagues parallèles dans l'ordre du classement
+
+        Les livres connus comme introuvables au catalogue ne sont pas demandés
+        à l'API ; les métadonnées reçues sont vérifiées contre `filters` pour
+        les livres dont les attributs n'étaient pas encore connus.
+        """
+        candidates = iter(candidates)
+        produced = 0
+        while produced < n:
+            wave = []
+            for isbn, score in candidates:
+                if self.catalog is not None and self.catalog.is_missing(isbn):
+                    continue
+                wave.append((isbn, score))
+                if len(wave) >= n - produced:
                     break
-                
-                isbn = row['isbn']
-                score = float(row['score'])
-                book_info = self.api.search_by_isbn(isbn)
-                
-                if book_info:
-                    results.append((isbn, score, book_info))
-            
+            if not wave:
+                return
+            scores = dict(wave)
+            for isbn, book_info in self.api.iter_search([isbn for isbn, _ in wave]):
+                if book_info and (not filters or BookCatalog.matches(book_info, **filters)):
+                    yield isbn, scores[isbn], book_info
+                    produced += 1
+                else:
+                    metrics.inc('candidates_rejected_total')
+    
+    def recommend_batch(
+        self,
+        user_ids: List[int],
+        k: int = 10,
+        exclude_rated: bool = True,
+        filters: Optional[Dict] = None
+    ) -> Dict[int, List[Tuple[str, float]]]:
+        """Top-k (ISBN, score) pour plusieurs utilisateurs en une seule passe du modèle"""
+        with metrics.span('recommend_batch'):
+            return self._recommend_batch(user_ids, k, exclude_rated, filters)
+    
+    def _recommend_batch(
+        self,
+        user_ids: List[int],
+        k: int,
+        exclude_rated: bool = True,
+        filters: Optional[Dict] = None
+    ) -> Dict[int, List[Tuple[str, float]]]:
+        results = {user_id: [] for user_id in user_ids}
+        if not self.model_loader.is_loaded():
+            logger.error("Modèle non chargé")
             return results
-            
-        except Exception as e:
-            print(f"Erreur lors de la génération des recommandations: {e}")
-            import traceback
-            traceback.print_exc()
+        
+        self.sync_history()
+        known_ids = [u for u in results if u in self.model_loader.user_mapping]
+        for user_id in results:
+            if user_id not in self.model_loader.user_mapping:
+                logger.info(f"Utilisateur {user_id} non trouvé")
+        if not known_ids:
+            return results
+        
+        allowed = self._allowed_mask(filters)
+        isbn_array = self.model_loader.isbn_array
+        live_ids = []
+        for user_id in known_ids:
+            cached = self._lookup_topn(self.model_loader.user_mapping[user_id], k, exclude_rated, allowed)
+            if cached is None:
+                live_ids.append(user_id)
+            else:
+                metrics.inc('topn_table_hits_total')
+                indices, scores = cached
+                results[user_id] = list(zip(isbn_array[indices].tolist(), scores.tolist()))
+        if not live_ids:
+            return results
+        
+        user_indices = [self.model_loader.user_mapping[u] for u in live_ids]
+        if self.item_index is not None:
+            top_indices, top_scores = self._search_item_index(user_indices, k, exclude_rated, allowed)
+        else:
+            top_indices, top_scores = self._rank(user_indices, k, exclude_rated, allowed)
+        
+        for row, user_id in enumerate(live_ids):
+            valid = top_indices[row] >= 0
+            results[user_id] = list(zip(
+                isbn_array[top_indices[row][valid]].tolist(),
+                top_scores[row][valid].tolist()
+            ))
+        return results
+    
+    def _allowed_mask(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """Masque des livres recommandables (catalogue + filtres métier), None si aucun"""
+        if self.catalog is None:
+            if filters:
+                logger.warning("Catalogue indisponible : filtres appliqués après récupération des métadonnées")
+            return None
+        return self.catalog.mask(**(filters or {}))
+    
+    def _rank(
+        self,
+        user_indices: List[int],
+        k: int,
+        exclude_rated: bool = False,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k après masquage des scores ; indice -1 quand moins de k livres sont admissibles"""
+        scores = self._score_batch(user_indices)
+        self._mask_scores(scores, user_indices, exclude_rated, allowed)
+        with metrics.span('top_k'):
+            top_indices, top_scores = self._top_k(scores, k)
+        top_indices = np.where(np.isfinite(top_scores), top_indices, -1)
+        return top_indices, top_scores
+    
+    def _mask_scores(
+        self,
+        scores: np.ndarray,
+        user_indices: List[int],
+        exclude_rated: bool,
+        allowed: Optional[np.ndarray]
+    ):
+        """Met à -inf (en place) les livres déjà notés et ceux exclus par le masque"""
+        if allowed is not None:
+            blocked = np.flatnonzero(~allowed)
+            if len(blocked):
+                scores[:, blocked] = -np.inf
+        if exclude_rated and self.user_history is not None and self.user_history.is_loaded():
+            for row, user_idx in enumerate(user_indices):
+                scores[row, self.user_history.get_rated_items(user_idx)] = -np.inf
+    
+    def _search_item_index(
+        self,
+        user_indices: List[int],
+        k: int,
+        exclude_rated: bool,
+        allowed: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Recherche MIPS sur l'activation cachée : pas de score pour tout le catalogue
+
+        L'index ne connaît pas les masques : on demande plus de candidats puis
+        on filtre ; les lignes restées incomplètes sont recalculées exactement.
+        """
+        num_items = len(self.model_loader.isbn_mapping)
+        rated = [
+            self.user_history.get_rated_items(u)
+            if exclude_rated and self.user_history is not None and self.user_history.is_loaded()
+            else np.empty(0, dtype=np.int32)
+            for u in user_indices
+        ]
+        fetch = k if allowed is None and not exclude_rated else min(num_items, k * 4 + max(len(r) for r in rated))
+        
+        hidden = self.model_loader.hidden(self._get_user_matrix(user_indices))
+        with metrics.span('item_index_search'):
+            found_indices, found_scores = self.item_index.search(hidden, fetch)
+        
+        top_indices = np.full((len(user_indices), k), -1, dtype=np.int64)
+        top_scores = np.full((len(user_indices), k), -np.inf, dtype=np.float32)
+        incomplete = []
+        for row in range(len(user_indices)):
+            keep = found_indices[row] >= 0
+            if allowed is not None:
+                keep &= allowed[np.maximum(found_indices[row], 0)]
+            if len(rated[row]):
+                keep &= ~np.isin(found_indices[row], rated[row])
+            indices, scores = found_indices[row][keep][:k], found_scores[row][keep][:k]
+            top_indices[row, :len(indices)] = indices
+            top_scores[row, :len(scores)] = scores
+            if len(indices) < k and fetch < num_items:
+                incomplete.append(row)
+        
+        if incomplete:
+            metrics.inc('item_index_fallbacks_total', len(incomplete))
+            exact_indices, exact_scores = self._rank(
+                [user_indices[row] for row in incomplete], k, exclude_rated, allowed
+            )
+            top_indices[incomplete] = exact_indices
+            top_scores[incomplete] = exact_scores
+        return top_indices, top_scores
+    
+    def _lookup_topn(
+        self,
+        user_idx: int,
+        k: int,
+        exclude_rated: bool = True,
+        allowed: Optional[np.ndarray] = None
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Lecture O(1) dans la table top-N matérialisée, si elle couvre la demande
+
+        La table n'est utilisable que si elle a été construite avec la même
+        exclusion des livres notés ; le masque est appliqué à sa ligne, et
+        s'il reste moins de k livres la demande est calculée à la volée.
+        """
+        if self.topn_table is None or self.topn_table.exclude_rated != exclude_rated:
+            return None
+        row = self.topn_table.lookup(user_idx, self.topn_table.size if allowed is not None else k)
+        if row is None:
+            return None
+        indices, scores = row
+        keep = indices >= 0
+        if allowed is not None:
+            keep &= allowed[np.maximum(indices, 0)]
+        if keep.sum() < k:
+            return None
+        return indices[keep][:k], scores[keep][:k]
+    
+    def _score_batch(self, user_indices: List[int]) -> np.ndarray:
+        """Scores du modèle (n_users x n_books) pour un lot d'utilisateurs"""
+        return self.model_loader.predict(self._get_user_matrix(user_indices))
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices et scores des k meilleurs livres par ligne, triés par score décroissant"""
+        return top_k(scores, k)
+    
+    def _get_user_matrix(self, user_indices: List[int]) -> np.ndarray:
+        """Matrice d'entrée du modèle construite depuis l'historique des utilisateurs"""
+        if self.user_history is not None and self.user_history.is_loaded():
+            with metrics.span('user_matrix'):
+                return self.user_history.get_dense_batch(user_indices)
+        num_books = len(self.model_loader.isbn_mapping)
+        return np.zeros((len(user_indices), num_books), dtype=np.float32)
+    
+    def similar_items(self, isbn: str, n: int = 10) -> List[Tuple[str, float]]:
+        """Livres les plus proches d'un ISBN (similarité cosinus des embeddings du modèle)"""
+        item_idx = self.model_loader.isbn_mapping.get(isbn)
+        if item_idx is None:
+            logger.info(f"ISBN {isbn} non trouvé")
             return []
+        
+        if self.item_neighbors is not None and n <= self.item_neighbors.size:
+            indices, scores = self.item_neighbors.lookup(item_idx, n)
+        else:
+            # Repli : une seule ligne de similarités, calculée à la demande
+            if self._item_embeddings is None:
+                self._item_embeddings = item_embeddings(self.model_loader)
+            similarities = self._item_embeddings @ self._item_embeddings[item_idx]
+            similarities[item_idx] = -np.inf
+            indices, scores = top_k(similarities[None, :], n)
+            indices, scores = indices[0], scores[0]
+        
+        return list(zip(
+            self.model_loader.isbn_array[indices].tolist(),
+            np.asarray(scores).tolist()
+        ))
+    
+    def iter_similar_books(self, isbn: str, n: int = 10) -> Iterator[Tuple[str, float, Dict]]:
+        """Produit les livres similaires avec leurs métadonnées, dans l'ordre de similarité"""
+        candidates = self._iter_ranked(lambda k: self.similar_items(isbn, k), n * 2)
+        yield from self._iter_with_metadata(candidates, n)
     
     def get_user_stats(self, user_id: int) -> Optional[Dict]:
         """Récupère les statistiques d'un utilisateur"""
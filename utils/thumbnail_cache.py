@@ -0,0 +1,267 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import requests
+from PIL import Image, ImageDraw
+
+from utils.metrics import logger, metrics
+
+# Image par défaut renvoyée autrefois par `_parse_book_info` (hébergée à l'extérieur)
+LEGACY_PLACEHOLDER_URL = 'https://via.placeholder.com/128x200?text=No+Cover'
+
+
+class ThumbnailCache:
+    """Cache disque des couvertures, réduites et ré-encodées en JPEG
+
+    - chaque couverture est téléchargée une seule fois, réduite à `size` puis
+      stockée sous l'empreinte sha256 de son contenu (`ab/abcdef....jpg`) :
+      les images identiques ne sont stockées qu'une fois ;
+    - un index SQLite (mode WAL, partageable entre processus) associe les
+      URL aux empreintes et trace les accès ; la date d'accès n'est réécrite
+      que si elle date de plus de `touch_interval` secondes (pas de
+      transaction d'écriture par hit) ;
+    - au-delà de `max_bytes`, les images les moins récemment servies sont
+      supprimées ;
+    - couverture absente ou téléchargement en échec : image de remplacement
+      générée localement (les échecs sont retentés après `failure_ttl`) ;
+    - `get_async` télécharge en parallèle (`max_workers`) les couvertures
+      d'une page sur un cache froid.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int = 200 * 1024 * 1024,
+        size: Tuple[int, int] = (128, 200),
+        quality: int = 85,
+        timeout: float = 5,
+        failure_ttl: float = 3600,
+        touch_interval: float = 3600,
+        max_workers: int = 8
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = size
+        self.quality = quality
+        self.timeout = timeout
+        self.failure_ttl = failure_ttl
+        self.touch_interval = touch_interval
+        self.max_workers = max_workers
+        self._placeholder = None
+        self._writes_since_evict = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._init_io()
+
+    def _init_io(self):
+        """Connexion à l'index, session HTTP, registre des téléchargements en cours et pool"""
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(self.cache_dir, 'index.sqlite'),
+            timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS urls ('
+            ' url TEXT PRIMARY KEY,'
+            ' digest TEXT,'
+            ' retry_at REAL NOT NULL DEFAULT 0)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS blobs ('
+            ' digest TEXT PRIMARY KEY,'
+            ' size INTEGER NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_blobs_last_access ON blobs(last_access)')
+        self._approx_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+        self.session = requests.Session()
+        # Un seul téléchargement par URL, les autres appelants attendent
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='thumbnail')
+
+    def after_fork(self):
+        """Nouvelle connexion et nouvelle session dans un processus issu d'un fork"""
+        self._inherited_conn = self._conn
+        self._init_io()
+
+    # Lecture
+
+    def get(self, url: Optional[str]) -> bytes:
+        """Octets JPEG de la couverture de `url` (image de remplacement si indisponible)"""
+        if not url or url == LEGACY_PLACEHOLDER_URL:
+            return self.placeholder()
+
+        row = self._lookup(url)
+        if row is not None:
+            digest, retry_at, last_access = row
+            if digest is not None:
+                data = self._read_blob(digest, last_access)
+                if data is not None:
+                    metrics.inc('thumbnail_cache_hits_total')
+                    return data
+            elif retry_at > time.time():
+                # Échec récent : pas de nouvel essai avant `failure_ttl`
+                return self.placeholder()
+        metrics.inc('thumbnail_cache_misses_total')
+
+        with self._inflight_lock:
+            future = self._inflight.get(url)
+            owner = future is None
+            if owner:
+                future = self._inflight[url] = Future()
+        if not owner:
+            return future.result()
+
+        data = None
+        try:
+            data = self._download(url)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(url, None)
+            future.set_result(data if data is not None else self.placeholder())
+        return data if data is not None else self.placeholder()
+
+    def get_async(self, url: Optional[str]) -> Future:
+        """`get` exécuté dans le pool : les couvertures d'une page se téléchargent en parallèle"""
+        return self._executor.submit(self.get, url)
+
+    def _lookup(self, url: str) -> Optional[Tuple[Optional[str], float, Optional[float]]]:
+        """(empreinte, date de nouvel essai, dernier accès) de l'URL ; empreinte None après un échec"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT u.digest, u.retry_at, b.last_access FROM urls u'
+                ' LEFT JOIN blobs b ON b.digest = u.digest WHERE u.url = ?',
+                (url,)
+            ).fetchone()
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.jpg")
+
+    def _read_blob(self, digest: str, last_access: Optional[float]) -> Optional[bytes]:
+        try:
+            with open(self._blob_path(digest), 'rb') as f:
+                data = f.read()
+        except OSError:
+            # Image évincée par un autre processus : nouveau téléchargement
+            return None
+        now = time.time()
+        if last_access is not None and now - last_access >= self.touch_interval:
+            with self._lock:
+                self._conn.execute('UPDATE blobs SET last_access = ? WHERE digest = ?', (now, digest))
+        return data
+
+    # Téléchargement et stockage
+
+    def _download(self, url: str) -> Optional[bytes]:
+        """Télécharge, réduit et stocke une couverture ; None en cas d'échec"""
+        try:
+            with metrics.span('thumbnail_fetch'):
+                response = self.session.get(url, timeout=self.timeout)
+                response.raise_for_status()
+                data = self._downscale(response.content)
+        except Exception as e:
+            metrics.inc('thumbnail_errors_total')
+            logger.warning(f"Couverture indisponible ({url}): {e}")
+            with self._lock:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO urls (url, digest, retry_at) VALUES (?, NULL, ?)',
+                    (url, time.time() + self.failure_ttl)
+                )
+            return None
+
+        self._store(url, data)
+        return data
+
+    def _downscale(self, raw: bytes) -> bytes:
+        """Réduction aux dimensions d'affichage et ré-encodage JPEG"""
+        with Image.open(io.BytesIO(raw)) as image:
+            image = image.convert('RGB')
+            image.thumbnail(self.size, Image.LANCZOS)
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=self.quality, optimize=True)
+        return output.getvalue()
+
+    def _store(self, url: str, data: bytes):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO blobs (digest, size, last_access) VALUES (?, ?, ?)',
+                (digest, len(data), time.time())
+            )
+            self._conn.execute(
+                'INSERT OR REPLACE INTO urls (url, digest, retry_at) VALUES (?, ?, 0)', (url, digest)
+            )
+            self._writes_since_evict += 1
+            self._approx_bytes += len(data)
+            # Total estimé localement, resynchronisé avec l'index (autres processus) toutes les 100 écritures
+            if self._approx_bytes > self.max_bytes or self._writes_since_evict >= 100:
+                self._writes_since_evict = 0
+                self._evict()
+
+    def _evict(self):
+        """Supprime les images les moins récemment servies au-delà de `max_bytes`"""
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+        self._approx_bytes = total
+        if total <= self.max_bytes:
+            return
+        # Marge de 10 % pour ne pas évincer à chaque écriture
+        target = total - int(self.max_bytes * 0.9)
+        freed, evicted = 0, []
+        for digest, size in self._conn.execute('SELECT digest, size FROM blobs ORDER BY last_access ASC'):
+            if freed >= target:
+                break
+            evicted.append(digest)
+            freed += size
+        self._approx_bytes -= freed
+        for digest in evicted:
+            self._conn.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+            self._conn.execute('DELETE FROM urls WHERE digest = ?', (digest,))
+            try:
+                os.remove(self._blob_path(digest))
+            except OSError:
+                pass
+        metrics.inc('thumbnail_evictions_total', len(evicted))
+
+    # Image de remplacement
+
+    def placeholder(self) -> bytes:
+        """Couverture neutre générée localement (aucun appel réseau)"""
+        if self._placeholder is None:
+            width, height = self.size
+            image = Image.new('RGB', (width, height), (236, 239, 241))
+            draw = ImageDraw.Draw(image)
+            draw.rectangle([4, 4, width - 5, height - 5], outline=(176, 190, 197), width=2)
+            for i, line in enumerate(("Pas de", "couverture")):
+                text_width = draw.textlength(line)
+                draw.text(((width - text_width) / 2, height / 2 - 12 + i * 14), line, fill=(96, 125, 139))
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=self.quality)
+            self._placeholder = output.getvalue()
+        return self._placeholder
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs').fetchone()
+            urls = self._conn.execute('SELECT COUNT(*) FROM urls WHERE digest IS NOT NULL').fetchone()[0]
+        return {'images': count, 'urls': urls, 'bytes': total, 'max_bytes': self.max_bytes}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,177 @@
+import json
+import os
+import shutil
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import logger
+
+
+class TopNTable:
+    """Table top-N pré-calculée (utilisateur -> indices ISBN + scores) en mmap
+
+    Une ligne par index utilisateur de `user_mapping`, largeur fixe N.
+    Les lignes non couvertes contiennent l'indice -1. Les lignes des
+    utilisateurs dont l'historique a changé depuis la construction sont
+    remplacées en mémoire (`refresh`) ou masquées (`invalidate`).
+    """
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, table_dir: str):
+        self.table_dir = table_dir
+        self.indices = None
+        self.scores = None
+        self.meta = {}
+        self.is_loaded_flag = False
+        self._overrides = {}
+
+    def load(self) -> bool:
+        """Ouvre la table en lecture seule (mmap)"""
+        if not os.path.exists(os.path.join(self.table_dir, self.META_FILE)):
+            logger.info(f"Table top-N introuvable: {self.table_dir}")
+            return False
+
+        try:
+            with open(os.path.join(self.table_dir, self.META_FILE)) as f:
+                self.meta = json.load(f)
+            self.indices = np.load(os.path.join(self.table_dir, 'indices.npy'), mmap_mode='r')
+            self.scores = np.load(os.path.join(self.table_dir, 'scores.npy'), mmap_mode='r')
+        except Exception as e:
+            logger.error(f"Erreur chargement table top-N: {e}")
+            return False
+
+        self.is_loaded_flag = True
+        return True
+
+    def is_loaded(self) -> bool:
+        return self.is_loaded_flag
+
+    @property
+    def size(self) -> int:
+        return self.meta.get('n', 0)
+
+    @property
+    def exclude_rated(self) -> bool:
+        """Les livres déjà notés par l'utilisateur ont-ils été exclus des lignes ?"""
+        return self.meta.get('exclude_rated', False)
+
+    def is_fresh(self, model_version: Optional[str], history_version: Optional[str]) -> bool:
+        """La table correspond-elle au modèle et à l'historique courants ?"""
+        return (
+            self.is_loaded_flag
+            and self.meta.get('model_version') == model_version
+            and self.meta.get('history_version') == history_version
+        )
+
+    def lookup(self, user_idx: int, k: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Retourne (indices, scores) des k premiers livres, ou None si non couvert"""
+        if k > self.size:
+            return None
+        if user_idx in self._overrides:
+            override = self._overrides[user_idx]
+            if override is None:
+                return None
+            return override[0][:k], override[1][:k]
+        if user_idx >= len(self.indices):
+            return None
+        indices = self.indices[user_idx, :k]
+        if k and indices[0] < 0:
+            return None
+        return indices, self.scores[user_idx, :k]
+
+    def invalidate(self, user_idx: int):
+        """Ignore la ligne d'un utilisateur : ses recommandations seront recalculées"""
+        self._overrides[user_idx] = None
+
+    def refresh(self, user_idx: int, indices: np.ndarray, scores: np.ndarray):
+        """Remplace en mémoire la ligne d'un utilisateur (N premiers livres)"""
+        self._overrides[user_idx] = (
+            np.asarray(indices[:self.size], dtype=np.int32),
+            np.asarray(scores[:self.size], dtype=np.float32)
+        )
+
+
+def materialize_topn(
+    recommender,
+    table_dir: str,
+    n: int,
+    batch_size: int = 1024,
+    exclude_rated: bool = True
+) -> TopNTable:
+    """Score tous les utilisateurs de `user_mapping` et écrit la table top-N
+
+    Les lots sont écrits directement dans des fichiers .npy mappés en mémoire ;
+    la table est construite dans un dossier temporaire puis renommée. Avec
+    `exclude_rated`, les livres déjà notés sont exclus des lignes (même
+    classement que `recommend_batch` par défaut).
+    """
+    start = time.time()
+    model_loader = recommender.model_loader
+    num_users = len(model_loader.user_mapping)
+    n = min(n, len(model_loader.isbn_mapping))
+
+    tmp_dir = f"{table_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    indices = np.lib.format.open_memmap(
+        os.path.join(tmp_dir, 'indices.npy'), mode='w+', dtype=np.int32, shape=(num_users, n)
+    )
+    scores = np.lib.format.open_memmap(
+        os.path.join(tmp_dir, 'scores.npy'), mode='w+', dtype=np.float32, shape=(num_users, n)
+    )
+    indices[:] = -1
+
+    user_indices = np.fromiter(model_loader.user_mapping.values(), dtype=np.int64, count=num_users)
+    for offset in range(0, num_users, batch_size):
+        batch = user_indices[offset:offset + batch_size]
+        top_indices, top_scores = recommender._rank(batch.tolist(), n, exclude_rated)
+        indices[batch] = top_indices
+        scores[batch] = top_scores
+        logger.info(f"Matérialisation {min(offset + batch_size, num_users)}/{num_users}")
+
+    indices.flush()
+    scores.flush()
+    del indices, scores
+
+    meta = {
+        'n': n,
+        'num_users': num_users,
+        'num_items': len(model_loader.isbn_mapping),
+        'model_version': model_loader.model_version,
+        'history_version': recommender.get_history_version(),
+        'exclude_rated': exclude_rated,
+        'built_at': time.time()
+    }
+    with open(os.path.join(tmp_dir, TopNTable.META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(table_dir, ignore_errors=True)
+    os.replace(tmp_dir, table_dir)
+
+    logger.info(f"Table top-{n} écrite en {time.time() - start:.1f}s ({num_users} utilisateurs)")
+
+    table = TopNTable(table_dir)
+    table.load()
+    return table
+
+
+if __name__ == '__main__':
+    from config import Config
+    from utils.components import build_model_loader, load_user_history
+    from utils.metrics import setup_logging
+    from utils.recommender import BookRecommender
+
+    setup_logging(Config.LOG_DIR, Config.LOG_LEVEL, Config.LOG_FORMAT)
+    # Même modèle que celui servi (registre, artefact ou pickle) : la version doit correspondre
+    loader = build_model_loader()
+    if loader is None:
+        raise SystemExit("Impossible de charger le modèle")
+    materialize_topn(
+        BookRecommender(loader, None, load_user_history(loader)),
+        Config.TOPN_DIR,
+        Config.TOPN_SIZE
+    )
@@ -0,0 +1,318 @@
+"""Entraînement hors-mémoire du DenoisingAutoEncoder à partir du CSV des notes
+
+Remplace le `pivot_table` dense du notebook : le CSV est lu par blocs, les
+notes sont stockées en CSR (UserHistoryStore) et chaque minibatch est
+densifié à la volée par les workers du DataLoader. La mémoire de pointe
+dépend de `batch_size x num_items`, pas de `num_users x num_items`.
+
+Usage :
+    python -m utils.training --ratings data/ratings.csv --output models/dae_model.dae
+"""
+import argparse
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+from utils.artifact import export_artifact
+from utils.dae_model import DenoisingAutoEncoder
+from utils.user_history import UserHistoryStore
+
+
+def build_mappings_from_csv(
+    ratings_file: str,
+    min_ratings_user: int = 20,
+    min_ratings_book: int = 20,
+    chunksize: int = 500_000
+) -> Tuple[Dict[int, int], Dict[str, int]]:
+    """user_mapping et isbn_mapping du notebook, calculés en deux lectures par blocs
+
+    Même filtrage que le notebook (seuils comptés sur toutes les notes, y
+    compris les 0) et même ordre que les index du `pivot_table` (triés).
+    """
+    cols = [UserHistoryStore.USER_COL, UserHistoryStore.ISBN_COL]
+    read = lambda: pd.read_csv(
+        ratings_file,
+        usecols=cols,
+        dtype={UserHistoryStore.ISBN_COL: str},
+        chunksize=chunksize
+    )
+
+    user_counts = pd.Series(dtype=np.int64)
+    book_counts = pd.Series(dtype=np.int64)
+    for chunk in read():
+        user_counts = user_counts.add(chunk[cols[0]].value_counts(), fill_value=0)
+        book_counts = book_counts.add(chunk[cols[1]].value_counts(), fill_value=0)
+
+    active_users = user_counts.index[user_counts >= min_ratings_user]
+    active_books = book_counts.index[book_counts >= min_ratings_book]
+
+    # Deuxième passe : utilisateurs et livres présents après le double filtrage
+    users, books = set(), set()
+    for chunk in read():
+        kept = chunk[chunk[cols[0]].isin(active_users) & chunk[cols[1]].isin(active_books)]
+        users.update(kept[cols[0]].unique().tolist())
+        books.update(kept[cols[1]].unique().tolist())
+
+    user_mapping = {int(u): i for i, u in enumerate(sorted(users))}
+    isbn_mapping = {str(b): i for i, b in enumerate(sorted(books))}
+    return user_mapping, isbn_mapping
+
+
+class CSRBatchDataset(Dataset):
+    """Densifie un lot de lignes CSR en tenseurs (entrée d'entraînement, cible de test)
+
+    Le store est rouvert en mmap dans chaque worker. Une fraction des notes
+    de chaque utilisateur est retirée de l'entrée pour la validation ; le
+    tirage dépend uniquement de (seed, utilisateur) et reste donc identique
+    d'une époque et d'un worker à l'autre, comme le split fixe du notebook.
+    """
+
+    def __init__(self, store_dir: str, holdout_fraction: float = 0.1, seed: int = 42):
+        self.store_dir = store_dir
+        self.holdout_fraction = holdout_fraction
+        self.seed = seed
+        self._store = None
+        meta_store = UserHistoryStore(store_dir)
+        if not meta_store.load():
+            raise FileNotFoundError(f"Historique introuvable: {store_dir}")
+        self.num_users = meta_store.meta['num_users']
+        self.num_items = meta_store.meta['num_items']
+
+    def __len__(self) -> int:
+        return self.num_users
+
+    @property
+    def store(self) -> UserHistoryStore:
+        if self._store is None:
+            self._store = UserHistoryStore(self.store_dir)
+            self._store.load()
+        return self._store
+
+    def __getstate__(self):
+        # Les tableaux mmap ne sont pas transmis aux workers : chacun rouvre le store
+        state = self.__dict__.copy()
+        state['_store'] = None
+        return state
+
+    def _holdout(self, user_idx: int, n: int) -> np.ndarray:
+        """Positions retenues pour la validation (10 % des notes, au moins une, jamais toutes)"""
+        if self.holdout_fraction <= 0 or n < 2:
+            return np.empty(0, dtype=np.int64)
+        size = min(max(1, int(self.holdout_fraction * n)), n - 1)
+        rng = np.random.default_rng((self.seed, user_idx))
+        return rng.choice(n, size=size, replace=False)
+
+    def __getitem__(self, user_indices: List[int]) -> Tuple[torch.Tensor, torch.Tensor]:
+        train = np.zeros((len(user_indices), self.num_items), dtype=np.float32)
+        test = np.zeros_like(train)
+        for row, user_idx in enumerate(user_indices):
+            indices, values = self.store.get_user_row(user_idx)
+            train[row, indices] = values
+            held = self._holdout(user_idx, len(indices))
+            if len(held):
+                train[row, indices[held]] = 0
+                test[row, indices[held]] = values[held]
+        return torch.from_numpy(train), torch.from_numpy(test)
+
+
+class ShuffledBatchSampler(Sampler):
+    """Lots d'indices utilisateurs (mélangés à chaque époque si `shuffle`)"""
+
+    def __init__(self, num_users: int, batch_size: int, shuffle: bool = True, seed: int = 42):
+        self.num_users = num_users
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return (self.num_users + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self) -> Iterator[List[int]]:
+        order = self.rng.permutation(self.num_users) if self.shuffle else np.arange(self.num_users)
+        for start in range(0, self.num_users, self.batch_size):
+            yield order[start:start + self.batch_size].tolist()
+
+
+def masked_mse_loss(pred: torch.Tensor, target: torch.Tensor) -> torch.Tensor:
+    mask = (target != 0).float()
+    loss = ((pred - target) ** 2) * mask
+    return loss.sum() / (mask.sum() + 1e-8)
+
+
+def _loader(dataset: CSRBatchDataset, batch_size: int, shuffle: bool, num_workers: int, seed: int) -> DataLoader:
+    return DataLoader(
+        dataset,
+        sampler=ShuffledBatchSampler(len(dataset), batch_size, shuffle, seed),
+        batch_size=None,
+        num_workers=num_workers,
+        persistent_workers=num_workers > 0,
+        prefetch_factor=4 if num_workers > 0 else None
+    )
+
+
+def train_dae(
+    store_dir: str,
+    epochs: int = 50,
+    batch_size: int = 128,
+    latent_dim: int = 64,
+    dropout_prob: float = 0.2,
+    noise_rate: float = 0.4,
+    lr: float = 0.001,
+    weight_decay: float = 1e-5,
+    patience: int = 5,
+    holdout_fraction: float = 0.1,
+    num_workers: int = 0,
+    seed: int = 42,
+    verbose: bool = True
+) -> Tuple[DenoisingAutoEncoder, Dict[str, List[float]]]:
+    """Boucle d'entraînement du notebook (bruit 40 %, MSE masquée, early stopping) sur entrées CSR"""
+    torch.manual_seed(seed)
+    dataset = CSRBatchDataset(store_dir, holdout_fraction, seed)
+    train_loader = _loader(dataset, batch_size, True, num_workers, seed)
+    eval_loader = _loader(dataset, batch_size * 4, False, num_workers, seed) if holdout_fraction > 0 else None
+
+    model = DenoisingAutoEncoder(dataset.num_items, latent_dim=latent_dim, dropout_prob=dropout_prob)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr, weight_decay=weight_decay)
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, 'min', factor=0.5, patience=3)
+
+    history = {'train_loss': [], 'test_rmse': []}
+    best_rmse = np.inf
+    best_state = None
+    patience_counter = 0
+
+    for epoch in range(epochs):
+        start = time.time()
+        model.train()
+        epoch_loss = 0.0
+        for train_batch, _ in train_loader:
+            # Denoising : 40 % des entrées mises à zéro
+            noise = (torch.rand_like(train_batch) < noise_rate).float()
+            output = model(train_batch * (1 - noise))
+            loss = masked_mse_loss(output, train_batch)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            epoch_loss += loss.item() * train_batch.size(0)
+        epoch_loss /= len(dataset)
+        history['train_loss'].append(epoch_loss)
+
+        if eval_loader is None:
+            if verbose:
+                print(f"Epoch [{epoch + 1}/{epochs}] Train Loss: {epoch_loss:.4f} ({time.time() - start:.1f}s)")
+            continue
+
+        # RMSE masquée sur les notes retenues, accumulée lot par lot
+        model.eval()
+        squared_error, count = 0.0, 0.0
+        with torch.no_grad():
+            for train_batch, test_batch in eval_loader:
+                mask = (test_batch != 0).float()
+                squared_error += (((model(train_batch) - test_batch) ** 2) * mask).sum().item()
+                count += mask.sum().item()
+        test_rmse = float(np.sqrt(squared_error / (count + 1e-8)))
+        history['test_rmse'].append(test_rmse)
+        scheduler.step(test_rmse)
+
+        if verbose:
+            print(f"Epoch [{epoch + 1}/{epochs}] Train Loss: {epoch_loss:.4f} "
+                  f"Test RMSE: {test_rmse:.4f} ({time.time() - start:.1f}s)")
+
+        if test_rmse < best_rmse:
+            best_rmse = test_rmse
+            best_state = {k: v.clone() for k, v in model.state_dict().items()}
+            patience_counter = 0
+        else:
+            patience_counter += 1
+            if patience_counter >= patience:
+                if verbose:
+                    print("Early stopping")
+                break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    model.eval()
+    return model, history
+
+
+def train_from_csv(
+    ratings_file: str,
+    output_path: str,
+    store_dir: str,
+    min_ratings_user: int = 20,
+    min_ratings_book: int = 20,
+    chunksize: int = 500_000,
+    **train_kwargs
+) -> Optional[str]:
+    """CSV -> mappings -> historique CSR -> entraînement -> artefact chargeable par ModelLoader
+
+    Un chemin `.dae` produit un artefact plat, tout autre chemin le pickle
+    `{'model', 'user_mapping', 'isbn_mapping'}` attendu par ModelLoader.
+    Retourne la version de l'artefact (ou None pour un pickle).
+    """
+    print(f"Lecture des notes depuis {ratings_file}...")
+    user_mapping, isbn_mapping = build_mappings_from_csv(
+        ratings_file, min_ratings_user, min_ratings_book, chunksize
+    )
+    print(f"   - Utilisateurs: {len(user_mapping)}")
+    print(f"   - Livres: {len(isbn_mapping)}")
+    if not user_mapping or not isbn_mapping:
+        print("❌ Aucun utilisateur ou livre après filtrage")
+        return None
+
+    UserHistoryStore.build(ratings_file, user_mapping, isbn_mapping, store_dir, chunksize)
+    model, history = train_dae(store_dir, **train_kwargs)
+    extra = {'training': {
+        'ratings_file': os.path.abspath(ratings_file),
+        'min_ratings_user': min_ratings_user,
+        'min_ratings_book': min_ratings_book,
+        'epochs_run': len(history['train_loss']),
+        'best_test_rmse': min(history['test_rmse']) if history['test_rmse'] else None
+    }}
+
+    if output_path.endswith('.dae'):
+        return export_artifact(model, user_mapping, isbn_mapping, output_path, extra=extra)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    torch.save({'model': model, 'user_mapping': user_mapping, 'isbn_mapping': isbn_mapping}, output_path)
+    print(f"✅ Modèle sauvegardé dans {output_path}")
+    return None
+
+
+if __name__ == '__main__':
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Entraînement du DAE par blocs (sans matrice dense)")
+    parser.add_argument('--ratings', default=Config.RATINGS_FILE)
+    parser.add_argument('--output', default=Config.ARTIFACT_PATH, help="Artefact .dae ou pickle .pkl")
+    parser.add_argument('--history-dir', default=Config.USER_HISTORY_DIR)
+    parser.add_argument('--min-ratings-user', type=int, default=20)
+    parser.add_argument('--min-ratings-book', type=int, default=20)
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--latent-dim', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help="Processus de chargement des lots")
+    parser.add_argument('--threads', type=int, default=None, help="Threads PyTorch pour le calcul")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    train_from_csv(
+        args.ratings,
+        args.output,
+        args.history_dir,
+        min_ratings_user=args.min_ratings_user,
+        min_ratings_book=args.min_ratings_book,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        latent_dim=args.latent_dim,
+        num_workers=args.workers,
+        seed=args.seed
+    )
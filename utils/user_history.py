@@ -0,0 +1,338 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.id_index import IdIndex
+from utils.metrics import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows : un seul processus construit l'historique
+    fcntl = None
+
+
+@contextmanager
+def store_lock(store_dir: str):
+    """Verrou exclusif entre processus sur un dossier d'historique (vérification, construction, installation)"""
+    lock_path = f"{os.path.abspath(store_dir)}.lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class UserHistoryStore:
+    """Historique des notes utilisateurs au format CSR (fichiers .npy en mmap)
+
+    Les lignes sont alignées sur `user_mapping` et les colonnes sur
+    `isbn_mapping`. Les valeurs sont centrées par utilisateur puis mises à
+    l'échelle [0, 1] comme dans le notebook d'entraînement.
+    """
+
+    USER_COL = 'User-ID'
+    ISBN_COL = 'ISBN'
+    RATING_COL = 'Book-Rating'
+
+    META_FILE = 'meta.json'
+    ARRAYS = (
+        'indptr', 'indices', 'values', 'user_means', 'user_counts', 'mean_indptr', 'mean_indices'
+    )
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self.indptr = None
+        self.indices = None
+        self.values = None
+        self.user_means = None
+        self.user_counts = None
+        self.mean_indptr = None
+        self.mean_indices = None
+        self.meta = {}
+        self.is_loaded_flag = False
+
+    @classmethod
+    def build(
+        cls,
+        ratings_file: str,
+        user_mapping: Dict,
+        isbn_mapping: Dict,
+        store_dir: str,
+        chunksize: int = 500_000
+    ) -> 'UserHistoryStore':
+        """Construit le store CSR à partir du CSV des notes (lecture par blocs)"""
+        start = time.time()
+        num_users = len(user_mapping)
+        num_items = len(isbn_mapping)
+        user_index = IdIndex.from_dict(user_mapping)
+        isbn_index = IdIndex.from_dict(isbn_mapping)
+
+        rows, cols, vals = [], [], []
+        for chunk in pd.read_csv(
+            ratings_file,
+            usecols=[cls.USER_COL, cls.ISBN_COL, cls.RATING_COL],
+            dtype={cls.ISBN_COL: str},
+            chunksize=chunksize
+        ):
+            # Les notes 0 sont implicites : absentes de la matrice du notebook
+            chunk = chunk[chunk[cls.RATING_COL] > 0]
+            user_idx = user_index.lookup_batch(chunk[cls.USER_COL].to_numpy())
+            item_idx = isbn_index.lookup_batch(chunk[cls.ISBN_COL].fillna('').to_numpy())
+            mask = (user_idx >= 0) & (item_idx >= 0)
+            rows.append(user_idx[mask])
+            cols.append(item_idx[mask])
+            vals.append(chunk[cls.RATING_COL].to_numpy(dtype=np.float64)[mask])
+
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+        vals = np.concatenate(vals) if vals else np.empty(0, dtype=np.float64)
+
+        # Tri (utilisateur, livre) puis moyenne des doublons comme pivot_table
+        order = np.lexsort((cols, rows))
+        rows, cols, vals = rows[order], cols[order], vals[order]
+        if len(rows):
+            is_new = np.empty(len(rows), dtype=bool)
+            is_new[0] = True
+            is_new[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+            group = np.cumsum(is_new) - 1
+            counts = np.bincount(group)
+            vals = np.bincount(group, weights=vals) / counts
+            rows, cols = rows[is_new], cols[is_new]
+
+        # Centrage par utilisateur
+        user_counts = np.bincount(rows, minlength=num_users)
+        user_sums = np.bincount(rows, weights=vals, minlength=num_users)
+        user_means = np.divide(
+            user_sums, user_counts,
+            out=np.zeros(num_users), where=user_counts > 0
+        )
+        centered = vals - user_means[rows]
+
+        # Les valeurs centrées nulles restent à 0 (même convention que le notebook) ;
+        # ces livres sont notés à part pour recentrer la ligne si la moyenne change
+        keep = centered != 0
+        mean_indptr = np.zeros(num_users + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[~keep], minlength=num_users), out=mean_indptr[1:])
+        mean_indices = cols[~keep]
+        rows, cols, centered = rows[keep], cols[keep], centered[keep]
+
+        # MinMaxScaler sur les valeurs non nulles
+        data_min = float(centered.min()) if len(centered) else 0.0
+        data_max = float(centered.max()) if len(centered) else 1.0
+        data_range = data_max - data_min if data_max > data_min else 1.0
+        scaled = (centered - data_min) / data_range
+
+        indptr = np.zeros(num_users + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_users), out=indptr[1:])
+
+        os.makedirs(store_dir, exist_ok=True)
+        cls._save_array(store_dir, 'indptr.npy', indptr)
+        cls._save_array(store_dir, 'indices.npy', cols.astype(np.int32))
+        cls._save_array(store_dir, 'values.npy', scaled.astype(np.float32))
+        cls._save_array(store_dir, 'user_means.npy', user_means.astype(np.float32))
+        cls._save_array(store_dir, 'user_counts.npy', user_counts.astype(np.int32))
+        cls._save_array(store_dir, 'mean_indptr.npy', mean_indptr)
+        cls._save_array(store_dir, 'mean_indices.npy', mean_indices.astype(np.int32))
+
+        meta = {
+            'num_users': num_users,
+            'num_items': num_items,
+            'user_mapping_digest': user_index.digest(),
+            'isbn_mapping_digest': isbn_index.digest(),
+            'nnz': int(len(cols)),
+            'scaler_min': data_min,
+            'scaler_max': data_max,
+            'ratings_file': os.path.abspath(ratings_file),
+            'built_at': time.time()
+        }
+        cls._save_meta(store_dir, meta)
+
+        logger.info(f"Historique construit en {time.time() - start:.1f}s "
+                    f"({meta['nnz']} notes, {num_users} utilisateurs)")
+
+        store = cls(store_dir)
+        store.load()
+        return store
+
+    @staticmethod
+    def _save_array(store_dir: str, name: str, array: np.ndarray):
+        """Écrit un tableau par renommage : un store ouvert en mmap ailleurs reste lisible"""
+        path = os.path.join(store_dir, name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def _save_meta(cls, store_dir: str, meta: Dict):
+        """Écrit les métadonnées en dernier, par renommage (elles valident les tableaux)"""
+        path = os.path.join(store_dir, cls.META_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def install(self, store_dir: str) -> bool:
+        """Copie ce store (tableaux ouverts, métadonnées) dans `store_dir`, sauf s'il y est déjà
+
+        Les tableaux sont relus depuis les mmaps de ce store : la copie reste
+        exacte même si ses fichiers ont été remplacés entre-temps.
+        """
+        with store_lock(store_dir):
+            meta_path = os.path.join(store_dir, self.META_FILE)
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    if json.load(f).get('built_at') == self.meta.get('built_at'):
+                        return False
+                # Store invalide pendant la copie : une copie interrompue sera reconstruite
+                os.remove(meta_path)
+
+            os.makedirs(store_dir, exist_ok=True)
+            for name in self.ARRAYS:
+                array = getattr(self, name)
+                if array is not None:
+                    self._save_array(store_dir, f'{name}.npy', np.asarray(array))
+                elif os.path.exists(os.path.join(store_dir, f'{name}.npy')):
+                    # Tableau optionnel absent de ce store : pas de reliquat d'une autre construction
+                    os.remove(os.path.join(store_dir, f'{name}.npy'))
+            self._save_meta(store_dir, self.meta)
+        return True
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.store_dir, self.META_FILE))
+
+    def load(self) -> bool:
+        """Ouvre les tableaux CSR en lecture seule (mmap)"""
+        if not self.exists():
+            logger.info(f"Historique utilisateurs introuvable: {self.store_dir}")
+            return False
+
+        try:
+            with open(os.path.join(self.store_dir, self.META_FILE)) as f:
+                self.meta = json.load(f)
+            self.indptr = np.load(os.path.join(self.store_dir, 'indptr.npy'), mmap_mode='r')
+            self.indices = np.load(os.path.join(self.store_dir, 'indices.npy'), mmap_mode='r')
+            self.values = np.load(os.path.join(self.store_dir, 'values.npy'), mmap_mode='r')
+            self.user_means = np.load(os.path.join(self.store_dir, 'user_means.npy'), mmap_mode='r')
+            counts_path = os.path.join(self.store_dir, 'user_counts.npy')
+            if os.path.exists(counts_path):
+                self.user_counts = np.load(counts_path, mmap_mode='r')
+            mean_path = os.path.join(self.store_dir, 'mean_indptr.npy')
+            if os.path.exists(mean_path):
+                self.mean_indptr = np.load(mean_path, mmap_mode='r')
+                self.mean_indices = np.load(os.path.join(self.store_dir, 'mean_indices.npy'), mmap_mode='r')
+        except Exception as e:
+            logger.error(f"Erreur chargement historique: {e}")
+            return False
+
+        self.is_loaded_flag = True
+        return True
+
+    def is_loaded(self) -> bool:
+        return self.is_loaded_flag
+
+    @property
+    def version(self) -> Optional[str]:
+        """Identifiant de la construction courante du store"""
+        built_at = self.meta.get('built_at')
+        return None if built_at is None else str(built_at)
+
+    def matches(self, user_mapping: Dict, isbn_mapping: Dict) -> bool:
+        """Vérifie que le store est aligné sur les mappings du modèle
+
+        Les tailles ne suffisent pas : un réentraînement peut produire des
+        mappings de même taille mais d'ordre différent. Les empreintes des
+        clés sont comparées (un store sans empreinte est reconstruit).
+        """
+        return (
+            self.meta.get('num_users') == len(user_mapping)
+            and self.meta.get('num_items') == len(isbn_mapping)
+            and self.meta.get('user_mapping_digest') == IdIndex.from_dict(user_mapping).digest()
+            and self.meta.get('isbn_mapping_digest') == IdIndex.from_dict(isbn_mapping).digest()
+        )
+
+    def get_user_row(self, user_idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Retourne (indices livres, valeurs normalisées) d'un utilisateur"""
+        start, end = self.indptr[user_idx], self.indptr[user_idx + 1]
+        return self.indices[start:end], self.values[start:end]
+
+    def get_mean_rated(self, user_idx: int) -> np.ndarray:
+        """Livres notés exactement à la moyenne de l'utilisateur (valeur 0, absents de la ligne CSR)"""
+        if self.mean_indptr is None:
+            return np.empty(0, dtype=np.int32)
+        return self.mean_indices[self.mean_indptr[user_idx]:self.mean_indptr[user_idx + 1]]
+
+    def get_rated_items(self, user_idx: int) -> np.ndarray:
+        """Tous les livres notés par un utilisateur (ligne CSR + notes à la moyenne)"""
+        indices, _ = self.get_user_row(user_idx)
+        mean_rated = self.get_mean_rated(user_idx)
+        return np.concatenate([indices, mean_rated]) if len(mean_rated) else indices
+
+    def get_dense_vector(self, user_idx: int) -> np.ndarray:
+        """Vecteur d'entrée dense du modèle pour un utilisateur"""
+        vector = np.zeros(self.meta['num_items'], dtype=np.float32)
+        indices, values = self.get_user_row(user_idx)
+        vector[indices] = values
+        return vector
+
+    def get_dense_batch(self, user_indices: Iterable[int]) -> np.ndarray:
+        """Matrice d'entrée dense (n_users x n_items) pour un lot d'utilisateurs"""
+        user_indices = list(user_indices)
+        batch = np.zeros((len(user_indices), self.meta['num_items']), dtype=np.float32)
+        for row, user_idx in enumerate(user_indices):
+            indices, values = self.get_user_row(user_idx)
+            batch[row, indices] = values
+        return batch
+
+
+def load_or_build_user_history(
+    store_dir: str,
+    ratings_file: str,
+    user_mapping: Dict,
+    isbn_mapping: Dict,
+    build_dir: Optional[str] = None
+) -> Optional[UserHistoryStore]:
+    """Ouvre le store s'il est à jour, sinon le reconstruit depuis le CSV
+
+    Le dossier est verrouillé de la vérification à la fin de la
+    construction : des processus concurrents ne le construisent qu'une fois.
+    Avec `build_dir`, un store obsolète est laissé intact (il sert peut-être
+    un autre modèle) et le store est ouvert ou construit dans `build_dir`.
+    """
+    with store_lock(store_dir):
+        store = UserHistoryStore(store_dir)
+        if store.load() and store.matches(user_mapping, isbn_mapping):
+            return store
+        if build_dir is None:
+            if not os.path.exists(ratings_file):
+                logger.warning(f"Fichier de notes introuvable: {ratings_file}")
+                return None
+
+            logger.info(f"Construction de l'historique depuis {ratings_file}...")
+            return UserHistoryStore.build(ratings_file, user_mapping, isbn_mapping, store_dir)
+    return load_or_build_user_history(build_dir, ratings_file, user_mapping, isbn_mapping)
+
+
+if __name__ == '__main__':
+    from config import Config
+    from utils.metrics import setup_logging
+    from utils.model_loader import ModelLoader
+
+    setup_logging(Config.LOG_DIR, Config.LOG_LEVEL, Config.LOG_FORMAT)
+    loader = ModelLoader(Config.MODEL_PATH)
+    if loader.load_model():
+        UserHistoryStore.build(
+            Config.RATINGS_FILE,
+            loader.user_mapping,
+            loader.isbn_mapping,
+            Config.USER_HISTORY_DIR
+        )